@@ -7,8 +7,15 @@
 # published by the Free Software Foundation.
 
 import sys
-import logging
-from . import version, config, option, output, extractor, job, util, exception
+
+if "--startup-profile" in sys.argv:
+    from . import startup
+    startup.install()
+
+import logging  # noqa E402
+import threading  # noqa E402
+import collections  # noqa E402
+from . import version, config, option, output, util, exception  # noqa E402
 
 __author__ = "Mike Fährmann"
 __copyright__ = "Copyright 2014-2023 Mike Fährmann"
@@ -24,6 +31,9 @@ def main():
         args = parser.parse_args()
         log = output.initialize_logging(args.loglevel)
 
+        # delayed imports to keep '--help', '--version', etc. fast
+        from . import extractor, job
+
         # configuration
         if args.config_load:
             config.load()
@@ -90,6 +100,18 @@ def main():
                 else:
                     signal.signal(signal_num, signal.SIG_IGN)
 
+        # turn SIGTERM into SystemExit to let jobs clean up
+        # and write pending archive entries
+        if _writes_on_finalize((
+                config.get((), "extractor"),
+                config.get((), "postprocessor"))):
+            try:
+                import signal
+                if signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+                    signal.signal(signal.SIGTERM, _handle_sigterm)
+            except (AttributeError, ValueError):
+                pass
+
         # enable ANSI escape sequences on Windows
         if util.WINDOWS and config.get(("output",), "ansi", output.COLORS):
             from ctypes import windll, wintypes, byref
@@ -116,6 +138,11 @@ def main():
             from . import formatter
             formatter._SEPARATOR = separator
 
+        # format string compilation
+        if config.get((), "format-compile"):
+            from . import formatter
+            formatter._FORMATTER = formatter.CompiledFormatter
+
         # eval globals
         path = config.get((), "globals")
         if path:
@@ -270,7 +297,7 @@ def main():
                 jobtype = job.DataJob
                 jobtype.resolve = args.dump_json - 1
             else:
-                jobtype = args.jobtype or job.DownloadJob
+                jobtype = getattr(job, args.jobtype or "DownloadJob")
 
             input_manager = InputManager()
             input_manager.log = input_log = logging.getLogger("inputfile")
@@ -309,6 +336,10 @@ def main():
                 input_manager.progress(pformat)
 
             # process input URLs
+            parallel = config.get((), "input-parallel")
+            if parallel and parallel > 1 and len(input_manager.urls) > 1:
+                return ParallelJobs(input_manager, jobtype, parallel).run()
+
             retval = 0
             for url in input_manager:
                 try:
@@ -355,6 +386,28 @@ def main():
     return 1
 
 
+def _handle_sigterm(signum, frame):
+    raise SystemExit("\nSIGTERM")
+
+
+def _writes_on_finalize(conf):
+    """Return True if 'conf' enables features that hold back results
+    until a job finishes"""
+    if isinstance(conf, dict):
+        if conf.get("archive-mode") == "batch":
+            return True
+        name = conf.get("name")
+        if name == "metadata" and (
+                conf.get("buffer-size") or conf.get("compression")):
+            return True
+        if name == "exec" and conf.get("batch"):
+            return True
+        conf = conf.values()
+    elif not isinstance(conf, (list, tuple)):
+        return False
+    return any(_writes_on_finalize(value) for value in conf)
+
+
 class InputManager():
 
     def __init__(self):
@@ -501,24 +554,30 @@ class InputManager():
         self._index += 1
 
     def success(self):
-        if self._item:
-            self._rewrite()
+        self._success(self._item)
 
     def error(self):
+        self._error(self._url, self._item)
+
+    def _success(self, item):
+        if item:
+            self._rewrite(item)
+
+    def _error(self, url, item):
         if self.err:
-            if self._item:
-                url, path, action, indicies = self._item
+            if item:
+                url, path, action, indicies = item
                 lines = self.files[path]
                 out = "".join(lines[i] for i in indicies)
                 if out and out[-1] == "\n":
                     out = out[:-1]
-                self._rewrite()
+                self._rewrite(item)
             else:
-                out = str(self._url)
+                out = str(url)
             self.err.info(out)
 
-    def _rewrite(self):
-        url, path, action, indicies = self._item
+    def _rewrite(self, item):
+        url, path, action, indicies = item
         lines = self.files[path]
         action(lines, indicies)
         try:
@@ -557,13 +616,216 @@ class InputManager():
         self._url = url
 
         if self._pformat:
-            output.stderr_write(self._pformat({
-                "total"  : len(self.urls),
-                "current": self._index + 1,
-                "url"    : url,
-            }))
+            self._print_progress(self._index, url)
         return url
 
+    def _print_progress(self, index, url):
+        output.stderr_write(self._pformat({
+            "total"  : len(self.urls),
+            "current": index + 1,
+            "url"    : url,
+        }))
+
+
+class ParallelJobs():
+    """Run jobs for multiple input URLs concurrently
+
+    URLs are grouped by extractor category and each group is processed
+    sequentially by a single thread, so that per-site request intervals
+    stay intact while URLs of unrelated sites run in parallel.
+
+    Each URL gets resolved only when a thread is ready to take it.
+    URLs of a category that is already being processed get queued
+    for the thread processing it.
+
+    URLs with attached config options are processed on their own,
+    after all jobs for previous URLs have finished.
+
+    When the main thread gets interrupted, running jobs stop
+    at their next message and get to finalize their results.
+    """
+
+    def __init__(self, input_manager, jobtype, workers):
+        self.input_manager = input_manager
+        self.jobtype = jobtype
+        self.workers = workers
+        self.log = logging.getLogger("gallery-dl")
+        self.lock = threading.Lock()
+        self.cond = threading.Condition()
+        self.entries = None
+        self.queues = {}
+        self.busy = 0
+        self.exclusive = False
+        self.retval = 0
+        self.exit = None
+        self.stop_event = threading.Event()
+
+    def run(self):
+        urls = self.input_manager.urls
+        self.entries = enumerate(urls)
+
+        threads = []
+        try:
+            for _ in range(min(self.workers, len(urls))):
+                thread = threading.Thread(target=self.worker)
+                thread.start()
+                threads.append(thread)
+
+            for thread in threads:
+                thread.join()
+        except BaseException as exc:
+            self.stop(exc)
+            self.log.debug("Waiting for %d running jobs to stop",
+                           sum(thread.is_alive() for thread in threads))
+            for thread in threads:
+                thread.join()
+            raise
+
+        if self.exit:
+            raise self.exit
+        return self.retval
+
+    def stop(self, exc):
+        """Stop all running jobs and do not start any new ones"""
+        with self.cond:
+            if self.exit is None:
+                self.exit = exc
+            self.stop_event.set()
+            self.cond.notify_all()
+
+    def worker(self):
+        while True:
+            task = self.next_task()
+            if task is None:
+                return
+            index, entry, extr, queue = task
+
+            if queue is None:
+                # URL with config options
+                try:
+                    self.run_entry(index, entry)
+                finally:
+                    with self.cond:
+                        self.exclusive = False
+                        self.cond.notify_all()
+                continue
+
+            category = extr.category if extr else ""
+            try:
+                while True:
+                    self.run_entry(index, entry, extr)
+                    with self.cond:
+                        if not queue or self.exit:
+                            break
+                        index, entry, extr = queue.popleft()
+            finally:
+                with self.cond:
+                    del self.queues[category]
+                    self.busy -= 1
+                    self.cond.notify_all()
+
+    def next_task(self):
+        """Resolve the next input URL
+
+        Return None when there is nothing left to do for this thread.
+        """
+        from . import extractor
+        cond = self.cond
+
+        with cond:
+            while True:
+                while self.exclusive and not self.exit:
+                    cond.wait()
+                if self.exit:
+                    return None
+                try:
+                    index, entry = next(self.entries)
+                except StopIteration:
+                    return None
+                url = entry[0] if isinstance(entry, tuple) else entry
+
+                if isinstance(url, ExtendedUrl):
+                    self.exclusive = True
+                    while self.busy:
+                        cond.wait()
+                    if self.exit:
+                        self.exclusive = False
+                        cond.notify_all()
+                        return None
+                    return index, entry, None, None
+
+                extr = extractor.find(url)
+                category = extr.category if extr else ""
+                queue = self.queues.get(category)
+                if queue is not None:
+                    queue.append((index, entry, extr))
+                    continue
+
+                queue = self.queues[category] = collections.deque()
+                self.busy += 1
+                return index, entry, extr, queue
+
+    def run_entry(self, index, entry, extr=None):
+        """Run a job for a single input URL"""
+        input_manager = self.input_manager
+        if isinstance(entry, tuple):
+            item = entry
+            url = entry[0]
+        else:
+            item = None
+            url = entry
+
+        if input_manager._pformat:
+            input_manager._print_progress(index, url)
+
+        while True:
+            try:
+                self.log.debug("Starting %s for '%s'",
+                               self.jobtype.__name__, url)
+
+                if isinstance(url, ExtendedUrl):
+                    for opts in url.gconfig:
+                        config.set(*opts)
+                    with config.apply(url.lconfig):
+                        job = self.jobtype(url.value)
+                        job.stop_event = self.stop_event
+                        status = job.run()
+                else:
+                    job = self.jobtype(extr or url)
+                    job.stop_event = self.stop_event
+                    status = job.run()
+
+                with self.lock:
+                    if status:
+                        self.retval |= status
+                        input_manager._error(url, item)
+                    else:
+                        input_manager._success(item)
+
+            except exception.StopExtraction:
+                pass
+            except exception.TerminateExtraction:
+                pass
+            except exception.RestartExtraction:
+                self.log.debug("Restarting '%s'", url)
+                extr = None
+                continue
+            except exception.NoExtractorError:
+                self.log.error("Unsupported URL '%s'", url)
+                with self.lock:
+                    self.retval |= 64
+                    input_manager._error(url, item)
+            except SystemExit as exc:
+                self.stop(exc)
+            except Exception as exc:
+                self.log.error("%s: %s", exc.__class__.__name__, exc)
+                self.log.debug("", exc_info=exc)
+                with self.lock:
+                    self.retval |= exc.code if isinstance(
+                        exc, exception.GalleryDLException) else 1
+                    input_manager._error(url, item)
+            break
+
 
 class ExtendedUrl():
     """URL with attached config key-value pairs"""
@@ -9,6 +9,10 @@
 """Download Archives"""
 
 import os
+import math
+import time
+import struct
+import hashlib
 import sqlite3
 from . import formatter
 
@@ -26,9 +30,10 @@ class DownloadArchive():
 
         self.keygen = formatter.parse(format_string).format_map
         self.connection = con
-        self.close = con.close
         self.cursor = cursor = con.cursor()
+        self.bloom = None
         self._cache_key = cache_key
+        self._inserted = 0
 
         if pragma:
             for stmt in pragma:
@@ -45,19 +50,169 @@ class DownloadArchive():
     def add(self, kwdict):
         """Add item described by 'kwdict' to archive"""
         key = kwdict.get(self._cache_key) or self.keygen(kwdict)
+        if self.bloom is not None:
+            self.bloom.add(key)
         self.cursor.execute(
             "INSERT OR IGNORE INTO archive (entry) VALUES (?)", (key,))
+        self._inserted += self.cursor.rowcount
 
     def check(self, kwdict):
         """Return True if the item described by 'kwdict' exists in archive"""
         key = kwdict[self._cache_key] = self.keygen(kwdict)
+        if self.bloom is not None and key not in self.bloom:
+            return False
         self.cursor.execute(
             "SELECT 1 FROM archive WHERE entry=? LIMIT 1", (key,))
         return self.cursor.fetchone()
 
+    def check_many(self, kwdicts):
+        """Return a list of check() results for all 'kwdicts'"""
+        keys = []
+        for kwdict in kwdicts:
+            key = kwdict[self._cache_key] = self.keygen(kwdict)
+            keys.append(key)
+
+        found = self._select_many(keys)
+        return [key in found for key in keys]
+
     def finalize(self):
         pass
 
+    def flush(self):
+        pass
+
+    def close(self):
+        """Close the database connection and update the archive filter"""
+        try:
+            if self.bloom is not None:
+                self._close_filter()
+        except sqlite3.Error:
+            pass
+        finally:
+            self.connection.close()
+
+    def load_filter(self, path, log=None):
+        """Load or build a Bloom filter for all archive entries
+
+        The filter gets stored at 'path' together with the archive's
+        generation counter, which gets incremented by a trigger
+        in the same transaction as every new entry.
+        A filter with a generation different from the archive's
+        current one gets rebuilt.
+        """
+        cursor = self.cursor
+        generation = self._generation_init()
+        start = time.monotonic()
+
+        bloom = None
+        try:
+            with open(path, "rb") as fp:
+                bloom = BloomFilter.load(fp)
+        except (OSError, ValueError, struct.error):
+            pass
+        else:
+            if bloom.generation != generation or \
+                    bloom.count > bloom.capacity:
+                bloom = None
+
+        if bloom is None:
+            count = cursor.execute(
+                "SELECT COUNT(*) FROM archive").fetchone()[0]
+            bloom = BloomFilter(max(count * 2, 1024))
+            add = bloom.add
+            for entry, in cursor.execute("SELECT entry FROM archive"):
+                add(entry)
+            bloom.generation = generation
+            bloom.path = path
+            bloom.dirty = True
+            action = "Built"
+        else:
+            bloom.path = path
+            action = "Loaded"
+
+        if log:
+            log.debug("%s archive filter for %s entries in %.2fs (%s KiB)",
+                      action, bloom.count, time.monotonic() - start,
+                      len(bloom.bits) // 1024)
+        self.bloom = bloom
+
+    def _generation_init(self):
+        """Set up the generation counter and return its current value
+
+        Only called when a filter is in use, to leave archives
+        without one unchanged.
+        """
+        cursor = self.cursor
+        with self.connection:
+            cursor.execute("BEGIN")
+            cursor.execute("CREATE TABLE IF NOT EXISTS archive_generation "
+                           "(value INTEGER NOT NULL)")
+            cursor.execute("INSERT INTO archive_generation (value) "
+                           "SELECT 0 WHERE NOT EXISTS "
+                           "(SELECT 1 FROM archive_generation)")
+            cursor.execute("CREATE TRIGGER IF NOT EXISTS archive_insert "
+                           "AFTER INSERT ON archive BEGIN "
+                           "UPDATE archive_generation SET value = value + 1; "
+                           "END")
+            return self._generation()
+
+    def _generation(self):
+        return self.cursor.execute(
+            "SELECT value FROM archive_generation").fetchone()[0]
+
+    def _close_filter(self):
+        """Store the current filter if it matches the archive"""
+        bloom = self.bloom
+        generation = self._generation()
+        if generation != bloom.generation + self._inserted:
+            # archive got modified by another process
+            return
+        if generation == bloom.generation and not bloom.dirty:
+            return
+        bloom.generation = generation
+
+        temp = bloom.path + ".part"
+        try:
+            with open(temp, "wb") as fp:
+                bloom.dump(fp)
+            os.replace(temp, bloom.path)
+        except OSError:
+            pass
+
+    def _select_many(self, keys, chunk_size=500):
+        """Return the set of 'keys' present in the archive table"""
+        bloom = self.bloom
+        if bloom is not None:
+            keys = [key for key in keys if key in bloom]
+
+        found = set()
+        cursor = self.cursor
+        for i in range(0, len(keys), chunk_size):
+            chunk = keys[i:i+chunk_size]
+            cursor.execute(
+                "SELECT entry FROM archive WHERE entry IN (" +
+                ",".join("?" * len(chunk)) + ")", chunk)
+            found.update(row[0] for row in cursor)
+        return found
+
+    def _insert_many(self, keys):
+        """Insert all 'keys' into the archive table in one transaction"""
+        cursor = self.cursor
+        with self.connection:
+            try:
+                cursor.execute("BEGIN")
+            except sqlite3.OperationalError:
+                pass
+
+            stmt = "INSERT OR IGNORE INTO archive (entry) VALUES (?)"
+            if len(keys) < 100:
+                for key in keys:
+                    cursor.execute(stmt, (key,))
+                    self._inserted += cursor.rowcount
+            else:
+                cursor.executemany(stmt, ((key,) for key in keys))
+                self._inserted += cursor.rowcount
+
 
 class DownloadArchiveMemory(DownloadArchive):
 
@@ -67,32 +222,131 @@ class DownloadArchiveMemory(DownloadArchive):
         self.keys = set()
 
     def add(self, kwdict):
-        self.keys.add(
-            kwdict.get(self._cache_key) or
-            self.keygen(kwdict))
+        key = kwdict.get(self._cache_key) or self.keygen(kwdict)
+        if self.bloom is not None:
+            self.bloom.add(key)
+        self.keys.add(key)
 
     def check(self, kwdict):
         key = kwdict[self._cache_key] = self.keygen(kwdict)
         if key in self.keys:
             return True
+        if self.bloom is not None and key not in self.bloom:
+            return False
         self.cursor.execute(
             "SELECT 1 FROM archive WHERE entry=? LIMIT 1", (key,))
         return self.cursor.fetchone()
 
+    def _select_many(self, keys, chunk_size=500):
+        found = DownloadArchive._select_many(self, keys, chunk_size)
+        found.update(self.keys.intersection(keys))
+        return found
+
     def finalize(self):
         if not self.keys:
             return
+        self._insert_many(self.keys)
 
-        cursor = self.cursor
-        with self.connection:
-            try:
-                cursor.execute("BEGIN")
-            except sqlite3.OperationalError:
-                pass
 
-            stmt = "INSERT OR IGNORE INTO archive (entry) VALUES (?)"
-            if len(self.keys) < 100:
-                for key in self.keys:
-                    cursor.execute(stmt, (key,))
-            else:
-                cursor.executemany(stmt, ((key,) for key in self.keys))
+class DownloadArchiveBatch(DownloadArchiveMemory):
+    """Write archive entries in batches
+
+    New entries get committed after 'size' additions or 'interval'
+    seconds, whichever comes first, when the job calls flush()
+    at the end of each post, and when closing the archive.
+    """
+
+    def __init__(self, path, format_string, pragma=None,
+                 cache_key="_archive_key", size=100, interval=5.0):
+        DownloadArchiveMemory.__init__(
+            self, path, format_string, pragma, cache_key)
+        self.size = size
+        self.interval = interval
+        self.timestamp = time.monotonic()
+
+    def add(self, kwdict):
+        DownloadArchiveMemory.add(self, kwdict)
+        if len(self.keys) >= self.size or \
+                time.monotonic() - self.timestamp >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Commit all pending entries"""
+        if self.keys:
+            self._insert_many(self.keys)
+            self.keys.clear()
+        self.timestamp = time.monotonic()
+
+    def finalize(self):
+        self.flush()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            DownloadArchive.close(self)
+
+
+class BloomFilter():
+    """Probabilistic set of strings without false negatives"""
+    HEADER = struct.Struct("<4sQQQI")
+    MAGIC = b"GDBF"
+
+    def __init__(self, capacity, error_rate=0.001, size=None, hashes=None):
+        if size is None:
+            size = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+            size = max((size + 7) // 8, 8)
+        if hashes is None:
+            hashes = max(int(round(size * 8 / capacity * math.log(2))), 1)
+        self.bits = bytearray(size)
+        self.size = size * 8
+        self.hashes = hashes
+        self.capacity = capacity
+        self.count = 0
+        self.generation = 0
+        self.path = None
+        self.dirty = False
+
+    def add(self, key):
+        bits = self.bits
+        for index in self._indices(key):
+            bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+        self.dirty = True
+
+    def __contains__(self, key):
+        bits = self.bits
+        for index in self._indices(key):
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+
+    def _indices(self, key):
+        digest = hashlib.md5(key.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def dump(self, fp):
+        fp.write(self.HEADER.pack(
+            self.MAGIC, self.generation, self.capacity,
+            self.count, self.hashes))
+        fp.write(self.bits)
+
+    @classmethod
+    def load(cls, fp):
+        magic, generation, capacity, count, hashes = cls.HEADER.unpack(
+            fp.read(cls.HEADER.size))
+        if magic != cls.MAGIC:
+            raise ValueError("invalid filter file")
+        bits = fp.read()
+
+        bloom = cls(capacity, size=0, hashes=hashes)
+        bloom.bits = bytearray(bits)
+        bloom.size = len(bits) * 8
+        bloom.count = count
+        bloom.generation = generation
+        if not bloom.size:
+            raise ValueError("empty filter file")
+        return bloom
@@ -13,6 +13,7 @@ import pickle
 import time
 import os
 import functools
+import threading
 from . import config, util
 
 
@@ -69,8 +70,9 @@ class MemoryCacheDecorator(CacheDecorator):
 
 class DatabaseCacheDecorator():
     """Database cache"""
-    db = None
+    path = None
     _init = True
+    _local = threading.local()
 
     def __init__(self, func, keyarg, maxage):
         self.key = "%s.%s" % (func.__module__, func.__name__)
@@ -94,38 +96,65 @@ class DatabaseCacheDecorator():
         except KeyError:
             pass
 
+        db = self.database()
+        if db is None:
+            # database not available
+            value = self.func(*args, **kwargs)
+            expires = timestamp + self.maxage
+            self.cache[key] = value, expires
+            return value
+
         # database lookup
+        #   a plain read, which does not block or get blocked by other
+        #   connections in WAL mode
         fullkey = "%s-%s" % (self.key, key)
-        with self.database() as db:
-            cursor = db.cursor()
+        result = self._select(db, fullkey, timestamp)
+
+        if result:
+            value, expires = result
+        else:
+            # acquire the write lock before calling 'func'
+            # to let other processes wait for its result
+            # instead of, for example, logging in a second time
+            nested = db.in_transaction
+            if not nested:
+                db.execute("BEGIN IMMEDIATE")
             try:
-                cursor.execute("BEGIN EXCLUSIVE")
-            except sqlite3.OperationalError:
-                pass  # Silently swallow exception - workaround for Python 3.6
-            cursor.execute(
-                "SELECT value, expires FROM data WHERE key=? LIMIT 1",
-                (fullkey,),
-            )
-            result = cursor.fetchone()
-
-            if result and result[1] > timestamp:
-                value, expires = result
-                value = pickle.loads(value)
-            else:
-                value = self.func(*args, **kwargs)
-                expires = timestamp + self.maxage
-                cursor.execute(
-                    "INSERT OR REPLACE INTO data VALUES (?,?,?)",
-                    (fullkey, pickle.dumps(value), expires),
-                )
+                result = self._select(db, fullkey, int(time.time()))
+                if result:
+                    value, expires = result
+                else:
+                    value = self.func(*args, **kwargs)
+                    expires = timestamp + self.maxage
+                    db.execute(
+                        "INSERT OR REPLACE INTO data VALUES (?,?,?)",
+                        (fullkey, pickle.dumps(value), expires),
+                    )
+            except BaseException:
+                if not nested:
+                    db.execute("ROLLBACK")
+                raise
+            if not nested:
+                db.execute("COMMIT")
 
         self.cache[key] = value, expires
         return value
 
+    @staticmethod
+    def _select(db, fullkey, timestamp):
+        result = db.execute(
+            "SELECT value, expires FROM data WHERE key=? LIMIT 1",
+            (fullkey,),
+        ).fetchone()
+        if result and result[1] > timestamp:
+            return pickle.loads(result[0]), result[1]
+        return None
+
     def update(self, key, value):
         expires = int(time.time()) + self.maxage
         self.cache[key] = value, expires
-        with self.database() as db:
+        db = self.database()
+        if db is not None:
             db.execute(
                 "INSERT OR REPLACE INTO data VALUES (?,?,?)",
                 ("%s-%s" % (self.key, key), pickle.dumps(value), expires),
@@ -136,20 +165,50 @@ class DatabaseCacheDecorator():
             del self.cache[key]
         except KeyError:
             pass
-        with self.database() as db:
+        db = self.database()
+        if db is not None:
             db.execute(
                 "DELETE FROM data WHERE key=?",
                 ("%s-%s" % (self.key, key),),
             )
 
-    def database(self):
-        if self._init:
-            self.db.execute(
+    @classmethod
+    def database(cls):
+        """Return this thread's database connection"""
+        try:
+            return cls._local.db
+        except AttributeError:
+            pass
+
+        if cls.path is None:
+            _init()
+        if not cls.path:
+            return None
+
+        try:
+            db = sqlite3.connect(cls.path, timeout=60)
+        except sqlite3.OperationalError:
+            cls.path = False
+            return None
+        db.isolation_level = None
+        db.execute("PRAGMA synchronous=NORMAL")
+
+        if cls._init:
+            cls._init = False
+            try:
+                db.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.OperationalError:
+                pass  # e.g. unsupported by the underlying filesystem
+            db.execute(
                 "CREATE TABLE IF NOT EXISTS data "
                 "(key TEXT PRIMARY KEY, value TEXT, expires INTEGER)"
             )
-            DatabaseCacheDecorator._init = False
-        return self.db
+            # remove expired entries
+            db.execute(
+                "DELETE FROM data WHERE expires <= ?", (int(time.time()),))
+
+        cls._local.db = db
+        return db
 
 
 def memcache(maxage=None, keyarg=None):
@@ -169,15 +228,15 @@ def cache(maxage=3600, keyarg=None):
 
 
 def clear(module):
-    """Delete database entries for 'module'"""
-    db = DatabaseCacheDecorator.db
-    if not db:
-        return None
+    """Delete database entries and cached files for 'module'"""
+    rowcount = _clear_directories(module)
 
-    rowcount = 0
-    cursor = db.cursor()
+    db = DatabaseCacheDecorator.database()
+    if db is None:
+        return rowcount or None
 
     try:
+        cursor = db.cursor()
         if module == "ALL":
             cursor.execute("DELETE FROM data")
         else:
@@ -189,14 +248,79 @@ def clear(module):
     except sqlite3.OperationalError:
         pass  # database not initialized, cannot be modified, etc.
     else:
-        rowcount = cursor.rowcount
-        db.commit()
-        if rowcount:
+        if cursor.rowcount:
+            rowcount += cursor.rowcount
             cursor.execute("VACUUM")
     return rowcount
 
 
-def _path():
+def directory(name, maxage=None):
+    """Return the path of the directory for cached files of 'name'
+
+    The directory is located next to the database file
+    and does not get created by this function.
+    Files in it not used for more than 'maxage' seconds
+    get deleted when calling this function for the first time.
+
+    Return None if there is no database file.
+    """
+    path = _directories()
+    if not path:
+        return None
+    path = os.path.join(path, name)
+
+    if maxage and name not in _expired:
+        _expired.add(name)
+        expires = time.time() - maxage
+        for file in _listdir(path):
+            try:
+                if os.stat(file).st_atime < expires:
+                    os.unlink(file)
+            except OSError:
+                pass
+    return path
+
+
+_expired = set()
+
+
+def _directories():
+    path = _path(False)
+    if not path or path == ":memory:":
+        return None
+    return os.path.splitext(path)[0] + ".d"
+
+
+def _clear_directories(module):
+    path = _directories()
+    if not path:
+        return 0
+
+    if module == "ALL":
+        paths = _listdir(path)
+    else:
+        paths = (os.path.join(path, module.lower()),)
+
+    count = 0
+    for path in paths:
+        for file in _listdir(path):
+            try:
+                os.unlink(file)
+                count += 1
+            except OSError:
+                pass
+        util.remove_directory(path)
+    return count
+
+
+def _listdir(path):
+    try:
+        return [os.path.join(path, name) for name in os.listdir(path)]
+    except OSError:
+        return ()
+
+
+def _path(create=True):
     path = config.get(("cache",), "file", util.SENTINEL)
     if path is not util.SENTINEL:
         return util.expand_path(path)
@@ -207,22 +331,25 @@ def _path():
         cachedir = os.environ.get("XDG_CACHE_HOME", "~/.cache")
 
     cachedir = util.expand_path(os.path.join(cachedir, "gallery-dl"))
-    os.makedirs(cachedir, exist_ok=True)
+    if create:
+        os.makedirs(cachedir, exist_ok=True)
     return os.path.join(cachedir, "cache.sqlite3")
 
 
 def _init():
+    """Set up the database file
+
+    Called on first database access
+    to not slow down program startup.
+    """
     try:
         dbfile = _path()
 
         # restrict access permissions for new db files
         os.close(os.open(dbfile, os.O_CREAT | os.O_RDONLY, 0o600))
 
-        DatabaseCacheDecorator.db = sqlite3.connect(
-            dbfile, timeout=60, check_same_thread=False)
-    except (OSError, TypeError, sqlite3.OperationalError):
-        global cache
-        cache = memcache
-
-
-_init()
+        DatabaseCacheDecorator.path = dbfile
+        DatabaseCacheDecorator._init = True
+        DatabaseCacheDecorator._local = threading.local()
+    except (OSError, TypeError):
+        DatabaseCacheDecorator.path = False
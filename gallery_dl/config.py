@@ -21,6 +21,7 @@ log = logging.getLogger("config")
 
 _config = {}
 _files = []
+_generation = 0
 
 if util.WINDOWS:
     _default_configs = [
@@ -184,6 +185,7 @@ def load(files=None, strict=False, loads=util.json_loads):
             else:
                 util.combine_dict(_config, conf)
             _files.append(pathfmt)
+            _invalidate()
 
             if "subconfigs" in conf:
                 subconfigs = conf["subconfigs"]
@@ -196,6 +198,7 @@ def load(files=None, strict=False, loads=util.json_loads):
 def clear():
     """Reset configuration to an empty state"""
     _config.clear()
+    _invalidate()
 
 
 def get(path, key, default=None, conf=_config):
@@ -281,6 +284,7 @@ def set(path, key, value, conf=_config):
         except KeyError:
             conf[p] = conf = {}
     conf[key] = value
+    _invalidate()
 
 
 def setdefault(path, key, value, conf=_config):
@@ -290,6 +294,7 @@ def setdefault(path, key, value, conf=_config):
             conf = conf[p]
         except KeyError:
             conf[p] = conf = {}
+    _invalidate()
     return conf.setdefault(key, value)
 
 
@@ -301,6 +306,7 @@ def unset(path, key, conf=_config):
         del conf[key]
     except Exception:
         pass
+    _invalidate()
 
 
 class apply():
@@ -321,3 +327,41 @@ class apply():
                 unset(path, key)
             else:
                 set(path, key, value)
+
+
+class Snapshot():
+    """Cache interpolated values along a config path
+
+    Results get discarded whenever the configuration is modified
+    through this module's functions ('set()', 'unset()', 'load()', etc).
+    If 'common' is given, 'path' is a list of paths along a 'common'
+    ancestor, like the 'paths' argument of 'interpolate_common()'.
+    """
+
+    def __init__(self, path, common=None):
+        self.path = path
+        self.common = common
+        self.values = {}
+        self.generation = _generation
+
+    def get(self, key, default=None):
+        """Return the interpolated value of 'key'"""
+        if self.generation != _generation:
+            self.values.clear()
+            self.generation = _generation
+
+        try:
+            value = self.values[key]
+        except KeyError:
+            if self.common is None:
+                value = interpolate(self.path, key, util.SENTINEL)
+            else:
+                value = interpolate_common(
+                    self.common, self.path, key, util.SENTINEL)
+            self.values[key] = value
+        return default if value is util.SENTINEL else value
+
+
+def _invalidate():
+    global _generation
+    _generation += 1
@@ -17,11 +17,14 @@ class DownloaderBase():
     scheme = ""
 
     def __init__(self, job):
+        self.config_snapshot = config.Snapshot(("downloader", self.scheme))
         self.out = job.out
         self.session = job.extractor.session
         self.part = self.config("part", True)
         self.partdir = self.config("part-directory")
         self.log = job.get_logger("downloader." + self.scheme)
+        # set by download workers to stop running downloads
+        self.stop_event = None
 
         if self.partdir:
             self.partdir = util.expand_path(self.partdir)
@@ -35,7 +38,7 @@ class DownloaderBase():
 
     def config(self, key, default=None):
         """Interpolate downloader config value for 'key'"""
-        return config.interpolate(("downloader", self.scheme), key, default)
+        return self.config_snapshot.get(key, default)
 
     def download(self, url, pathfmt):
         """Write data from 'url' into the file specified by 'pathfmt'"""
@@ -8,11 +8,19 @@
 
 """Downloader module for http:// and https:// URLs"""
 
+import os
+import json
 import time
+import hashlib
 import mimetypes
+import threading
+import email.utils
+import concurrent.futures
 from requests.exceptions import RequestException, ConnectionError, Timeout
 from .common import DownloaderBase
-from .. import text, util
+from .. import text, util, exception
+from ..extractor.common import connection_counter
+from ..cache import cache
 from ssl import SSLError
 
 
@@ -38,8 +46,22 @@ class HttpDownloader(DownloaderBase):
         self.verify = self.config("verify", extractor._verify)
         self.mtime = self.config("mtime", True)
         self.rate = self.config("rate")
-
-        if not self.config("consume-content", False):
+        self.precheck = self.config("precheck", False)
+        self.conditional = self.config("conditional", False)
+        self.segments = self.config("segments", 1)
+        self.segment_min = self.config("segment-min-size", 10485760)
+
+        consume = self.config("consume-content", False)
+        if consume and consume is not True:
+            consume_max = consume if isinstance(consume, int) else \
+                text.parse_bytes(consume)
+            if consume_max:
+                self.consume_max = consume_max
+            else:
+                self.log.warning(
+                    "Invalid maximum consume size (%r)", consume)
+                consume = False
+        if not consume:
             # this resets the underlying TCP connection, and therefore
             # if the program makes another request to the same domain,
             # a new connection (either TLS or plain TCP) must be made
@@ -66,6 +88,13 @@ class HttpDownloader(DownloaderBase):
                     "Invalid chunk size (%r)", self.chunk_size)
                 chunk_size = 32768
             self.chunk_size = chunk_size
+        if isinstance(self.segment_min, str):
+            segment_min = text.parse_bytes(self.segment_min)
+            if not segment_min:
+                self.log.warning(
+                    "Invalid minimum segment size (%r)", self.segment_min)
+                segment_min = 10485760
+            self.segment_min = segment_min
         if self.rate:
             rate = text.parse_bytes(self.rate)
             if rate:
@@ -103,9 +132,40 @@ class HttpDownloader(DownloaderBase):
         adjust_extension = kwdict.get(
             "_http_adjust_extension", self.adjust_extension)
 
+        limiter = util.ratelimiter(url.partition("://")[2].partition("/")[0])
+
+        # whether 'pathfmt' contains the final path of this file
+        path_built = pathfmt.extension and not metadata
+
+        if self.precheck and not path_built and \
+                "_http_method" not in kwdict:
+            result = self._precheck(url, pathfmt, metadata, limiter)
+            if result is not None:
+                if result:
+                    return True
+                path_built = True
+
         if self.part and not metadata:
             pathfmt.part_enable(self.partdir)
 
+        # state of an interrupted segmented download
+        segments = None
+
+        # send 'If-Modified-Since' and 'If-None-Match'
+        # for already existing files
+        conditional = None
+        if self.conditional and path_built:
+            try:
+                stat = os.stat(pathfmt.realpath)
+            except OSError:
+                pass
+            else:
+                conditional = {"If-Modified-Since": email.utils.formatdate(
+                    stat.st_mtime, usegmt=True)}
+                etag = _etag_cache(pathfmt.realpath)
+                if etag and etag[1] == stat.st_size:
+                    conditional["If-None-Match"] = etag[0]
+
         while True:
             if tries:
                 if response:
@@ -116,22 +176,28 @@ class HttpDownloader(DownloaderBase):
                     return False
                 time.sleep(tries)
 
+            # wait for rate limits imposed on this host
+            seconds = limiter.reserve()
+            if seconds > 0.0:
+                self.log.debug("Sleeping %.2f seconds (rate limit)", seconds)
+                time.sleep(seconds)
+
             tries += 1
             file_header = None
 
             # collect HTTP headers
-            headers = {"Accept": "*/*"}
-            #   file-specific headers
-            extra = kwdict.get("_http_headers")
-            if extra:
-                headers.update(extra)
-            #   general headers
-            if self.headers:
-                headers.update(self.headers)
+            headers = self._headers(kwdict)
             #   partial content
             file_size = pathfmt.part_size()
+            if file_size:
+                segments = self._segments_load(pathfmt)
+                if segments is not None:
+                    file_size = 0
             if file_size:
                 headers["Range"] = "bytes={}-".format(file_size)
+            #   conditional request
+            elif conditional:
+                headers.update(conditional)
 
             # connect to (remote) source
             try:
@@ -161,8 +227,16 @@ class HttpDownloader(DownloaderBase):
                 size = response.headers["Content-Range"].rpartition("/")[2]
             elif code == 416 and file_size:  # Requested Range Not Satisfiable
                 break
+            elif code == 304 and conditional:  # Not Modified
+                self.release_conn(response)
+                self.log.debug("'%s' not modified", pathfmt.realpath)
+                pathfmt.temppath = ""
+                return True
             else:
                 msg = "'{} {}' for '{}'".format(code, response.reason, url)
+                if code == 429:
+                    # let other downloads from this host wait as well
+                    limiter.block(self._retry_after(response, tries))
                 if code in self.retry_codes or 500 <= code < 600:
                     continue
                 retry = kwdict.get("_http_retry")
@@ -224,14 +298,14 @@ class HttpDownloader(DownloaderBase):
                 pathfmt.build_path()
                 if pathfmt.exists():
                     pathfmt.temppath = ""
-                    # release the connection back to pool by explicitly
-                    # calling .close()
+                    # only consume small responses and
+                    # close the connection otherwise
                     # see https://requests.readthedocs.io/en/latest/user
                     # /advanced/#body-content-workflow
-                    # when the image size is on the order of megabytes,
-                    # re-establishing a TLS connection will typically be faster
-                    # than consuming the whole response
-                    response.close()
+                    if self.consume_max:
+                        self.release_conn(response)
+                    else:
+                        response.close()
                     return True
                 if self.part and metadata:
                     pathfmt.part_enable(self.partdir)
@@ -253,36 +327,75 @@ class HttpDownloader(DownloaderBase):
                 if self._adjust_extension(pathfmt, file_header) and \
                         pathfmt.exists():
                     pathfmt.temppath = ""
-                    response.close()
+                    if self.consume_max:
+                        self.release_conn(response)
+                    else:
+                        response.close()
                     return True
 
+            # download content in multiple segments
+            if segments and segments.get("size") != size:
+                segments = {}
+            if code == 200 and size and self.part and (
+                segments or
+                    self.segments > 1 and not self.rate and
+                    size >= self.segment_min * 2 and
+                    response.headers.get("Accept-Ranges") == "bytes"):
+                self.downloading = True
+                if not self._download_segmented(
+                        url, pathfmt, response, content, file_header,
+                        size, segments, limiter):
+                    self.downloading = False
+                    return False
+                break
+
             # set open mode
             if not offset:
                 mode = "w+b"
                 if file_size:
                     self.log.debug("Unable to resume partial download")
+                elif segments is not None:
+                    self.log.debug("Unable to resume segmented download")
+                    segments = None
+                    util.remove_file(pathfmt.temppath + ".segments")
             else:
                 mode = "r+b"
                 self.log.debug("Resuming download at byte %d", offset)
 
             # download content
             self.downloading = True
-            with pathfmt.open(mode) as fp:
-                if file_header:
-                    fp.write(file_header)
-                    offset += len(file_header)
-                elif offset:
+            stream = pathfmt.stream(pathfmt, size) \
+                if pathfmt.stream and not offset else None
+            with stream or pathfmt.open(mode) as fp:
+                if offset:
                     if adjust_extension and \
                             pathfmt.extension in SIGNATURE_CHECKS:
                         self._adjust_extension(pathfmt, fp.read(16))
                     fp.seek(offset)
 
+                if pathfmt.digests:
+                    hashes = self._hashes_init(pathfmt.digests, fp, offset)
+                    updates = [h.update for h in hashes.values()]
+                else:
+                    hashes = updates = None
+                if self.stop_event is not None:
+                    updates = (updates or []) + [self._check_stop]
+
+                if file_header:
+                    fp.write(file_header)
+                    offset += len(file_header)
+                    if updates:
+                        for update in updates:
+                            update(file_header)
+
                 self.out.start(pathfmt.path)
                 try:
-                    self.receive(fp, content, size, offset)
+                    self.receive(fp, content, size, offset, updates)
                 except (RequestException, SSLError) as exc:
                     msg = str(exc)
                     print()
+                    if stream:
+                        stream.abort()
                     continue
 
                 # check file size
@@ -290,11 +403,18 @@ class HttpDownloader(DownloaderBase):
                     msg = "file size mismatch ({} < {})".format(
                         fp.tell(), size)
                     print()
+                    if stream:
+                        stream.abort()
                     continue
 
+            if hashes:
+                pathfmt.hashes_set(hashes, pathfmt.temppath)
+
             break
 
         self.downloading = False
+        if self.conditional:
+            self._etag_store(pathfmt, response)
         if self.mtime:
             kwdict.setdefault("_mtime", response.headers.get("Last-Modified"))
         else:
@@ -302,11 +422,315 @@ class HttpDownloader(DownloaderBase):
 
         return True
 
+    @staticmethod
+    def _etag_store(pathfmt, response):
+        """Remember the 'ETag' of a downloaded file"""
+        etag = response.headers.get("ETag")
+        if etag:
+            try:
+                size = os.stat(pathfmt.temppath).st_size
+            except OSError:
+                return
+            _etag_cache.update(pathfmt.realpath, (etag, size))
+
+    def _precheck(self, url, pathfmt, metadata, limiter):
+        """Build and check a file's path using only response headers
+
+        Return True if the file can be skipped,
+        False if it needs to be downloaded,
+        and None if the check was not possible.
+        """
+        kwdict = pathfmt.kwdict
+        headers = self._headers(kwdict)
+        if self.precheck == "range":
+            method = "GET"
+            headers["Range"] = "bytes=0-0"
+        else:
+            method = "HEAD"
+
+        seconds = limiter.reserve()
+        if seconds > 0.0:
+            self.log.debug("Sleeping %.2f seconds (rate limit)", seconds)
+            time.sleep(seconds)
+
+        try:
+            response = self.session.request(
+                method, url,
+                stream=True,
+                headers=headers,
+                timeout=self.timeout,
+                proxies=self.proxies,
+                verify=self.verify,
+            )
+        except Exception as exc:
+            self.log.debug("Unable to check '%s' (%s: %s)",
+                           url, exc.__class__.__name__, exc)
+            return None
+
+        try:
+            code = response.status_code
+            if code == 200:
+                size = response.headers.get("Content-Length")
+            elif code == 206:
+                size = response.headers.get(
+                    "Content-Range", "").rpartition("/")[2]
+            else:
+                self.log.debug("Unable to check '%s' ('%s %s')",
+                               url, code, response.reason)
+                return None
+
+            size = text.parse_int(size, None)
+            if size is not None:
+                if self.minsize and size < self.minsize or \
+                        self.maxsize and size > self.maxsize:
+                    # let the actual download handle these
+                    return None
+
+            if not pathfmt.extension:
+                pathfmt.set_extension(self._find_extension(response))
+            if metadata:
+                kwdict[metadata] = util.extract_headers(response)
+            pathfmt.build_path()
+
+            if pathfmt.exists():
+                pathfmt.temppath = ""
+                return True
+            return False
+        finally:
+            self.release_conn(response)
+
+    def _download_segmented(self, url, pathfmt, response, content,
+                            file_header, size, state, limiter):
+        """Download 'url' in multiple segments over separate connections"""
+        path = pathfmt.temppath
+        path_state = path + ".segments"
+
+        if state:
+            segments = state["segments"]
+            self.log.debug("Resuming segmented download (%s/%s bytes)",
+                           sum(seg[2] - seg[0] for seg in segments), size)
+        else:
+            num = min(self.segments, size // self.segment_min)
+            step = -(-size // num)
+            segments = [
+                [start, min(start + step, size), start]
+                for start in range(0, size, step)
+            ]
+            self.log.debug("Downloading %s bytes in %s segments",
+                           size, len(segments))
+            with pathfmt.open("wb") as fp:
+                # store its state before extending the '.part' file,
+                # which would otherwise look like a regular partial download
+                self._segments_save(path_state, size, segments)
+                fp.truncate(size)
+                if file_header:
+                    fp.write(file_header)
+                    segments[0][2] = len(file_header)
+
+        # reuse the current response for the first segment
+        first = segments[0]
+        if first[2] != (len(file_header) if file_header else 0) or \
+                first[2] >= first[1]:
+            response.close()
+            response = content = None
+
+        self.out.start(pathfmt.path)
+        pending = [seg for seg in segments if seg[2] < seg[1]]
+        progress = self.progress
+        bytes_start = sum(seg[2] - seg[0] for seg in segments)
+        time_start = time.monotonic()
+        stop = threading.Event()
+        counter = connection_counter()
+
+        with concurrent.futures.ThreadPoolExecutor(len(pending) or 1) as pool:
+            futures = [
+                pool.submit(self._download_segment, url, path, seg,
+                            pathfmt.kwdict, limiter, stop, counter,
+                            response, content)
+                if seg is first else
+                pool.submit(self._download_segment, url, path, seg,
+                            pathfmt.kwdict, limiter, stop, counter)
+                for seg in pending
+            ]
+
+            try:
+                while True:
+                    _, running = concurrent.futures.wait(futures, 1.0)
+                    self._segments_save(path_state, size, segments)
+                    if not running:
+                        break
+                    if self.stop_event is not None:
+                        self._check_stop()
+                    if progress is not None:
+                        time_elapsed = time.monotonic() - time_start
+                        if time_elapsed > progress:
+                            bytes_done = sum(
+                                seg[2] - seg[0] for seg in segments)
+                            self.out.progress(
+                                size, bytes_done,
+                                int((bytes_done - bytes_start) /
+                                    time_elapsed))
+            except BaseException:
+                stop.set()
+                raise
+            finally:
+                self._segments_save(path_state, size, segments)
+
+        for future in futures:
+            exc = future.exception()
+            if exc is not None:
+                self.log.warning("Segment download failed (%s: %s)",
+                                 exc.__class__.__name__, exc)
+
+        if any(seg[2] < seg[1] for seg in segments):
+            return False
+        util.remove_file(path_state)
+        return True
+
+    def _download_segment(self, url, path, segment, kwdict, limiter, stop,
+                          counter=None, response=None, content=None):
+        """Download bytes 'segment[2]' to 'segment[1]' of 'url'"""
+        connection_counter(counter)
+        end = segment[1]
+        tries = 0
+
+        with open(path, "r+b", buffering=0) as fp:
+            while segment[2] < end:
+                if stop.is_set():
+                    if response is not None:
+                        response.close()
+                    return False
+                if content is None:
+                    if tries:
+                        if tries > self.retries:
+                            return False
+                        time.sleep(tries)
+                    tries += 1
+
+                    seconds = limiter.reserve()
+                    if seconds > 0.0:
+                        time.sleep(seconds)
+
+                    headers = self._headers(kwdict)
+                    headers["Range"] = "bytes={}-{}".format(
+                        segment[2], end - 1)
+                    try:
+                        response = self.session.request(
+                            "GET", url,
+                            stream=True,
+                            headers=headers,
+                            timeout=self.timeout,
+                            proxies=self.proxies,
+                            verify=self.verify,
+                        )
+                    except (ConnectionError, Timeout) as exc:
+                        self.log.debug("%s: %s", exc.__class__.__name__, exc)
+                        continue
+
+                    code = response.status_code
+                    if code != 206:
+                        response.close()
+                        self.log.debug("'%s %s' for segment %s-%s",
+                                       code, response.reason,
+                                       segment[2], end - 1)
+                        if code in self.retry_codes or 500 <= code < 600:
+                            continue
+                        return False
+                    content = response.iter_content(self.chunk_size)
+
+                fp.seek(segment[2])
+                try:
+                    for data in content:
+                        if stop.is_set():
+                            break
+                        remaining = end - segment[2]
+                        if len(data) >= remaining:
+                            fp.write(data[:remaining])
+                            segment[2] = end
+                            break
+                        fp.write(data)
+                        segment[2] += len(data)
+                except (RequestException, SSLError) as exc:
+                    self.log.debug("%s: %s", exc.__class__.__name__, exc)
+                finally:
+                    response.close()
+                    content = None
+
+        return True
+
+    def _segments_load(self, pathfmt):
+        """Load the state of an interrupted segmented download
+
+        Return None if there is none, or an empty dict
+        after discarding its '.part' file if it is unusable.
+        """
+        path = pathfmt.temppath + ".segments"
+        try:
+            with open(path) as fp:
+                state = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            state = None
+
+        try:
+            if all(0 <= seg[0] <= seg[2] <= seg[1] <= state["size"]
+                   for seg in state["segments"]):
+                return state
+        except Exception:
+            pass
+
+        # the '.part' file has holes at unknown positions
+        self.log.debug("Discarding segmented download with invalid state")
+        util.remove_file(pathfmt.temppath)
+        util.remove_file(path)
+        return {}
+
+    @staticmethod
+    def _segments_save(path, size, segments):
+        """Store the current state of a segmented download"""
+        temppath = path + ".tmp"
+        with open(temppath, "w") as fp:
+            json.dump({"size": size, "segments": segments}, fp)
+        os.replace(temppath, path)
+
+    def _headers(self, kwdict):
+        """Return HTTP headers for downloading 'kwdict'"""
+        headers = {"Accept": "*/*"}
+        #   file-specific headers
+        extra = kwdict.get("_http_headers")
+        if extra:
+            headers.update(extra)
+        #   general headers
+        if self.headers:
+            headers.update(self.headers)
+        return headers
+
+    consume_max = None
+
     def release_conn(self, response):
-        """Release connection back to pool by consuming response body"""
+        """Release connection back to pool by consuming response body
+
+        Close the connection instead when there are more than
+        'consume_max' bytes left to consume.
+        (When a file's size is on the order of megabytes,
+        re-establishing a TLS connection will typically be faster
+        than consuming the whole response.)
+        """
+        consume_max = self.consume_max
         try:
-            for _ in response.iter_content(self.chunk_size):
-                pass
+            if consume_max:
+                size = text.parse_int(
+                    response.headers.get("Content-Length"), None)
+                if size is not None and size > consume_max:
+                    return response.close()
+
+            consumed = 0
+            for data in response.iter_content(self.chunk_size):
+                if consume_max:
+                    consumed += len(data)
+                    if consumed > consume_max:
+                        return response.close()
         except (RequestException, SSLError) as exc:
             print()
             self.log.debug(
@@ -315,12 +739,39 @@ class HttpDownloader(DownloaderBase):
             response.close()
 
     @staticmethod
-    def receive(fp, content, bytes_total, bytes_start):
+    def _retry_after(response, default):
+        """Return the number of seconds a 429 response asks to wait"""
+        value = response.headers.get("Retry-After")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+            try:
+                return email.utils.mktime_tz(
+                    email.utils.parsedate_tz(value)) - time.time()
+            except Exception:
+                pass
+        return default
+
+    def _check_stop(self, _=None):
+        if self.stop_event.is_set():
+            raise exception.TerminateExtraction()
+
+    @staticmethod
+    def receive(fp, content, bytes_total, bytes_start, updates=None):
         write = fp.write
-        for data in content:
-            write(data)
+        if updates:
+            for data in content:
+                write(data)
+                for update in updates:
+                    update(data)
+        else:
+            for data in content:
+                write(data)
 
-    def _receive_rate(self, fp, content, bytes_total, bytes_start):
+    def _receive_rate(self, fp, content, bytes_total, bytes_start,
+                      updates=None):
         rate = self.rate
         write = fp.write
         progress = self.progress
@@ -333,6 +784,9 @@ class HttpDownloader(DownloaderBase):
             bytes_downloaded += len(data)
 
             write(data)
+            if updates:
+                for update in updates:
+                    update(data)
 
             if progress is not None:
                 if time_elapsed > progress:
@@ -347,6 +801,35 @@ class HttpDownloader(DownloaderBase):
                 if time_expected > time_elapsed:
                     time.sleep(time_expected - time_elapsed)
 
+    def _hashes_init(self, digests, fp, offset):
+        """Create hash objects and feed them the first 'offset' bytes of 'fp'
+
+        These are bytes already on disk from a previous (partial) download
+        or a file header written before the actual download.
+        """
+        hashes = {}
+        for name in digests:
+            try:
+                hashes[name] = hashlib.new(name)
+            except ValueError as exc:
+                self.log.debug("Unable to compute '%s' hash (%s)", name, exc)
+
+        if offset and hashes:
+            fp.seek(0)
+            chunk_size = self.chunk_size
+            updates = [h.update for h in hashes.values()]
+            remaining = offset
+            while remaining > 0:
+                data = fp.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                for update in updates:
+                    update(data)
+            fp.seek(offset)
+
+        return hashes
+
     def _find_extension(self, response):
         """Get filename extension from MIME type"""
         mtype = response.headers.get("Content-Type", "image/jpeg")
@@ -470,4 +953,10 @@ SIGNATURE_CHECKS = {
     "bin" : lambda s: False,
 }
 
+
+@cache(maxage=90*86400, keyarg=0)
+def _etag_cache(path):
+    return None
+
+
 __downloader__ = HttpDownloader
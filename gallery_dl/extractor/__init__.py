@@ -8,6 +8,8 @@
 
 import sys
 import re
+import os
+import collections
 
 modules = [
     "2ch",
@@ -212,6 +214,11 @@ modules = [
 
 def find(url):
     """Find a suitable extractor for the given URL"""
+    if _module_iter is _module_iter_default:
+        index = _index_load()
+        if index:
+            return index.find(url)
+
     for cls in _list_classes():
         match = cls.pattern.match(url)
         if match:
@@ -223,15 +230,14 @@ def add(cls):
     """Add 'cls' to the list of available extractors"""
     cls.pattern = re.compile(cls.pattern)
     _cache.append(cls)
+    _extra.append(cls)
     return cls
 
 
 def add_module(module):
     """Add all extractors in 'module' to the list of available extractors"""
-    classes = _get_classes(module)
-    for cls in classes:
-        cls.pattern = re.compile(cls.pattern)
-    _cache.extend(classes)
+    classes = _add_module(module)
+    _extra.extend(classes)
     return classes
 
 
@@ -252,11 +258,19 @@ def _list_classes():
     yield from _cache
 
     for module in _module_iter:
-        yield from add_module(module)
+        yield from _add_module(module)
 
     globals()["_list_classes"] = lambda : _cache
 
 
+def _add_module(module):
+    classes = _get_classes(module)
+    for cls in classes:
+        cls.pattern = re.compile(cls.pattern)
+    _cache.extend(classes)
+    return classes
+
+
 def _modules_internal():
     globals_ = globals()
     for module_name in modules:
@@ -284,5 +298,254 @@ def _get_classes(module):
     ]
 
 
+class DispatchIndex():
+    """Map literal strings required by extractor patterns to their classes
+
+    Lets find() try only the few extractors whose pattern can possibly
+    match a given URL and import only the modules they are defined in.
+    """
+
+    def __init__(self, entries, bases=()):
+        self.entries = entries
+        self.bases = bases
+        self.classes = [None] * len(entries)
+
+        literals = {}
+        for position, entry in enumerate(entries):
+            for literal in entry[2]:
+                try:
+                    literals[literal].append(position)
+                except KeyError:
+                    literals[literal] = [position]
+
+        # file each literal under its least common trigram
+        counts = collections.Counter()
+        for literal in literals:
+            counts.update(_trigrams(literal))
+
+        self.short = []
+        self.trigrams = {}
+        for literal, positions in literals.items():
+            if len(literal) < 3:
+                self.short.append((literal, positions))
+                continue
+            trigram = min(_trigrams(literal), key=counts.__getitem__)
+            try:
+                self.trigrams[trigram].append((literal, positions))
+            except KeyError:
+                self.trigrams[trigram] = [(literal, positions)]
+
+    def find(self, url):
+        """Find a suitable extractor for the given URL"""
+        for cls in self.candidates(url):
+            match = cls.pattern.match(url)
+            if match:
+                return cls(match)
+        return None
+
+    def candidates(self, url):
+        """Yield all extractor classes that might match 'url' in order"""
+        yield from _extra
+
+        url_folded = url.translate(_CASEFOLD).lower()
+        positions = set()
+        for literal, literal_positions in self.short:
+            if literal in url_folded:
+                positions.update(literal_positions)
+
+        trigrams = self.trigrams
+        for trigram in _trigrams(url_folded):
+            if trigram in trigrams:
+                for literal, literal_positions in trigrams[trigram]:
+                    if literal in url_folded:
+                        positions.update(literal_positions)
+
+        classes = self.classes
+        for position in sorted(positions):
+            cls = classes[position]
+            if cls is None:
+                cls = classes[position] = self._load(position)
+            yield cls
+
+    def _load(self, position):
+        module_name, class_name, _ = self.entries[position]
+        module = __import__(module_name, globals(), None, (), 1)
+        cls = getattr(module, class_name)
+        cls.pattern = re.compile(cls.pattern)
+        return cls
+
+    @classmethod
+    def build(cls):
+        """Build an index over all internal extractor modules"""
+        try:
+            from re import _parser as sre_parse
+        except ImportError:
+            import sre_parse
+
+        from .common import BaseExtractor
+        globals_ = globals()
+        entries = []
+        bases = set()
+        for module_name in modules:
+            module = __import__(module_name, globals_, None, (), 1)
+            for extr in _get_classes(module):
+                pattern = re.compile(extr.pattern)
+                literals = _required_literals(sre_parse.parse(
+                    pattern.pattern, pattern.flags)) or ("",)
+                entries.append((module_name, extr.__name__, literals))
+                if issubclass(extr, BaseExtractor):
+                    # patterns include user-configured instances
+                    bases.add(extr.basecategory)
+        return cls(entries, sorted(bases))
+
+
+def _required_literals(items):
+    """Return a list of literal strings, one of which every match contains
+
+    Literals are ASCII-only and lowercase.
+    """
+    try:
+        from re import _constants as sre_constants
+    except ImportError:
+        import sre_constants
+    LITERAL = sre_constants.LITERAL
+    AT = sre_constants.AT
+    SUBPATTERN = sre_constants.SUBPATTERN
+    BRANCH = sre_constants.BRANCH
+    REPEAT = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+
+    def select(candidate):
+        nonlocal best, best_len
+        if candidate:
+            length = min(map(len, candidate))
+            if length > best_len:
+                best = candidate
+                best_len = length
+
+    best = None
+    best_len = 0
+    run = []
+
+    for op, av in items:
+        if op is LITERAL and av < 128:
+            run.append(chr(av).lower())
+            continue
+        if op is AT:  # zero-width, e.g. '^' or '\b'
+            continue
+
+        if run:
+            select(("".join(run),))
+            run = []
+
+        if op is SUBPATTERN:
+            select(_required_literals(av[-1]))
+        elif op is BRANCH:
+            alternatives = []
+            for branch in av[1]:
+                literals = _required_literals(branch)
+                if not literals:
+                    break
+                alternatives.extend(literals)
+            else:
+                select(alternatives)
+        elif op in REPEAT and av[0]:
+            select(_required_literals(av[2]))
+
+    if run:
+        select(("".join(run),))
+    return best
+
+
+def _trigrams(string):
+    return {string[i:i+3] for i in range(len(string) - 2)}
+
+
+def _index_key(directory):
+    """Return a string identifying the state of all module files"""
+    from ..version import __version__
+    mtime = 0
+    count = 0
+    for name in os.listdir(directory):
+        if name.endswith(".py"):
+            mtime = max(mtime, os.stat(
+                os.path.join(directory, name)).st_mtime)
+            count += 1
+    return "{}:{}:{}".format(__version__, count, mtime)
+
+
+def _index_instances(bases):
+    """Return a string identifying all configured extractor instances
+    and all options extractor patterns depend on"""
+    from .. import config, util
+    instances = []
+    for basecategory in bases:
+        extra = config.get(("extractor",), basecategory)
+        if isinstance(extra, dict):
+            for category, info in sorted(extra.items()):
+                if isinstance(info, dict) and "root" in info:
+                    instances.append((basecategory, category, info))
+    for category, key in _PATTERN_OPTIONS:
+        instances.append((category, key, config.get(
+            ("extractor", category), key)))
+    return util.json_dumps(instances)
+
+
+def _index_load():
+    """Load the dispatch index from disk or build it"""
+    global _index
+    if _index is not None:
+        return _index
+    _index = False
+
+    from .. import cache
+    path = cache._path()
+    if not path or path == ":memory:":
+        return _index
+    path = os.path.join(os.path.dirname(path), "extractor-index.json")
+
+    import json
+    try:
+        key = _index_key(os.path.dirname(__file__))
+    except OSError:
+        return _index
+
+    try:
+        with open(path) as fp:
+            data = json.load(fp)
+        if data["key"] == key and \
+                data["instances"] == _index_instances(data["bases"]):
+            _index = DispatchIndex(data["entries"], data["bases"])
+            return _index
+    except Exception:
+        pass
+
+    try:
+        _index = DispatchIndex.build()
+        temppath = path + ".part"
+        with open(temppath, "w") as fp:
+            json.dump({
+                "key"      : key,
+                "bases"    : _index.bases,
+                "instances": _index_instances(_index.bases),
+                "entries"  : _index.entries,
+            }, fp)
+        os.replace(temppath, path)
+    except Exception:
+        pass
+    return _index
+
+
+# characters which match ASCII letters when ignoring case
+_CASEFOLD = {0x130: "i", 0x131: "i", 0x17f: "s", 0x212a: "k"}
+
+# options evaluated at import time to build extractor patterns
+_PATTERN_OPTIONS = (
+    ("bunkr"  , "tlds"),
+    ("generic", "enabled"),
+    ("ytdl"   , "enabled"),
+)
+
 _cache = []
-_module_iter = _modules_internal()
+_extra = []
+_index = None
+_module_iter = _module_iter_default = _modules_internal()
@@ -47,6 +47,8 @@ class BooruExtractor(BaseExtractor):
                 continue
 
             if fetch_html:
+                if self.archived(self._archive_kwdict(post, url, data)):
+                    continue
                 html = self._html(post)
                 if tags:
                     self._tags(post, html)
@@ -78,6 +80,12 @@ class BooruExtractor(BaseExtractor):
 
     _file_url = operator.itemgetter("file_url")
 
+    @staticmethod
+    def _archive_kwdict(post, url, data):
+        kwdict = text.nameext_from_url(url, post.copy())
+        kwdict.update(data)
+        return kwdict
+
     def _file_url_list(self, post):
         urls = (post[key] for key in self._file_url_keys if post.get(key))
         post["_fallback"] = it = iter(urls)
@@ -45,7 +45,6 @@ class Extractor():
     request_interval = 0.0
     request_interval_min = 0.0
     request_interval_429 = 60.0
-    request_timestamp = 0.0
 
     def __init__(self, match):
         self.log = logging.getLogger(self.category)
@@ -53,6 +52,7 @@ class Extractor():
         self.match = match
         self.groups = match.groups()
         self._cfgpath = ("extractor", self.category, self.subcategory)
+        self.config_snapshot = config.Snapshot(self._cfgpath)
         self._parentdir = ""
 
     @classmethod
@@ -82,8 +82,17 @@ class Extractor():
     def skip(self, num):
         return 0
 
+    def archived(self, *kwdicts):
+        """Return True if all items in 'kwdicts' are in the download archive
+
+        Allows skipping expensive per-item requests for items
+        that would get skipped anyway.
+        Gets replaced by the running job when an archive is in use.
+        """
+        return False
+
     def config(self, key, default=None):
-        return config.interpolate(self._cfgpath, key, default)
+        return self.config_snapshot.get(key, default)
 
     def config2(self, key, key2, default=None, sentinel=util.SENTINEL):
         value = self.config(key, sentinel)
@@ -112,10 +121,6 @@ class Extractor():
     def config_instance(self, key, default=None):
         return default
 
-    def _config_shared(self, key, default=None):
-        return config.interpolate_common(
-            ("extractor",), self._cfgpath, key, default)
-
     def _config_shared_accumulate(self, key):
         first = True
         extr = ("extractor",)
@@ -161,11 +166,10 @@ class Extractor():
         response = None
         tries = 1
 
-        if self._interval:
-            seconds = (self._interval() -
-                       (time.time() - Extractor.request_timestamp))
-            if seconds > 0.0:
-                self.sleep(seconds, "request")
+        limiter = self._ratelimiter(url)
+        seconds = limiter.reserve(self._interval() if self._interval else 0.0)
+        if seconds > 0.0:
+            self.sleep(seconds, "request")
 
         while True:
             try:
@@ -219,7 +223,7 @@ class Extractor():
                     break
 
             finally:
-                Extractor.request_timestamp = time.time()
+                limiter.update()
 
             self.log.debug("%s (%s/%s)", msg, tries, retries+1)
             if tries > retries:
@@ -234,6 +238,7 @@ class Extractor():
                 s = self._interval_429()
                 if seconds < s:
                     seconds = s
+                limiter.block(seconds)
                 self.wait(seconds=seconds, reason="429 Too Many Requests")
             else:
                 self.sleep(seconds, "retry")
@@ -243,6 +248,17 @@ class Extractor():
 
     _handle_429 = util.false
 
+    def _ratelimiter(self, url):
+        """Return the RateLimiter responsible for requests to 'url'"""
+        scope = self._ratelimit_scope
+        if scope == "host":
+            key = url.partition("://")[2].partition("/")[0]
+        elif scope == "category":
+            key = self.category
+        else:
+            key = ""
+        return util.ratelimiter(key)
+
     def wait(self, seconds=None, until=None, adjust=1.0,
              reason="rate limit"):
         now = time.time()
@@ -333,6 +349,7 @@ class Extractor():
         self._interval_429 = util.build_duration_func(
             self.config("sleep-429", self.request_interval_429),
         )
+        self._ratelimit_scope = self.config("sleep-request-scope", "category")
 
         if self._retries < 0:
             self._retries = float("inf")
@@ -427,8 +444,10 @@ class Extractor():
             ssl_options |= ssl.OP_NO_TLSv1_2
             self.log.debug("TLS 1.2 disabled.")
 
+        pool_size = self.config("connection-pool-size")
+
         adapter = _build_requests_adapter(
-            ssl_options, ssl_ciphers, source_address)
+            ssl_options, ssl_ciphers, source_address, pool_size)
         session.mount("https://", adapter)
         session.mount("http://", adapter)
 
@@ -580,6 +599,14 @@ class Extractor():
     def _cache_memory(self, func, maxage=None, keyarg=None):
         return cache.Memcache()
 
+    def _prefetch_pages(self, pages):
+        """Fetch up to 'pagination-prefetch' items of 'pages' in advance"""
+        depth = self.config("pagination-prefetch")
+        if depth:
+            self.log.debug("Prefetching up to %s pages", depth)
+            return prefetch(pages, depth)
+        return pages
+
     def _get_date_min_max(self, dmin=None, dmax=None):
         """Retrieve and parse 'date-min' and 'date-max' config values"""
         def get(key, default):
@@ -773,33 +800,7 @@ class AsynchronousMixin():
 
     def __iter__(self):
         self.initialize()
-
-        messages = queue.Queue(5)
-        thread = threading.Thread(
-            target=self.async_items,
-            args=(messages,),
-            daemon=True,
-        )
-
-        thread.start()
-        while True:
-            msg = messages.get()
-            if msg is None:
-                thread.join()
-                return
-            if isinstance(msg, Exception):
-                thread.join()
-                raise msg
-            yield msg
-            messages.task_done()
-
-    def async_items(self, messages):
-        try:
-            for msg in self.items():
-                messages.put(msg)
-        except Exception as exc:
-            messages.put(exc)
-        messages.put(None)
+        return prefetch(self.items(), 5)
 
 
 class BaseExtractor(Extractor):
@@ -854,24 +855,123 @@ class BaseExtractor(Extractor):
 
 class RequestsAdapter(HTTPAdapter):
 
-    def __init__(self, ssl_context=None, source_address=None):
+    def __init__(self, ssl_context=None, source_address=None,
+                 pool_size=None):
         self.ssl_context = ssl_context
         self.source_address = source_address
-        HTTPAdapter.__init__(self)
+        if pool_size:
+            HTTPAdapter.__init__(self, pool_maxsize=pool_size)
+        else:
+            HTTPAdapter.__init__(self)
 
     def init_poolmanager(self, *args, **kwargs):
         kwargs["ssl_context"] = self.ssl_context
         kwargs["source_address"] = self.source_address
-        return HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        _count_connections(self.poolmanager)
 
     def proxy_manager_for(self, *args, **kwargs):
         kwargs["ssl_context"] = self.ssl_context
         kwargs["source_address"] = self.source_address
-        return HTTPAdapter.proxy_manager_for(self, *args, **kwargs)
+        proxy = kwargs["proxy"] if "proxy" in kwargs else args[0]
+        new = proxy not in self.proxy_manager
+        manager = HTTPAdapter.proxy_manager_for(self, *args, **kwargs)
+        if new:
+            _count_connections(manager)
+        return manager
+
+
+def connection_counter(counter=util.SENTINEL):
+    """Count new HTTP connections opened by the current thread in 'counter'
+
+    Adapters and their pools are shared between extractors and threads,
+    so connections get attributed to the thread opening them.
+    Return the previously used counter,
+    or the current one when called without argument.
+    """
+    previous = getattr(_connections, "counter", None)
+    if counter is not util.SENTINEL:
+        _connections.counter = counter
+    return previous
+
+
+def _count_connections(manager):
+    """Count new connections opened by the pools of 'manager'
+
+    Relies on urllib3 internals ('_new_pool', '_new_conn')
+    and leaves 'manager' as is when they are not available.
+    """
+    new_pool = getattr(manager, "_new_pool", None)
+    if not callable(new_pool):
+        return
+
+    def _new_pool(*args, **kwargs):
+        pool = new_pool(*args, **kwargs)
+        new_conn = getattr(pool, "_new_conn", None)
+        if callable(new_conn):
+            host = getattr(pool, "host", None) or ""
+
+            def _new_conn(*args, **kwargs):
+                counter = connection_counter()
+                if counter is not None:
+                    with _connections_lock:
+                        counter[host] += 1
+                return new_conn(*args, **kwargs)
+            pool._new_conn = _new_conn
+        return pool
+    manager._new_pool = _new_pool
+
+
+def prefetch(iterable, size):
+    """Iterate over 'iterable' in a separate thread
+
+    Up to 'size' results are retrieved ahead of time.
+    Exceptions get re-raised in the consuming thread, and closing the
+    returned generator stops the background thread before it would
+    retrieve the next result.
+    """
+    results = queue.Queue(size)
+    stop = threading.Event()
+    counter = connection_counter()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=1.0)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        connection_counter(counter)
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+        except BaseException as exc:
+            put((False, exc))
+        else:
+            put((False, None))
 
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
 
-def _build_requests_adapter(ssl_options, ssl_ciphers, source_address):
-    key = (ssl_options, ssl_ciphers, source_address)
+    try:
+        while True:
+            success, item = results.get()
+            if not success:
+                if item is None:
+                    return
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def _build_requests_adapter(ssl_options, ssl_ciphers, source_address,
+                            pool_size=None):
+    key = (ssl_options, ssl_ciphers, source_address, pool_size)
     try:
         return _adapter_cache[key]
     except KeyError:
@@ -888,7 +988,7 @@ def _build_requests_adapter(ssl_options, ssl_ciphers, source_address):
         ssl_context = None
 
     adapter = _adapter_cache[key] = RequestsAdapter(
-        ssl_context, source_address)
+        ssl_context, source_address, pool_size)
     return adapter
 
 
@@ -923,6 +1023,8 @@ def _browser_useragent():
 
 
 _adapter_cache = {}
+_connections = threading.local()
+_connections_lock = threading.Lock()
 _browser_cookies = {}
 
 
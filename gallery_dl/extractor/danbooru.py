@@ -115,6 +115,11 @@ class DanbooruExtractor(BaseExtractor):
         return ()
 
     def _pagination(self, endpoint, params, prefix=None):
+        for posts in self._prefetch_pages(
+                self._pagination_pages(endpoint, params, prefix)):
+            yield from posts
+
+    def _pagination_pages(self, endpoint, params, prefix=None):
         url = self.root + endpoint
         params["limit"] = self.per_page
         params["page"] = self.page_start
@@ -143,7 +148,7 @@ class DanbooruExtractor(BaseExtractor):
                 if prefix == "a" and not first:
                     posts.reverse()
 
-                yield from posts
+                yield posts
 
             if len(posts) < self.threshold:
                 return
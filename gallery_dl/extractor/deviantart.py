@@ -158,8 +158,9 @@ class DeviantartExtractor(Extractor):
             yield Message.Directory, deviation
 
             if "content" in deviation:
-                content = self._extract_content(deviation)
-                yield self.commit(deviation, content)
+                if not self._archived_content(deviation):
+                    content = self._extract_content(deviation)
+                    yield self.commit(deviation, content)
 
             elif deviation["is_downloadable"]:
                 content = self.api.deviation_download(deviation["deviationid"])
@@ -556,6 +557,23 @@ x2="45.4107524%" y2="71.4898596%" id="app-root-3">\
 
         html.append('</figure></div>')
 
+    def _archived_content(self, deviation):
+        """Return True if an original file would be archived already"""
+        if not self.original or not deviation["is_downloadable"]:
+            return False
+
+        # the original's filename extension is only known in advance
+        # when 'content' already is the original file
+        content = deviation["content"]
+        size = deviation.get("download_filesize")
+        if not size or content.get("filesize") != size:
+            return False
+
+        kwdict = deviation.copy()
+        kwdict["extension"] = text.ext_from_url(
+            content["src"].partition("/v1/")[0])
+        return self.archived(kwdict)
+
     def _extract_content(self, deviation):
         content = deviation["content"]
 
@@ -9,7 +9,7 @@
 """Extractors for https://hitomi.la/"""
 
 from .common import GalleryExtractor, Extractor, Message
-from .nozomi import decode_nozomi
+from .nozomi import decode_nozomi, intersect_nozomi, request_nozomi
 from ..cache import memcache
 from .. import text, util
 import string
@@ -208,9 +208,8 @@ class HitomiSearchExtractor(Extractor):
         data = {"_extractor": HitomiGalleryExtractor}
 
         results = [self.get_nozomi_items(tag) for tag in self.tags]
-        intersects = set.intersection(*results)
 
-        for gallery_id in sorted(intersects, reverse=True):
+        for gallery_id in intersect_nozomi(results):
             gallery_url = "{}/galleries/{}.html".format(
                 self.root, gallery_id)
             yield Message.Queue, gallery_url, data
@@ -235,8 +234,7 @@ class HitomiSearchExtractor(Extractor):
             "Referer": "{}/search.html?{}".format(referer_base, self.query),
         }
 
-        response = self.request(nozomi_url, headers=headers)
-        return set(decode_nozomi(response.content))
+        return request_nozomi(self, nozomi_url, headers)
 
     def get_nozomi_args(self, query):
         ns, _, tag = query.strip().partition(":")
@@ -84,19 +84,6 @@ class KemonopartyExtractor(Extractor):
             post["date"] = self._parse_datetime(
                 post.get("published") or post.get("added") or "")
 
-            if username:
-                post["username"] = username
-            if comments:
-                post["comments"] = self._extract_comments(post)
-            if dms is not None:
-                if dms is True:
-                    dms = self._extract_cards(post, "dms")
-                post["dms"] = dms
-            if announcements is not None:
-                if announcements is True:
-                    announcements = self._extract_cards(post, "announcements")
-                post["announcements"] = announcements
-
             files = []
             hashes = set()
 
@@ -117,6 +104,22 @@ class KemonopartyExtractor(Extractor):
 
                 files.append(file)
 
+            if comments and files and self._archived_files(post, files):
+                continue
+
+            if username:
+                post["username"] = username
+            if comments:
+                post["comments"] = self._extract_comments(post)
+            if dms is not None:
+                if dms is True:
+                    dms = self._extract_cards(post, "dms")
+                post["dms"] = dms
+            if announcements is not None:
+                if announcements is True:
+                    announcements = self._extract_cards(post, "announcements")
+                post["announcements"] = announcements
+
             post["count"] = len(files)
             yield Message.Directory, post
 
@@ -233,6 +236,18 @@ class KemonopartyExtractor(Extractor):
             self.root, server)
         return self.request(url).json()
 
+    def _archived_files(self, post, files):
+        """Return True if all 'files' of 'post' are archived already"""
+        kwdicts = []
+        for num, file in enumerate(files, 1):
+            kwdict = post.copy()
+            kwdict["num"] = num
+            kwdict["hash"] = file["hash"]
+            kwdict["type"] = file["type"]
+            kwdicts.append(text.nameext_from_url(
+                file.get("name", file["path"]), kwdict))
+        return self.archived(*kwdicts)
+
     def _revisions_post(self, post, url):
         post["revision_id"] = 0
 
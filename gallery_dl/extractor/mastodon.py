@@ -326,10 +326,15 @@ class MastodonAPI():
             raise exception.StopExtraction(response.json().get("error"))
 
     def _pagination(self, endpoint, params):
+        for statuses in self.extractor._prefetch_pages(
+                self._pagination_pages(endpoint, params)):
+            yield from statuses
+
+    def _pagination_pages(self, endpoint, params):
         url = endpoint
         while url:
             response = self._call(url, params)
-            yield from response.json()
+            yield response.json()
 
             url = response.links.get("next")
             if not url:
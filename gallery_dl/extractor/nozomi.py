@@ -9,12 +9,94 @@
 """Extractors for https://nozomi.la/"""
 
 from .common import Extractor, Message
-from .. import text
+from .. import text, util, cache
+import email.utils
+import hashlib
+import array
+import time
+import sys
+import os
+
+TYPECODE = "I" if array.array("I").itemsize == 4 else "L"
 
 
 def decode_nozomi(n):
-    for i in range(0, len(n), 4):
-        yield (n[i] << 24) + (n[i+1] << 16) + (n[i+2] << 8) + n[i+3]
+    """Return an array of the big-endian uint32 IDs in 'n'"""
+    ids = array.array(TYPECODE)
+    ids.frombytes(n[:len(n) & ~3])
+    if sys.byteorder == "little":
+        ids.byteswap()
+    return ids
+
+
+def intersect_nozomi(results, exclude=()):
+    """Return a descending list of IDs in all 'results' but no 'exclude'"""
+    # start with the shortest ID list to keep intermediate sets small
+    results = sorted(results, key=len)
+    ids = set(results[0])
+    for other in results[1:]:
+        if not ids:
+            break
+        ids.intersection_update(other)
+    for other in exclude:
+        if not ids:
+            break
+        ids.difference_update(other)
+    return sorted(ids, reverse=True)
+
+
+def request_nozomi(extr, url, headers=None):
+    """Download and decode the .nozomi file at 'url'
+
+    Complete files get stored in a cache directory
+    and are only downloaded again when they changed.
+    """
+    path = _nozomi_path(extr, url) \
+        if extr.config("search-cache", True) else None
+    if path:
+        headers = headers.copy() if headers else {}
+        try:
+            mtime = os.stat(path).st_mtime
+            headers["If-Modified-Since"] = email.utils.formatdate(
+                mtime, usegmt=True)
+        except OSError:
+            pass
+
+    response = extr.request(url, headers=headers)
+    if response.status_code == 304:
+        extr.log.debug("Using cached '%s'", url)
+        with open(path, "rb") as fp:
+            content = fp.read()
+        try:
+            # mark as recently used
+            os.utime(path, (time.time(), mtime))
+        except OSError:
+            pass
+        return decode_nozomi(content)
+
+    content = response.content
+    modified = response.headers.get("Last-Modified")
+    if path and modified:
+        try:
+            mtime = email.utils.parsedate_to_datetime(modified).timestamp()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".part", "wb") as fp:
+                fp.write(content)
+            os.utime(path + ".part", (time.time(), mtime))
+            os.replace(path + ".part", path)
+        except Exception as exc:
+            extr.log.debug("Unable to cache '%s' (%s: %s)",
+                           url, exc.__class__.__name__, exc)
+            util.remove_file(path + ".part")
+    return decode_nozomi(content)
+
+
+def _nozomi_path(extr, url):
+    directory = cache.directory(extr.category, 86400 * 30)
+    if not directory:
+        return None
+    return os.path.join(
+        directory, hashlib.sha1(url.encode()).hexdigest() + ".nozomi")
 
 
 class NozomiExtractor(Extractor):
@@ -163,28 +245,20 @@ class NozomiSearchExtractor(NozomiExtractor):
         return {"search_tags": self.tags}
 
     def posts(self):
-        result = None
         positive = []
         negative = []
 
         def nozomi(path):
             url = "https://j.nozomi.la/" + path + ".nozomi"
-            return decode_nozomi(self.request(url).content)
+            return request_nozomi(self, url)
 
         for tag in self.tags:
             (negative if tag[0] == "-" else positive).append(
                 tag.replace("/", ""))
 
-        for tag in positive:
-            ids = nozomi("nozomi/" + tag)
-            if result is None:
-                result = set(ids)
-            else:
-                result.intersection_update(ids)
-
-        if result is None:
-            result = set(nozomi("index"))
-        for tag in negative:
-            result.difference_update(nozomi("nozomi/" + tag[1:]))
+        results = [nozomi("nozomi/" + tag) for tag in positive]
+        if not results:
+            results.append(nozomi("index"))
+        exclude = [nozomi("nozomi/" + tag[1:]) for tag in negative]
 
-        return sorted(result, reverse=True) if result else ()
+        return intersect_nozomi(results, exclude)
@@ -66,6 +66,11 @@ class PixivExtractor(Extractor):
 
             files = self._extract_files(work)
 
+            if (self.meta_user or self.meta_comments or self.meta_bookmark or
+                    self.meta_captions) and files and \
+                    self._archived_files(work, files, metadata):
+                continue
+
             if self.meta_user:
                 work.update(self.api.user_detail(work["user"]["id"]))
             if self.meta_comments:
@@ -99,6 +104,20 @@ class PixivExtractor(Extractor):
                 work["date_url"] = self._date_from_url(url)
                 yield Message.Url, url, text.nameext_from_url(url, work)
 
+    def _archived_files(self, work, files, metadata):
+        """Return True if all 'files' of 'work' are archived already"""
+        date = text.parse_datetime(work["create_date"])
+        kwdicts = []
+        for num, file in enumerate(files):
+            kwdict = work.copy()
+            kwdict["num"] = num
+            kwdict["date"] = date
+            kwdict["suffix"] = ""
+            kwdict.update(metadata)
+            kwdict.update(file)
+            kwdicts.append(text.nameext_from_url(file["url"], kwdict))
+        return self.archived(*kwdicts)
+
     def _extract_files(self, work):
         meta_single_page = work["meta_single_page"]
         meta_pages = work["meta_pages"]
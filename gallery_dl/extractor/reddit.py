@@ -521,10 +521,9 @@ class RedditAPI():
             id_max = float("inf")
         date_min, date_max = self.extractor._get_date_min_max(0, 253402210800)
 
-        while True:
-            data = self._call(endpoint, params)["data"]
-
-            for child in data["children"]:
+        for children in self.extractor._prefetch_pages(
+                self._pagination_pages(endpoint, params)):
+            for child in children:
                 kind = child["kind"]
                 post = child["data"]
 
@@ -543,6 +542,11 @@ class RedditAPI():
                     elif kind == "t1" and self.comments:
                         yield None, (post,)
 
+    def _pagination_pages(self, endpoint, params):
+        while True:
+            data = self._call(endpoint, params)["data"]
+            yield data["children"]
+
             if not data["after"]:
                 return
             params["after"] = data["after"]
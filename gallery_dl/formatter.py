@@ -28,7 +28,7 @@ def parse(format_string, default=NONE, fmt=format):
     except KeyError:
         pass
 
-    cls = StringFormatter
+    cls = _FORMATTER
     if format_string.startswith("\f"):
         kind, _, format_string = format_string.partition(" ")
         kind = kind[1:]
@@ -201,6 +201,179 @@ class StringFormatter():
             return lambda obj: fmt(conversion(obj))
 
 
+class CompiledFormatter():
+    """Generate text by calling a function compiled from a format string
+
+    Produces the same output as StringFormatter, but evaluates all
+    replacement fields within a single generated Python function
+    instead of calling a chain of nested closures for each of them.
+    """
+
+    def __init__(self, format_string, default=NONE, fmt=format):
+        self.default = default
+        self.format = fmt
+        self.env = {"default": default, "fmt": fmt, "format": format}
+        self.source = ["def format_map(kwdict):\n"]
+        result = []
+
+        for literal_text, field_name, format_spec, conv in \
+                _string.formatter_parser(format_string):
+            if literal_text:
+                result.append(repr(literal_text))
+            if field_name:
+                self._compile_field(field_name, format_spec, conv)
+                var = "s{}".format(len(result))
+                self._emit(1, var + " = obj")
+                result.append(var)
+
+        if not result:
+            result = "''"
+        elif len(result) == 1:
+            result = result[0]
+        else:
+            result = "''.join(({},))".format(", ".join(result))
+        self._emit(1, "return " + result)
+
+        self.source = "".join(self.source)
+        exec(compile(self.source, "<format string>", "exec"), self.env)
+        self.format_map = self.env["format_map"]
+
+    def _emit(self, indent, line):
+        self.source.append("    " * indent + line + "\n")
+
+    def _const(self, value):
+        name = "c{}".format(len(self.env))
+        self.env[name] = value
+        return name
+
+    def _compile_field(self, field_name, format_spec, conversion):
+        if "|" in field_name:
+            indent = 1
+            for field_name in field_name.split("|"):
+                self._emit(indent, "try:")
+                self._emit(indent+1, "obj = " + self._access(field_name))
+                self._emit(indent, "except Exception:")
+                self._emit(indent+1, "obj = None")
+                self._emit(indent, "if not obj:")
+                indent += 1
+            self._emit(indent, "if obj is None:")
+            self._emit(indent+1, "obj = default")
+
+        elif field_name[0] == "'" or \
+                list(_string.formatter_field_name_split(field_name)[1]) or \
+                field_name in _GLOBALS:
+            self._emit(1, "try:")
+            self._emit(2, "obj = " + self._access(field_name))
+            self._emit(1, "except Exception:")
+            self._emit(2, "obj = default")
+
+        else:
+            key = repr(_string.formatter_field_name_split(field_name)[0])
+            self._emit(1, "obj = kwdict[{0}] if {0} in kwdict else default"
+                       .format(key))
+
+        if conversion:
+            self._emit(1, "obj = {}(obj)".format(
+                self._const(_CONVERSIONS[conversion])))
+            if not format_spec:
+                return
+        self._compile_format_spec(format_spec, 1)
+
+    def _access(self, field_name):
+        """Return an expression accessing the value of 'field_name'"""
+        if field_name[0] == "'":
+            return repr(field_name[1:-1])
+
+        first, rest = _string.formatter_field_name_split(field_name)
+        if first in _GLOBALS:
+            expr = self._const(_GLOBALS[first]) + "()"
+        else:
+            expr = "kwdict[{!r}]".format(first)
+
+        for is_attr, key in rest:
+            if is_attr:
+                if key.isidentifier():
+                    expr = "{}.{}".format(expr, key)
+                else:
+                    expr = "getattr({}, {!r})".format(expr, key)
+            elif isinstance(key, int):
+                expr = "{}[{}]".format(expr, key)
+            elif ":" in key:
+                if key[0] == "b":
+                    expr = "{}({})".format(
+                        self._const(_bytesgetter(_slice(key[1:]))), expr)
+                else:
+                    expr = "{}[{}]".format(expr, self._const(_slice(key)))
+            else:
+                expr = "{}[{!r}]".format(expr, key.strip("\"'"))
+
+        return expr
+
+    def _compile_format_spec(self, format_spec, indent):
+        """Emit code converting 'obj' according to 'format_spec'"""
+        emit = self._emit
+
+        if not format_spec:
+            if self.format is format:
+                emit(indent, "obj = format(obj)")
+            else:
+                emit(indent, "obj = fmt(obj)")
+            return
+
+        spec = format_spec[0]
+        if spec == "?":
+            before, after, format_spec = format_spec.split(_SEPARATOR, 2)
+            emit(indent, "if obj:")
+            self._compile_format_spec(format_spec, indent+1)
+            emit(indent+1, "obj = {!r} + obj + {!r}".format(
+                before[1:], after))
+            emit(indent, "else:")
+            emit(indent+1, "obj = ''")
+
+        elif spec == "L":
+            maxlen, replacement, format_spec = \
+                format_spec.split(_SEPARATOR, 2)
+            self._compile_format_spec(format_spec, indent)
+            emit(indent, "if len(obj) > {!r}:".format(
+                text.parse_int(maxlen[1:])))
+            emit(indent+1, "obj = {!r}".format(replacement))
+
+        elif spec == "J":
+            separator, _, format_spec = format_spec.partition(_SEPARATOR)
+            emit(indent, "if not isinstance(obj, str):")
+            emit(indent+1, "obj = {!r}.join(obj)".format(separator[1:]))
+            self._compile_format_spec(format_spec, indent)
+
+        elif spec == "R":
+            old, new, format_spec = format_spec.split(_SEPARATOR, 2)
+            emit(indent, "obj = obj.replace({!r}, {!r})".format(old[1:], new))
+            self._compile_format_spec(format_spec, indent)
+
+        elif spec == "D":
+            dt_format, _, format_spec = format_spec.partition(_SEPARATOR)
+            emit(indent, "obj = {}(obj, {!r})".format(
+                self._const(text.parse_datetime), dt_format[1:]))
+            self._compile_format_spec(format_spec, indent)
+
+        elif spec == "O" and \
+                format_spec.partition(_SEPARATOR)[0] not in ("O", "Olocal"):
+            offset, _, format_spec = format_spec.partition(_SEPARATOR)
+            hours, _, minutes = offset[1:].partition(":")
+            offset = 3600 * int(hours)
+            if minutes:
+                offset += 60 * (int(minutes) if offset > 0 else -int(minutes))
+            emit(indent, "obj = obj + {}".format(
+                self._const(datetime.timedelta(0, offset))))
+            self._compile_format_spec(format_spec, indent)
+
+        elif spec in _FORMAT_SPECIFIERS:
+            emit(indent, "obj = {}(obj)".format(self._const(
+                _build_format_func(format_spec, self.format))))
+
+        else:
+            emit(indent, "obj = format(obj, {!r})".format(format_spec))
+
+
 class ExpressionFormatter():
     """Generate text by evaluating a Python expression"""
 
@@ -471,6 +644,7 @@ class Literal():
 _literal = Literal()
 
 _CACHE = {}
+_FORMATTER = StringFormatter
 _SEPARATOR = "/"
 _GLOBALS = {
     "_env": lambda: os.environ,
@@ -7,10 +7,13 @@
 # published by the Free Software Foundation.
 
 import sys
+import copy
 import errno
 import logging
+import threading
 import functools
 import collections
+import concurrent.futures
 
 from . import (
     extractor,
@@ -27,6 +30,7 @@ from . import (
     version,
 )
 from .extractor.message import Message
+from .extractor.common import connection_counter
 stdout_write = output.stdout_write
 
 
@@ -46,6 +50,11 @@ class Job():
         self.status = 0
         self.kwdict = {}
         self.kwdict_eval = False
+        # stop at the next message once this gets set
+        self.stop_event = parent.stop_event if parent else None
+        # new HTTP connections opened by this job and its children
+        self.connections = parent.connections if parent else \
+            collections.Counter()
 
         cfgpath = []
         if parent:
@@ -73,7 +82,7 @@ class Job():
 
         if cfgpath:
             extr._cfgpath = cfgpath
-            extr.config = extr._config_shared
+            extr.config_snapshot = config.Snapshot(cfgpath, ("extractor",))
             extr.config_accumulate = extr._config_shared_accumulate
 
         actions = extr.config("actions")
@@ -99,6 +108,7 @@ class Job():
             # transfer (sub)category
             if pextr.config("category-transfer", pextr.categorytransfer):
                 extr._cfgpath = pextr._cfgpath
+                extr.config_snapshot = pextr.config_snapshot
                 extr.category = pextr.category
                 extr.subcategory = pextr.subcategory
 
@@ -139,6 +149,7 @@ class Job():
         log = extractor.log
         msg = None
 
+        connections = connection_counter(self.connections)
         self._init()
 
         # sleep before extractor start
@@ -148,7 +159,10 @@ class Job():
             extractor.sleep(sleep(), "extractor")
 
         try:
+            stop = self.stop_event
             for msg in extractor:
+                if stop is not None and stop.is_set():
+                    raise exception.TerminateExtraction()
                 self.dispatch(msg)
         except exception.StopExtraction as exc:
             if exc.message:
@@ -182,6 +196,7 @@ class Job():
         finally:
             self.handle_finalize()
             extractor.finalize()
+            connection_counter(connections)
 
         return self.status
 
@@ -286,11 +301,16 @@ class DownloadJob(Job):
         self.archive = None
         self.sleep = None
         self.hooks = ()
+        self.workers = 0
+        self.pp_workers = 0
+        self._pp_offload_file = False
+        self._archive_locked = False
         self.downloaders = {}
         self.out = output.select()
         self.visited = parent.visited if parent else set()
         self._extractor_filter = None
         self._skipcnt = 0
+        self._connections_log = parent is None
 
     def handle_url(self, url, kwdict):
         """Download the resource specified in 'url'"""
@@ -332,46 +352,77 @@ class DownloadJob(Job):
         if self.sleep:
             self.extractor.sleep(self.sleep(), "download")
 
+        if self.workers:
+            self._workers_submit(url, pathfmt)
+            return
+
         # download from URL
-        if not self.download(url):
-
-            # use fallback URLs if available/enabled
-            fallback = kwdict.get("_fallback", ()) if self.fallback else ()
-            for num, url in enumerate(fallback, 1):
-                util.remove_file(pathfmt.temppath)
-                self.log.info("Trying fallback URL #%d", num)
-                if self.download(url):
-                    break
-            else:
-                # download failed
-                self.status |= 4
-                self.log.error("Failed to download %s",
-                               pathfmt.filename or url)
-                if "error" in hooks:
-                    for callback in hooks["error"]:
-                        callback(pathfmt)
-                return
+        if not self.download_fallback(url, pathfmt):
+            self.handle_error(url, pathfmt)
+            return
+
+        if self.handle_file(pathfmt):
+            self._skipcnt = 0
+        else:
+            self._skip_count(kwdict)
+
+    def download_fallback(self, url, pathfmt, local=None):
+        """Download 'url' and, if necessary, its fallback URLs"""
+        if self.download(url, pathfmt, local):
+            return True
+
+        # use fallback URLs if available/enabled
+        fallback = pathfmt.kwdict.get("_fallback", ()) \
+            if self.fallback else ()
+        for num, url in enumerate(fallback, 1):
+            util.remove_file(pathfmt.temppath)
+            pathfmt._path_unlisted(pathfmt.temppath)
+            self.log.info("Trying fallback URL #%d", num)
+            if self.download(url, pathfmt, local):
+                return True
+        return False
+
+    def handle_error(self, url, pathfmt):
+        """Handle a failed download"""
+        self.status |= 4
+        self.log.error("Failed to download %s",
+                       pathfmt.filename or url)
+        if "error" in self.hooks:
+            for callback in self.hooks["error"]:
+                callback(pathfmt)
+
+    def handle_file(self, pathfmt):
+        """Run post processors for a downloaded file
+
+        Return False if the file got skipped
+        """
+        hooks = self.hooks
+        archive = self.archive
+        kwdict = pathfmt.kwdict
 
         if not pathfmt.temppath:
             if archive and self._archive_write_skip:
                 archive.add(kwdict)
-            self.handle_skip()
-            return
+            self._skip_hooks(pathfmt)
+            return False
 
         # run post processors
         if "file" in hooks:
             for callback in hooks["file"]:
                 callback(pathfmt)
+            if self._pp_offload_file:
+                # finalizing happens on a post processor thread
+                return True
 
         # download succeeded
         pathfmt.finalize()
         self.out.success(pathfmt.path)
-        self._skipcnt = 0
         if archive and self._archive_write_file:
             archive.add(kwdict)
         if "after" in hooks:
             for callback in hooks["after"]:
                 callback(pathfmt)
+        return True
 
     def handle_directory(self, kwdict):
         """Set and create the target directory for downloads"""
@@ -379,8 +430,14 @@ class DownloadJob(Job):
             self.initialize(kwdict)
         else:
             if "post-after" in self.hooks:
+                if self.workers:
+                    self._workers_wait()
+                if self.pp_workers:
+                    self._pp_wait()
                 for callback in self.hooks["post-after"]:
                     callback(self.pathfmt)
+            if self.archive:
+                self.archive.flush()
             self.pathfmt.set_directory(kwdict)
         if "post" in self.hooks:
             for callback in self.hooks["post"]:
@@ -457,6 +514,14 @@ class DownloadJob(Job):
             self._write_unsupported(url)
 
     def handle_finalize(self):
+        if self.workers:
+            # stop running downloads when interrupted
+            exc = sys.exc_info()[1]
+            self._workers_finalize(
+                exc is not None and not isinstance(exc, Exception))
+        if self.pp_workers:
+            self._pp_finalize()
+
         if self.archive:
             if not self.status:
                 self.archive.finalize()
@@ -483,28 +548,101 @@ class DownloadJob(Job):
                     for callback in hooks["finalize-success"]:
                         callback(pathfmt)
 
+        if self._connections_log:
+            connections = +self.connections
+            if connections:
+                self.log.debug("New HTTP connections: %s", ", ".join(
+                    "{} ({})".format(host, num)
+                    for host, num in connections.most_common()))
+
     def handle_skip(self):
         pathfmt = self.pathfmt
+        self._skip_hooks(pathfmt)
+        self._skip_count(pathfmt.kwdict)
+
+    def _skip_hooks(self, pathfmt):
         if "skip" in self.hooks:
             for callback in self.hooks["skip"]:
                 callback(pathfmt)
         self.out.skip(pathfmt.path)
 
+    def _skip_count(self, kwdict):
         if self._skipexc:
-            if not self._skipftr or self._skipftr(pathfmt.kwdict):
+            if not self._skipftr or self._skipftr(kwdict):
                 self._skipcnt += 1
                 if self._skipcnt >= self._skipmax:
                     raise self._skipexc()
             else:
                 self._skipcnt = 0
 
-    def download(self, url):
+    def _archived(self, *kwdicts):
+        """Return True if all partial 'kwdicts' are in the download archive"""
+        if not kwdicts:
+            return False
+
+        extr = self.extractor
+        entries = []
+        for kwdict in kwdicts:
+            entry = _PartialKwdict(kwdict)
+            entry["category"] = extr.category
+            entry["subcategory"] = extr.subcategory
+            if self.kwdict:
+                entry.update(self.kwdict)
+            entries.append(entry)
+
+        try:
+            if len(entries) == 1:
+                found = (self.archive.check(entries[0]),)
+            else:
+                found = self.archive.check_many(entries)
+        except Exception as exc:
+            self.log.debug("Early archive check failed (%s: %s)",
+                           exc.__class__.__name__, exc)
+            return False
+
+        for entry, result in zip(entries, found):
+            if not result or entry.missing:
+                return False
+
+        # build paths on a copy to leave directory and kwdict
+        # of the current PathFormat object untouched
+        pathfmt = copy.copy(self.pathfmt) if self.pathfmt else None
+        for entry in entries:
+            self.log.debug("Skipping %s (archived)", entry["_archive_key"])
+            if pathfmt:
+                try:
+                    pathfmt.set_directory(entry)
+                    pathfmt.set_filename(entry)
+                    if not pathfmt.extension:
+                        raise ValueError("no filename extension")
+                    pathfmt.build_path()
+                    if entry.missing:
+                        raise ValueError("incomplete metadata")
+                except Exception as exc:
+                    # not enough metadata to build a path
+                    self.log.debug(
+                        "Unable to run 'skip' hooks for %s (%s: %s)",
+                        entry["_archive_key"], exc.__class__.__name__, exc)
+                else:
+                    self._skip_hooks(pathfmt)
+            if self._skipexc:
+                try:
+                    self._skip_count(entry)
+                except self._skipexc:
+                    raise
+                except Exception:
+                    pass
+        return True
+
+    def download(self, url, pathfmt=None, local=None):
         """Download 'url'"""
+        if pathfmt is None:
+            pathfmt = self.pathfmt
         scheme = url.partition(":")[0]
-        downloader = self.get_downloader(scheme)
+        downloader = self.get_downloader(scheme, local)
         if downloader:
             try:
-                return downloader.download(url, self.pathfmt)
+                return downloader.download(url, pathfmt)
             except OSError as exc:
                 if exc.errno == errno.ENOSPC:
                     raise
@@ -513,26 +651,289 @@ class DownloadJob(Job):
         self._write_unsupported(url)
         return False
 
-    def get_downloader(self, scheme):
+    def get_downloader(self, scheme, local=None):
         """Return a downloader suitable for 'scheme'"""
+        downloaders = self.downloaders if local is None else local.downloaders
         try:
-            return self.downloaders[scheme]
+            return downloaders[scheme]
         except KeyError:
             pass
 
         cls = downloader.find(scheme)
         if cls and config.get(("downloader", cls.scheme), "enabled", True):
             instance = cls(self)
+            if local is not None:
+                instance.session = local.session
+                instance.stop_event = self._workers_stop
         else:
             instance = None
             self.log.error("'%s:' URLs are not supported/enabled", scheme)
 
         if cls and cls.scheme == "http":
-            self.downloaders["http"] = self.downloaders["https"] = instance
+            downloaders["http"] = downloaders["https"] = instance
         else:
-            self.downloaders[scheme] = instance
+            downloaders[scheme] = instance
         return instance
 
+    @staticmethod
+    def _download_disabled(url, pathfmt, local=None):
+        return pathfmt.fix_extension()
+
+    def _workers_init(self, workers):
+        """Set up a thread pool for concurrent downloads"""
+        self.workers = workers
+        self._workers_pool = concurrent.futures.ThreadPoolExecutor(workers)
+        self._workers_futures = {}
+        self._workers_local = threading.local()
+        self._workers_lock = threading.RLock()
+        self._workers_stop = threading.Event()
+
+        self._archive_lock()
+        self.log.debug("Using %d download workers", workers)
+
+    def _archive_lock(self):
+        """Serialize archive access between threads"""
+        archive = self.archive
+        if archive and not self._archive_locked:
+            self._archive_locked = True
+            lock = threading.Lock()
+
+            def locked(func):
+                def wrap(*args):
+                    with lock:
+                        return func(*args)
+                return wrap
+            archive.check = locked(archive.check)
+            archive.check_many = locked(archive.check_many)
+            archive.add = locked(archive.add)
+            archive.flush = locked(archive.flush)
+
+    def _workers_submit(self, url, pathfmt):
+        """Schedule the download of 'url' on the thread pool"""
+        futures = self._workers_futures
+        if futures:
+            # collect finished downloads
+            # and wait for a free worker when all are busy
+            done, _ = concurrent.futures.wait(
+                futures, None if len(futures) >= self.workers else 0,
+                concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                self._workers_result(future, futures.pop(future))
+
+        # each download gets its own PathFormat and kwdict instance
+        pathfmt = copy.copy(pathfmt)
+        pathfmt.kwdict = kwdict = pathfmt.kwdict.copy()
+        future = self._workers_pool.submit(
+            self._workers_download, url, pathfmt)
+        futures[future] = kwdict
+
+    def _workers_download(self, url, pathfmt):
+        local = self._workers_local
+        if not hasattr(local, "downloaders"):
+            local.downloaders = {}
+            local.session = self._workers_session()
+            connection_counter(self.connections)
+
+        success = self.download_fallback(url, pathfmt, local)
+
+        with self._workers_lock:
+            if not success:
+                self.handle_error(url, pathfmt)
+                return None
+            return self.handle_file(pathfmt)
+
+    def _workers_session(self):
+        """Return a new session with the extractor session's settings"""
+        session = self.extractor.session
+        worker_session = session.__class__()
+        worker_session.headers = session.headers.copy()
+        worker_session.cookies = session.cookies
+        worker_session.auth = session.auth
+        worker_session.adapters = session.adapters.copy()
+        return worker_session
+
+    def _workers_result(self, future, kwdict):
+        result = future.result()
+        if result:
+            self._skipcnt = 0
+        elif result is False:
+            self._skip_count(kwdict)
+
+    def _workers_wait(self):
+        """Wait for all scheduled downloads to finish"""
+        futures = self._workers_futures
+        self._workers_futures = {}
+        for future in concurrent.futures.as_completed(futures):
+            self._workers_result(future, futures[future])
+
+    def _workers_finalize(self, stop=False):
+        """Wait for all remaining downloads and shut down the thread pool
+
+        Stop running and cancel scheduled downloads instead
+        when 'stop' is True or waiting gets interrupted.
+        """
+        futures = self._workers_futures
+        self._workers_futures = {}
+        log = self.extractor.log
+
+        try:
+            if stop:
+                return self._workers_stop_all(futures)
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except OSError as exc:
+                    log.error("Unable to download data:  %s: %s",
+                              exc.__class__.__name__, exc)
+                    log.debug("", exc_info=exc)
+                    self.status |= 128
+                except Exception as exc:
+                    log.error("%s: %s", exc.__class__.__name__, exc)
+                    log.debug("", exc_info=exc)
+                    self.status |= 1
+        except BaseException:
+            self._workers_stop_all(futures)
+            raise
+        finally:
+            # running downloads end at their next chunk of data
+            self._workers_pool.shutdown()
+
+    def _workers_stop_all(self, futures):
+        self._workers_stop.set()
+        for future in futures:
+            future.cancel()
+
+    def _pp_init(self, workers, offload, processes, limits=()):
+        """Move post processor hooks to a separate thread pool
+
+        'offload' maps event names to the index of the first hook
+        that should no longer run on the calling thread.
+        Every following hook of this event runs there as well
+        to keep their order.
+
+        'limits' is a list of (ranges, count) tuples, one for each
+        post processor, limiting how many of its moved hooks can run
+        at the same time. 'ranges' maps event names to the (start, end)
+        indices of its hooks.
+        """
+        self.pp_workers = workers
+        self._pp_pool = concurrent.futures.ThreadPoolExecutor(workers)
+        self._pp_futures = set()
+        self._pp_errors = 0
+        self._pp_lock = threading.Lock()
+        self._pp_slots = threading.Semaphore(workers * 2)
+        self._archive_lock()
+
+        hooks = self.hooks
+        for ranges, count in limits:
+            semaphore = threading.Semaphore(count)
+            for event, (start, end) in ranges.items():
+                if event in offload and end > offload[event]:
+                    callbacks = hooks[event]
+                    for index in range(max(start, offload[event]), end):
+                        callbacks[index] = functools.partial(
+                            self._pp_limit, semaphore, callbacks[index])
+
+        self._pp_after = hooks["after"][:] if "after" in hooks else ()
+        for event, index in offload.items():
+            callbacks = hooks[event]
+            func = self._pp_file if event == "file" else self._pp_run
+            callbacks[index:] = (functools.partial(
+                self._pp_submit, func, callbacks[index:]),)
+        self._pp_offload_file = "file" in offload
+
+        self._pp_processes = None
+        if processes:
+            # do not fork() a process that is already running threads
+            import multiprocessing
+            try:
+                self._pp_processes = concurrent.futures.ProcessPoolExecutor(
+                    workers, mp_context=multiprocessing.get_context("spawn"))
+            except TypeError:  # Python < 3.7
+                self.log.warning("'process' executors require Python 3.7+")
+            else:
+                for pp in processes:
+                    pp.process_pool = self._pp_processes
+
+        self.log.debug("Using %d post processor workers", workers)
+
+    def _pp_submit(self, func, callbacks, pathfmt):
+        """Schedule 'callbacks' for 'pathfmt' on the post processor pool"""
+        # hooks get their own PathFormat and kwdict instance
+        pathfmt = copy.copy(pathfmt)
+        pathfmt.kwdict = pathfmt.kwdict.copy()
+
+        # wait for a free slot when all are busy
+        if not self._pp_slots.acquire(False):
+            if self.workers:
+                # called by a download worker holding '_workers_lock';
+                # let other workers continue while waiting
+                self._workers_lock.release()
+                try:
+                    self._pp_slots.acquire()
+                finally:
+                    self._workers_lock.acquire()
+            else:
+                self._pp_slots.acquire()
+
+        future = self._pp_pool.submit(func, callbacks, pathfmt)
+        with self._pp_lock:
+            self._pp_futures.add(future)
+        future.add_done_callback(self._pp_done)
+
+    @staticmethod
+    def _pp_limit(semaphore, callback, pathfmt):
+        with semaphore:
+            callback(pathfmt)
+
+    @staticmethod
+    def _pp_run(callbacks, pathfmt):
+        for callback in callbacks:
+            callback(pathfmt)
+
+    def _pp_file(self, callbacks, pathfmt):
+        for callback in callbacks:
+            callback(pathfmt)
+
+        pathfmt.finalize()
+        self.out.success(pathfmt.path)
+        if self.archive and self._archive_write_file:
+            self.archive.add(pathfmt.kwdict)
+        for callback in self._pp_after:
+            callback(pathfmt)
+
+    def _pp_done(self, future):
+        exc = future.exception()
+        with self._pp_lock:
+            self._pp_futures.discard(future)
+            if exc is not None:
+                self._pp_errors += 1
+        self._pp_slots.release()
+
+        if exc is not None:
+            log = self.get_logger("postprocessor")
+            log.error("%s: %s", exc.__class__.__name__, exc)
+            log.debug("", exc_info=exc)
+
+    def _pp_wait(self):
+        """Wait for all scheduled post processor hooks to finish"""
+        with self._pp_lock:
+            futures = tuple(self._pp_futures)
+        concurrent.futures.wait(futures)
+
+        with self._pp_lock:
+            errors = self._pp_errors
+            self._pp_errors = 0
+        if errors or any(future.exception() for future in futures):
+            self.status |= 1
+
+    def _pp_finalize(self):
+        """Wait for all remaining hooks and shut down all pools"""
+        self._pp_wait()
+        self._pp_pool.shutdown()
+        if self._pp_processes:
+            self._pp_processes.shutdown()
+
     def initialize(self, kwdict=None):
         """Delayed initialization of PathFormat, etc."""
         extr = self.extractor
@@ -546,7 +947,7 @@ class DownloadJob(Job):
         self.fallback = cfg("fallback", True)
         if not cfg("download", True):
             # monkey-patch method to do nothing and always return True
-            self.download = pathfmt.fix_extension
+            self.download = self._download_disabled
 
         archive_path = cfg("archive")
         if archive_path:
@@ -558,12 +959,19 @@ class DownloadJob(Job):
                 if "{" in archive_path:
                     archive_path = formatter.parse(
                         archive_path).format_map(kwdict)
-                if cfg("archive-mode") == "memory":
-                    archive_cls = archive.DownloadArchiveMemory
+                archive_mode = cfg("archive-mode")
+                if archive_mode == "batch":
+                    self.archive = archive.DownloadArchiveBatch(
+                        archive_path, archive_format, archive_pragma,
+                        size=cfg("archive-batch-size", 100),
+                        interval=cfg("archive-batch-interval", 5.0))
                 else:
-                    archive_cls = archive.DownloadArchive
-                self.archive = archive_cls(
-                    archive_path, archive_format, archive_pragma)
+                    if archive_mode == "memory":
+                        archive_cls = archive.DownloadArchiveMemory
+                    else:
+                        archive_cls = archive.DownloadArchive
+                    self.archive = archive_cls(
+                        archive_path, archive_format, archive_pragma)
             except Exception as exc:
                 extr.log.warning(
                     "Failed to open download archive at '%s' (%s: %s)",
@@ -571,6 +979,19 @@ class DownloadJob(Job):
             else:
                 extr.log.debug("Using download archive '%s'", archive_path)
 
+                archive_filter = cfg("archive-filter")
+                if archive_filter:
+                    if archive_filter is True:
+                        archive_filter = archive_path + ".bloom"
+                    else:
+                        archive_filter = util.expand_path(archive_filter)
+                    try:
+                        self.archive.load_filter(archive_filter, extr.log)
+                    except Exception as exc:
+                        extr.log.warning(
+                            "Failed to load archive filter (%s: %s)",
+                            exc.__class__.__name__, exc)
+
                 events = cfg("archive-event")
                 if events is None:
                     self._archive_write_file = True
@@ -585,7 +1006,7 @@ class DownloadJob(Job):
         if skip:
             self._skipexc = None
             if skip == "enumerate":
-                pathfmt.check_file = pathfmt._enum_file
+                pathfmt.enumerate = True
             elif isinstance(skip, str):
                 skip, _, smax = skip.partition(":")
                 if skip == "abort":
@@ -601,11 +1022,23 @@ class DownloadJob(Job):
                     self._skipftr = util.compile_expression(skip_filter)
                 else:
                     self._skipftr = None
+
+            if self.archive and cfg("archive-early", True) and \
+                    not cfg("image-filter") and not cfg("image-range"):
+                # early skips would bypass filter and range counting
+                extr.archived = self._archived
         else:
             # monkey-patch methods to always return False
             pathfmt.exists = lambda x=None: False
             if self.archive:
                 self.archive.check = pathfmt.exists
+                self.archive.check_many = \
+                    lambda kwdicts: [False for _ in kwdicts]
+
+        if self.download is not self._download_disabled:
+            workers = config.interpolate(("downloader",), "workers", 1)
+            if workers and workers > 1:
+                self._workers_init(workers)
 
         if not cfg("postprocess", True):
             return
@@ -618,6 +1051,11 @@ class DownloadJob(Job):
             pp_conf = config.get((), "postprocessor") or {}
             pp_opts = cfg("postprocessor-options")
             pp_list = []
+            pp_workers = 0
+            pp_offload = {}
+            pp_processes = []
+            pp_stateful = []
+            pp_limits = []
 
             for pp_dict in postprocessors:
                 if isinstance(pp_dict, str):
@@ -641,14 +1079,63 @@ class DownloadJob(Job):
                 if not pp_cls:
                     pp_log.warning("module '%s' not found", name)
                     continue
+
+                executor = pp_dict.get("executor")
+                if executor and executor not in ("thread", "process"):
+                    pp_log.warning("'%s': invalid executor '%s'",
+                                   name, executor)
+                    executor = None
+                counts = {event: len(self.hooks.get(event, ()))
+                          for event in self._pp_events}
+
                 try:
                     pp_obj = pp_cls(self, pp_dict)
                 except Exception as exc:
                     pp_log.error("'%s' initialization failed:  %s: %s",
                                  name, exc.__class__.__name__, exc)
                     pp_log.debug("", exc_info=exc)
-                else:
-                    pp_list.append(pp_obj)
+                    continue
+                pp_list.append(pp_obj)
+
+                added = {event: count for event, count in counts.items()
+                         if len(self.hooks.get(event, ())) > count}
+                limit = (pp_dict.get("executor-workers") or 1
+                         if executor else 1)
+                pp_limits.append(({
+                    event: (count, len(self.hooks[event]))
+                    for event, count in added.items()
+                }, limit))
+                if "prepare" in added or "prepare-after" in added:
+                    # 'prepare' hooks might store per-file state
+                    # in their post processor instance
+                    pp_stateful.append((pp_obj, added))
+                    if executor:
+                        pp_log.warning("'%s' does not support 'executor'",
+                                       name)
+                        pp_limits[-1] = (pp_limits[-1][0], 1)
+                        continue
+
+                if executor:
+                    for event in ("file", "after"):
+                        if event in added and event not in pp_offload:
+                            pp_offload[event] = added[event]
+                    if executor == "process":
+                        pp_processes.append(pp_obj)
+                    pp_workers = max(
+                        pp_workers, pp_dict.get("executor-workers") or 1)
+
+            for pp_obj, added in pp_stateful:
+                for event in ("file", "after"):
+                    if event in pp_offload and \
+                            added.get(event, -1) >= pp_offload[event]:
+                        pp_log.warning(
+                            "Unable to run '%s' hooks in a separate thread "
+                            "since %s would run there as well", event, pp_obj)
+                        del pp_offload[event]
+
+            if pp_offload:
+                self._pp_init(pp_workers, pp_offload,
+                              pp_processes, pp_limits)
 
             if pp_list:
                 extr.log.debug("Active postprocessor modules: %s", pp_list)
@@ -656,6 +1143,8 @@ class DownloadJob(Job):
                     for callback in self.hooks["init"]:
                         callback(pathfmt)
 
+    _pp_events = ("prepare", "prepare-after", "file", "after")
+
     def register_hooks(self, hooks, options=None):
         expr = options.get("filter") if options else None
 
@@ -941,3 +1430,18 @@ class DataJob(Job):
         job = self.__class__(extr, self, None, self.ascii, self.resolve-1)
         job.data = self.data
         job.run()
+
+
+class _PartialKwdict(dict):
+    """dict recording whether a non-existent key got accessed"""
+    missing = False
+
+    def __contains__(self, key):
+        if dict.__contains__(self, key):
+            return True
+        self.missing = True
+        return False
+
+    def __missing__(self, key):
+        self.missing = True
+        raise KeyError(key)
@@ -12,7 +12,7 @@ import argparse
 import logging
 import os.path
 import sys
-from . import job, util, version
+from . import util, version
 
 
 class ConfigAction(argparse.Action):
@@ -320,6 +320,12 @@ def build_parser():
         help=("Download URLs found in FILE. "
               "Delete them after they were downloaded successfully."),
     )
+    input.add_argument(
+        "--jobs",
+        dest="input-parallel", metavar="N", type=int, action=ConfigAction,
+        help=("Process up to N input URLs of different sites "
+              "at the same time"),
+    )
     input.add_argument(
         "--no-input",
         dest="input", nargs=0, action=ConfigConstAction, const=False,
@@ -367,17 +373,17 @@ def build_parser():
     )
     output.add_argument(
         "-s", "--simulate",
-        dest="jobtype", action="store_const", const=job.SimulationJob,
+        dest="jobtype", action="store_const", const="SimulationJob",
         help="Simulate data extraction; do not download anything",
     )
     output.add_argument(
         "-E", "--extractor-info",
-        dest="jobtype", action="store_const", const=job.InfoJob,
+        dest="jobtype", action="store_const", const="InfoJob",
         help="Print extractor defaults and settings",
     )
     output.add_argument(
         "-K", "--list-keywords",
-        dest="jobtype", action="store_const", const=job.KeywordJob,
+        dest="jobtype", action="store_const", const="KeywordJob",
         help=("Print a list of available keywords and example values "
               "for the given URLs"),
     )
@@ -432,6 +438,11 @@ def build_parser():
         dest="print_traffic", action="store_true",
         help=("Display sent and read HTTP traffic"),
     )
+    output.add_argument(
+        "--startup-profile",
+        dest="startup_profile", action="store_true",
+        help="Print the time it took to import each module",
+    )
     output.add_argument(
         "--no-colors",
         dest="colors", action="store_false",
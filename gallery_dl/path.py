@@ -10,11 +10,14 @@
 
 import os
 import re
+import sys
 import shutil
 import functools
+import unicodedata
 from . import util, formatter, exception
 
 WINDOWS = util.WINDOWS
+MACOS = (sys.platform == "darwin")
 EXTENSION_MAP = {
     "jpeg": "jpg",
     "jpe" : "jpg",
@@ -75,6 +78,7 @@ class PathFormat():
 
         self.kwdict = {}
         self.delete = False
+        self.enumerate = False
         self.prefix = ""
         self.filename = ""
         self.extension = ""
@@ -84,6 +88,21 @@ class PathFormat():
         self.realpath = ""
         self.temppath = ""
 
+        # names of hash algorithms downloaders should compute
+        # while writing a file, and their results for the current file
+        self.digests = set()
+        self.hashes = None
+        self.hashes_stat = None
+
+        # callable returning a file object downloaders can write
+        # the current file's content to instead of 'temppath'
+        self.stream = None
+        self.streamed = False
+
+        # True if 'realpath' is a link to another file
+        # whose metadata must not be changed
+        self.linked = False
+
         extension_map = config("extension-map")
         if extension_map is None:
             extension_map = EXTENSION_MAP
@@ -118,6 +137,8 @@ class PathFormat():
         if WINDOWS:
             self.extended = config("path-extended", True)
 
+        self._listings = {} if config("path-listing", True) else None
+
         basedir = extractor._parentdir
         if not basedir:
             basedir = config("base-directory")
@@ -152,35 +173,78 @@ class PathFormat():
     def open(self, mode="wb"):
         """Open file and return a corresponding file object"""
         try:
-            return open(self.temppath, mode)
+            fp = open(self.temppath, mode)
         except FileNotFoundError:
-            os.makedirs(self.realdirectory)
-            return open(self.temppath, mode)
+            os.makedirs(self.realdirectory, exist_ok=True)
+            fp = open(self.temppath, mode)
+        self._path_listed(self.temppath)
+        return fp
 
     def exists(self):
         """Return True if the file exists on disk"""
-        if self.extension and os.path.exists(self.realpath):
+        if self.extension and self._path_exists():
             return self.check_file()
         return False
 
-    @staticmethod
-    def check_file():
-        return True
+    def check_file(self):
+        return self._enum_file() if self.enumerate else True
 
     def _enum_file(self):
         num = 1
-        try:
-            while True:
-                prefix = format(num) + "."
-                self.kwdict["extension"] = prefix + self.extension
-                self.build_path()
-                os.stat(self.realpath)  # raises OSError if file doesn't exist
-                num += 1
-        except OSError:
-            pass
+        while True:
+            prefix = format(num) + "."
+            self.kwdict["extension"] = prefix + self.extension
+            self.build_path()
+            if not self._path_exists():
+                break
+            num += 1
         self.prefix = prefix
         return False
 
+    def _path_exists(self):
+        """Look up 'realpath' in a cached listing of its directory"""
+        listings = self._listings
+        if listings is None:
+            return os.path.exists(self.realpath)
+
+        directory, name = os.path.split(self.realpath)
+        try:
+            names = listings[directory]
+        except KeyError:
+            names = listings[directory] = self._listdir(directory)
+        if names is None:
+            return os.path.exists(self.realpath)
+        return _normalize_name(name) in names
+
+    def _path_listed(self, path):
+        """Add 'path' to its cached directory listing"""
+        try:
+            directory, name = os.path.split(path)
+            self._listings[directory].add(_normalize_name(name))
+        except (AttributeError, KeyError, TypeError):
+            pass
+
+    def _path_unlisted(self, path):
+        """Remove 'path' from its cached directory listing"""
+        try:
+            directory, name = os.path.split(path)
+            self._listings[directory].discard(_normalize_name(name))
+        except (AttributeError, KeyError, TypeError):
+            pass
+
+    @staticmethod
+    def _listdir(directory):
+        """Return a set of all normalized filenames in 'directory'"""
+        try:
+            return {
+                _normalize_name(name)
+                for name in os.listdir(directory or ".")
+            }
+        except FileNotFoundError:
+            return set()
+        except OSError:
+            return None
+
     def set_directory(self, kwdict):
         """Build directory path and create it if necessary"""
         self.kwdict = kwdict
@@ -213,6 +277,8 @@ class PathFormat():
         """Set general filename data"""
         self.kwdict = kwdict
         self.filename = self.temppath = self.prefix = ""
+        self.hashes = None
+        self.streamed = self.linked = False
 
         ext = kwdict["extension"]
         kwdict["extension"] = self.extension = self.extension_map(ext, ext)
@@ -321,6 +387,38 @@ class PathFormat():
                 os.path.basename(self.temppath),
             )
 
+    def hashes_set(self, hashes, path):
+        """Store 'hashes' computed for the current content of 'path'"""
+        self.hashes = hashes
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # content got streamed elsewhere
+            self.hashes_stat = None
+        else:
+            self.hashes_stat = (path, stat.st_size, stat.st_mtime_ns)
+
+    def hashes_get(self):
+        """Return 'hashes' if the file they belong to is unchanged
+
+        Any change of its path, size, or modification time,
+        e.g. by a post processor converting or editing it,
+        invalidates them.
+        """
+        hashes = self.hashes
+        if not hashes or not self.hashes_stat:
+            return None
+        path, size, mtime = self.hashes_stat
+        if path != self.temppath and path != self.realpath:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size != size or stat.st_mtime_ns != mtime:
+            return None
+        return hashes
+
     def part_size(self):
         """Return size of .part file"""
         try:
@@ -331,11 +429,19 @@ class PathFormat():
 
     def finalize(self):
         """Move tempfile to its target location"""
+        if self.streamed:
+            # content got written elsewhere
+            self.delete = False
+            return
+
         if self.delete:
             self.delete = False
             os.unlink(self.temppath)
+            self._path_unlisted(self.temppath)
             return
 
+        hashes = self.hashes_get()
+
         if self.temppath != self.realpath:
             # Move temp file to its actual location
             while True:
@@ -343,18 +449,33 @@ class PathFormat():
                     os.replace(self.temppath, self.realpath)
                 except FileNotFoundError:
                     # delayed directory creation
-                    os.makedirs(self.realdirectory)
+                    os.makedirs(self.realdirectory, exist_ok=True)
                     continue
                 except OSError:
                     # move across different filesystems
                     try:
                         shutil.copyfile(self.temppath, self.realpath)
                     except FileNotFoundError:
-                        os.makedirs(self.realdirectory)
+                        os.makedirs(self.realdirectory, exist_ok=True)
                         shutil.copyfile(self.temppath, self.realpath)
                     os.unlink(self.temppath)
                 break
+            self._path_unlisted(self.temppath)
+
+        self._path_listed(self.realpath)
 
         mtime = self.kwdict.get("_mtime")
-        if mtime:
+        if mtime and not self.linked:
             util.set_mtime(self.realpath, mtime)
+
+        if hashes:
+            # keep them valid for 'after' hooks
+            self.hashes_set(hashes, self.realpath)
+
+
+if WINDOWS or MACOS:
+    def _normalize_name(name):
+        # case-insensitive and, on macOS, Unicode-normalizing filesystems
+        return unicodedata.normalize("NFC", name).lower()
+else:
+    _normalize_name = util.identity
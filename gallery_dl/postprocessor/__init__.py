@@ -11,6 +11,7 @@
 modules = [
     "classify",
     "compare",
+    "dedup",
     "exec",
     "hash",
     "metadata",
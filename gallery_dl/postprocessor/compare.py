@@ -10,15 +10,21 @@
 
 from .common import PostProcessor
 from .. import text, util, exception
+import hashlib
 import os
 
 
 class ComparePP(PostProcessor):
+    DIGEST = "sha1"
 
     def __init__(self, job, options):
         PostProcessor.__init__(self, job)
         if options.get("shallow"):
             self._compare = self._compare_size
+        else:
+            # hash new files while downloading them
+            # instead of reading them again for each comparison
+            job.pathfmt.digests.add(self.DIGEST)
         self._equal_exc = self._equal_cnt = 0
 
         equal = options.get("equal")
@@ -40,7 +46,8 @@ class ComparePP(PostProcessor):
 
     def replace(self, pathfmt):
         try:
-            if self._compare(pathfmt.realpath, pathfmt.temppath):
+            if self._compare(pathfmt.realpath, pathfmt.temppath,
+                             self._digest(pathfmt)):
                 return self._equal(pathfmt)
         except OSError:
             pass
@@ -48,8 +55,10 @@ class ComparePP(PostProcessor):
 
     def enumerate(self, pathfmt):
         num = 1
+        digest = self._digest(pathfmt)
         try:
-            while not self._compare(pathfmt.realpath, pathfmt.temppath):
+            while not self._compare(
+                    pathfmt.realpath, pathfmt.temppath, digest):
                 pathfmt.prefix = prefix = format(num) + "."
                 pathfmt.kwdict["extension"] = prefix + pathfmt.extension
                 pathfmt.build_path()
@@ -59,13 +68,35 @@ class ComparePP(PostProcessor):
             pass
         self._equal_cnt = 0
 
-    def _compare(self, f1, f2):
-        return self._compare_size(f1, f2) and self._compare_content(f1, f2)
+    def _compare(self, f1, f2, digest=None):
+        if not self._compare_size(f1, f2):
+            return False
+        if digest:
+            return self._compare_digest(f1, digest)
+        return self._compare_content(f1, f2)
+
+    def _digest(self, pathfmt):
+        """Return the digest of a downloaded file if it is still valid"""
+        hashes = pathfmt.hashes_get()
+        if hashes and self.DIGEST in hashes:
+            return hashes[self.DIGEST].digest()
+        return None
 
     @staticmethod
-    def _compare_size(f1, f2):
+    def _compare_size(f1, f2, digest=None):
         return os.stat(f1).st_size == os.stat(f2).st_size
 
+    def _compare_digest(self, f1, digest):
+        h = hashlib.new(self.DIGEST)
+        size = 16384
+        with open(f1, "rb") as fp:
+            while True:
+                data = fp.read(size)
+                if not data:
+                    break
+                h.update(data)
+        return h.digest() == digest
+
     @staticmethod
     def _compare_content(f1, f2):
         size = 16384
@@ -83,6 +114,7 @@ class ComparePP(PostProcessor):
             self._equal_cnt += 1
             if self._equal_cnt >= self._equal_max:
                 util.remove_file(pathfmt.temppath)
+                pathfmt._path_unlisted(pathfmt.temppath)
                 print()
                 raise self._equal_exc()
         pathfmt.delete = True
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2024 Mike Fährmann
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+
+"""Store files with identical content only once"""
+
+from .common import PostProcessor
+from .. import util
+import threading
+import hashlib
+import sqlite3
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class DedupPP(PostProcessor):
+
+    def __init__(self, job, options):
+        PostProcessor.__init__(self, job)
+
+        self.algorithm = options.get("hash", "sha256")
+        hashlib.new(self.algorithm)  # raise ValueError if unsupported
+
+        action = options.get("on-duplicate", "link")
+        if action not in ("link", "skip", "keep"):
+            raise ValueError("Invalid 'on-duplicate' value '{}'".format(
+                action))
+        self.action = action
+
+        links = options.get("link", ("hard", "symbolic"))
+        if isinstance(links, str):
+            links = links.split(",")
+        self.links = []
+        for link in links:
+            func = getattr(self, "_link_" + link, None)
+            if not func:
+                raise ValueError("Invalid link type '{}'".format(link))
+            self.links.append((link, func))
+
+        path = options.get("database")
+        if path:
+            path = util.expand_path(path)
+        else:
+            # store index next to the cache database
+            from .. import cache
+            path = cache._path()
+            if not path or path == ":memory:":
+                raise ValueError("No 'database' path specified")
+            path = os.path.join(os.path.dirname(path), "dedup.sqlite3")
+        self.store = DedupStore(path)
+        self.log.debug("Using deduplication database '%s'", path)
+
+        # hash new files while downloading them
+        job.pathfmt.digests.add(self.algorithm)
+        job.register_hooks({"file": self.run}, options)
+        job.hooks["finalize"].append(self.finalize)
+
+    def run(self, pathfmt):
+        digest = self._digest(pathfmt)
+        path = os.path.abspath(pathfmt.realpath)
+
+        original = self.store.find(digest)
+        if not original or original == path or \
+                not os.path.exists(original):
+            self.store.add(digest, path)
+            return
+
+        if self.action == "keep":
+            self.log.debug("'%s' is a duplicate of '%s'", path, original)
+            return
+
+        if self.action == "skip":
+            self.log.debug("Skipping '%s' (duplicate of '%s')",
+                           path, original)
+            pathfmt.delete = True
+            return
+
+        os.makedirs(pathfmt.realdirectory, exist_ok=True)
+        temppath = pathfmt.realpath + ".dedup"
+        util.remove_file(temppath)
+        for name, link in self.links:
+            try:
+                link(original, temppath)
+                break
+            except OSError as exc:
+                self.log.debug("Unable to create %s link (%s: %s)",
+                               name, exc.__class__.__name__, exc)
+        else:
+            self.log.warning("Failed to link '%s' to '%s'; keeping a copy",
+                             path, original)
+            return
+
+        os.replace(temppath, pathfmt.realpath)
+        pathfmt._path_listed(pathfmt.realpath)
+        self.log.debug("Linked '%s' to '%s'", path, original)
+        # reflinks are independent files, but hard and symbolic links
+        # would apply 'set_mtime' to 'original'
+        pathfmt.linked = (name != "reflink")
+        if pathfmt.temppath != pathfmt.realpath:
+            pathfmt.delete = True
+
+    def finalize(self, pathfmt):
+        self.store.close()
+
+    def _digest(self, pathfmt):
+        hashes = pathfmt.hashes_get()
+        if hashes and self.algorithm in hashes:
+            return hashes[self.algorithm].hexdigest()
+
+        h = hashlib.new(self.algorithm)
+        with open(pathfmt.temppath, "rb") as fp:
+            while True:
+                data = fp.read(32768)
+                if not data:
+                    break
+                h.update(data)
+        return h.hexdigest()
+
+    @staticmethod
+    def _link_hard(src, dst):
+        os.link(src, dst)
+
+    @staticmethod
+    def _link_symbolic(src, dst):
+        os.symlink(src, dst)
+
+    @staticmethod
+    def _link_reflink(src, dst):
+        if fcntl is None:
+            raise OSError("not supported")
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            try:
+                # FICLONE
+                fcntl.ioctl(fdst.fileno(), 0x40049409, fsrc.fileno())
+            except OSError:
+                fdst.close()
+                os.unlink(dst)
+                raise
+
+
+class DedupStore():
+    """SQLite index mapping content hashes to file paths"""
+
+    def __init__(self, path):
+        try:
+            con = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        except sqlite3.OperationalError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            con = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        con.isolation_level = None
+
+        self.connection = con
+        self.lock = threading.Lock()
+        con.execute("CREATE TABLE IF NOT EXISTS dedup "
+                    "(digest TEXT PRIMARY KEY, path TEXT)")
+
+    def find(self, digest):
+        """Return the path of a file with content hash 'digest'"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT path FROM dedup WHERE digest=?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, digest, path):
+        """Register 'path' as file with content hash 'digest'"""
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO dedup (digest, path) VALUES (?, ?)",
+                (digest, path))
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.connection.close()
+
+
+__postprocessor__ = DedupPP
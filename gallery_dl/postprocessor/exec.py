@@ -28,6 +28,8 @@ class ExecPP(PostProcessor):
 
         if options.get("async", False):
             self._exec = self._exec_async
+            self.max_workers = options.get("max-workers") or 0
+            self.running = []
 
         args = options["command"]
         if isinstance(args, str):
@@ -43,7 +45,26 @@ class ExecPP(PostProcessor):
             events = ("after",)
         elif isinstance(events, str):
             events = events.split(",")
-        job.register_hooks({event: execute for event in events}, options)
+        hooks = {event: execute for event in events}
+
+        batch = options.get("batch")
+        if batch:
+            self.batch = []
+            self.batch_size = 0 if batch is True else batch
+            if isinstance(args, str):
+                self._batch_exec = self._batch_exec_string
+            else:
+                self._batch_exec = self._batch_exec_list
+            for event in events:
+                hooks[event] = self.batch_add
+            if self.batch_size <= 0 and "post-after" not in hooks:
+                hooks["post-after"] = self.batch_flush
+        else:
+            self.batch = None
+
+        job.register_hooks(hooks, options)
+        if batch or self._exec == self._exec_async:
+            job.hooks["finalize"].append(self.finalize)
 
         self._init_archive(job, options)
 
@@ -77,16 +98,102 @@ class ExecPP(PostProcessor):
         if archive:
             archive.add(pathfmt.kwdict)
 
+    def batch_add(self, pathfmt):
+        archive = self.archive
+        kwdict = pathfmt.kwdict
+
+        if archive and archive.check(kwdict):
+            return
+
+        if self._batch_exec == self._batch_exec_list:
+            kwdict["_directory"] = pathfmt.realdirectory
+            kwdict["_filename"] = pathfmt.filename
+            kwdict["_path"] = pathfmt.realpath
+            entry = [arg.format_map(kwdict) for arg in self.args]
+        else:
+            entry = (pathfmt.realdirectory, pathfmt.filename,
+                     pathfmt.realpath)
+
+        self.batch.append((entry, kwdict))
+        if self.batch_size and len(self.batch) >= self.batch_size:
+            self.batch_flush(pathfmt)
+
+    def batch_flush(self, pathfmt=None):
+        """Run the command for all accumulated files"""
+        batch = self.batch
+        if not batch:
+            return
+        self.batch = []
+
+        self._batch_exec([entry for entry, _ in batch])
+
+        if self.archive:
+            for _, kwdict in batch:
+                self.archive.add(kwdict)
+
+    def _batch_exec_list(self, entries):
+        # merge arguments that are identical for every file
+        # and put all differing ones next to each other
+        # ("-o {_path} -t {title}" -> "-o a b -t x y")
+        args = []
+        for values in zip(*entries):
+            first = values[0]
+            if all(value == first for value in values):
+                args.append(first)
+            else:
+                args.extend(values)
+        args[0] = os.path.expanduser(args[0])
+        self._exec(args, False)
+
+    def _batch_exec_string(self, entries):
+        directories, filenames, paths = zip(*entries)
+        values = {
+            "_directory": quote(directories[0]),
+            "_filename" : " ".join(map(quote, filenames)),
+            "_path"     : " ".join(map(quote, paths)),
+        }
+        values[""] = values["_path"]
+        args = self._sub(lambda m: values[m.group(1)], self.args)
+        self._exec(args, True)
+
+    def finalize(self, pathfmt):
+        if self.batch:
+            self.batch_flush(pathfmt)
+        if self._exec == self._exec_async:
+            for args, process in self.running:
+                self._check(args, process.wait())
+            self.running.clear()
+
     def _exec(self, args, shell):
         self.log.debug("Running '%s'", args)
-        retcode = util.Popen(args, shell=shell).wait()
-        if retcode:
-            self.log.warning("'%s' returned with non-zero exit status (%d)",
-                             args, retcode)
+        self._check(args, util.Popen(args, shell=shell).wait())
 
     def _exec_async(self, args, shell):
+        running = self.running
+        if running:
+            # reap finished child processes
+            active = []
+            for entry in running:
+                retcode = entry[1].poll()
+                if retcode is None:
+                    active.append(entry)
+                else:
+                    self._check(entry[0], retcode)
+            running[:] = active
+
+            # wait for the oldest one when at the limit
+            if self.max_workers and len(running) >= self.max_workers:
+                args_old, process = running.pop(0)
+                self.log.debug("Waiting for '%s'", args_old)
+                self._check(args_old, process.wait())
+
         self.log.debug("Running '%s'", args)
-        util.Popen(args, shell=shell)
+        running.append((args, util.Popen(args, shell=shell)))
+
+    def _check(self, args, retcode):
+        if retcode:
+            self.log.warning("'%s' returned with non-zero exit status (%d)",
+                             args, retcode)
 
     def _replace(self, match):
         name = match.group(1)
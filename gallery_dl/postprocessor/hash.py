@@ -13,6 +13,7 @@ import hashlib
 
 
 class HashPP(PostProcessor):
+    process_pool = None
 
     def __init__(self, job, options):
         PostProcessor.__init__(self, job)
@@ -33,6 +34,9 @@ class HashPP(PostProcessor):
         else:
             self.hashes = (("md5", "md5"), ("sha1", "sha1"))
 
+        # let downloaders compute these while writing a file
+        job.pathfmt.digests.update(name for _, name in self.hashes)
+
         events = options.get("event")
         if events is None:
             events = ("file",)
@@ -41,26 +45,40 @@ class HashPP(PostProcessor):
         job.register_hooks({event: self.run for event in events}, options)
 
     def run(self, pathfmt):
-        hashes = [
-            (key, hashlib.new(name))
-            for key, name in self.hashes
-        ]
-
-        size = self.chunk_size
         with self._open(pathfmt) as fp:
-            while True:
-                data = fp.read(size)
-                if not data:
-                    break
-                for _, h in hashes:
-                    h.update(data)
+            hashes = self._hashes_downloaded(pathfmt)
+            if hashes is None and self.process_pool is None:
+                hashes = self._hashes_compute(fp)
+
+        if hashes is None:
+            # compute digests in a separate process
+            digests = self.process_pool.submit(
+                hexdigests, fp.name, self.hashes, self.chunk_size).result()
+        else:
+            digests = [(key, h.hexdigest()) for key, h in hashes]
 
-        for key, h in hashes:
-            pathfmt.kwdict[key] = h.hexdigest()
+        for key, digest in digests:
+            pathfmt.kwdict[key] = digest
 
         if self.filename:
             pathfmt.build_path()
 
+    def _hashes_downloaded(self, pathfmt):
+        """Return hashes computed during download if they still apply"""
+        downloaded = pathfmt.hashes_get()
+        if not downloaded:
+            return None
+        try:
+            return [
+                (key, downloaded[name])
+                for key, name in self.hashes
+            ]
+        except KeyError:
+            return None
+
+    def _hashes_compute(self, fp):
+        return _hashes_compute(fp, self.hashes, self.chunk_size)
+
     def _open(self, pathfmt):
         try:
             return open(pathfmt.temppath, "rb")
@@ -68,4 +86,28 @@ class HashPP(PostProcessor):
             return open(pathfmt.realpath, "rb")
 
 
+def hexdigests(path, hashes, chunk_size=32768):
+    """Return (key, hexdigest) pairs for the file at 'path'"""
+    with open(path, "rb") as fp:
+        return [
+            (key, h.hexdigest())
+            for key, h in _hashes_compute(fp, hashes, chunk_size)
+        ]
+
+
+def _hashes_compute(fp, hashes, size):
+    hashes = [
+        (key, hashlib.new(name))
+        for key, name in hashes
+    ]
+
+    while True:
+        data = fp.read(size)
+        if not data:
+            break
+        for _, h in hashes:
+            h.update(data)
+    return hashes
+
+
 __postprocessor__ = HashPP
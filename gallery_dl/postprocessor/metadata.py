@@ -9,7 +9,7 @@
 """Write metadata to external files"""
 
 from .common import PostProcessor
-from .. import util, formatter
+from .. import util, text, formatter
 import json
 import sys
 import os
@@ -24,6 +24,7 @@ class MetadataPP(PostProcessor):
         cfmt = options.get("content-format") or options.get("format")
         omode = "w"
         filename = None
+        buffered = False
 
         if mode == "tags":
             self.write = self._write_tags
@@ -47,9 +48,33 @@ class MetadataPP(PostProcessor):
             ext = "txt"
         elif mode == "jsonl":
             self.write = self._write_json
-            self._json_encode = self._make_encoder(options).encode
+            self._json_encode = self._make_encoder_jsonl(options)
             omode = "a"
             filename = "data.jsonl"
+
+            self.compression = options.get("compression")
+            if self.compression:
+                if self.compression not in ("gzip", "zstd"):
+                    raise ValueError("Unsupported compression '{}'".format(
+                        self.compression))
+                if self.compression == "zstd":
+                    try:
+                        from compression import zstd  # noqa F401
+                    except ImportError:
+                        import zstandard  # noqa F401
+
+            buffer_size = options.get("buffer-size")
+            if isinstance(buffer_size, str):
+                size = text.parse_bytes(buffer_size, -1)
+                if size < 0:
+                    self.log.warning(
+                        "Invalid buffer size (%r)", buffer_size)
+                    size = None
+                buffer_size = size
+            if buffer_size is None:
+                buffer_size = 65536 if self.compression else 0
+            self.buffer_size = buffer_size
+            buffered = self.compression or buffer_size > 0
         else:
             self.write = self._write_json
             self._json_encode = self._make_encoder(options, 4).encode
@@ -89,6 +114,13 @@ class MetadataPP(PostProcessor):
             else:
                 self._filename = self._filename_custom
                 self._filename_fmt = formatter.parse(filename).format_map
+                if buffered:
+                    self.run = self._run_buffered
+                    self.fp = self.fp_path = None
+                    self.buffer = []
+                    self.buffer_len = 0
+                    self.buffer_archive = []
+                    job.hooks["finalize"].append(self.finalize)
         elif extfmt:
             self._filename = self._filename_extfmt
             self._extension_fmt = formatter.parse(extfmt).format_map
@@ -139,6 +171,80 @@ class MetadataPP(PostProcessor):
             if mtime:
                 util.set_mtime(path, mtime)
 
+    def _run_buffered(self, pathfmt):
+        archive = self.archive
+        if archive and archive.check(pathfmt.kwdict):
+            return
+
+        if util.WINDOWS and pathfmt.extended:
+            directory = pathfmt._extended_path(self._directory(pathfmt))
+        else:
+            directory = self._directory(pathfmt)
+        path = directory + self._filename(pathfmt)
+
+        if path != self.fp_path:
+            self.close()
+            if self.skip and os.path.exists(path):
+                return
+            try:
+                self.fp = self._open_jsonl(path)
+            except FileNotFoundError:
+                os.makedirs(directory, exist_ok=True)
+                self.fp = self._open_jsonl(path)
+            self.fp_path = path
+
+        kwdict = pathfmt.kwdict
+        if self.filter:
+            kwdict = self.filter(kwdict)
+        data = self._json_encode(kwdict) + "\n"
+        self.buffer.append(data)
+        self.buffer_len += len(data)
+        if archive:
+            # record only once its data got written
+            self.buffer_archive.append(pathfmt.kwdict)
+        if self.buffer_len >= self.buffer_size:
+            self.flush()
+
+    def _open_jsonl(self, path):
+        if self.compression == "gzip":
+            import gzip
+            return gzip.open(path, "at", encoding=self.encoding)
+
+        if self.compression == "zstd":
+            try:
+                from compression import zstd
+            except ImportError:
+                import zstandard
+                import io
+                writer = zstandard.ZstdCompressor().stream_writer(
+                    open(path, "ab"))
+                return io.TextIOWrapper(writer, encoding=self.encoding)
+            return zstd.open(path, "at", encoding=self.encoding)
+
+        return open(path, self.omode, encoding=self.encoding)
+
+    def flush(self):
+        """Write all buffered JSON Lines to the current output file"""
+        if self.buffer:
+            self.fp.write("".join(self.buffer))
+            self.fp.flush()
+            self.buffer.clear()
+            self.buffer_len = 0
+        if self.buffer_archive:
+            for kwdict in self.buffer_archive:
+                self.archive.add(kwdict)
+            self.buffer_archive.clear()
+
+    def close(self):
+        """Flush buffered data and close the current output file"""
+        if self.fp:
+            self.flush()
+            self.fp.close()
+            self.fp = self.fp_path = None
+
+    def finalize(self, pathfmt):
+        self.close()
+
     def _run_stdout(self, pathfmt):
         self.write(sys.stdout, pathfmt.kwdict)
 
@@ -261,6 +367,34 @@ class MetadataPP(PostProcessor):
         if not private:
             return util.filter_dict
 
+    def _make_encoder_jsonl(self, options):
+        encode = self._make_encoder(options).encode
+
+        # use 'orjson' for compact, non-ASCII-escaped output
+        if options.get("ascii") or options.get("indent") or \
+                options.get("separators") not in ([",", ":"], (",", ":")):
+            return encode
+        try:
+            import orjson
+        except ImportError:
+            return encode
+
+        dumps = orjson.dumps
+        flags = (orjson.OPT_NON_STR_KEYS |
+                 orjson.OPT_PASSTHROUGH_DATETIME |
+                 orjson.OPT_PASSTHROUGH_DATACLASS)
+        if options.get("sort"):
+            flags |= orjson.OPT_SORT_KEYS
+        default = util.json_default
+        error = orjson.JSONEncodeError
+
+        def encode_orjson(obj):
+            try:
+                return dumps(obj, default=default, option=flags).decode()
+            except error:
+                return encode(obj)
+        return encode_orjson
+
     @staticmethod
     def _make_encoder(options, indent=None):
         return json.JSONEncoder(
@@ -48,7 +48,7 @@ class RenamePP(PostProcessor):
         if os.path.exists(path_old):
             name_new = self._new(pathfmt)
             path_new = pathfmt.realdirectory + name_new
-            self._rename(path_old, name_old, path_new, name_new)
+            self._rename(pathfmt, path_old, name_old, path_new, name_new)
 
     def rename_to_skip(self, pathfmt):
         name_old = self._old(pathfmt)
@@ -58,7 +58,7 @@ class RenamePP(PostProcessor):
             pathfmt.filename = name_new = self._new(pathfmt)
             pathfmt.path = pathfmt.directory + name_new
             pathfmt.realpath = path_new = pathfmt.realdirectory + name_new
-            self._rename(path_old, name_old, path_new, name_new)
+            self._rename(pathfmt, path_old, name_old, path_new, name_new)
 
     def rename_to_pafter(self, pathfmt):
         pathfmt.filename = name_new = self._new(pathfmt)
@@ -66,7 +66,7 @@ class RenamePP(PostProcessor):
         pathfmt.realpath = pathfmt.realdirectory + name_new
         pathfmt.kwdict["_file_recheck"] = True
 
-    def _rename(self, path_old, name_old, path_new, name_new):
+    def _rename(self, pathfmt, path_old, name_old, path_new, name_new):
         if self.skip and os.path.exists(path_new):
             return self.log.warning(
                 "Not renaming '%s' to '%s' since another file with the "
@@ -74,6 +74,8 @@ class RenamePP(PostProcessor):
 
         self.log.info("'%s' -> '%s'", name_old, name_new)
         os.replace(path_old, path_new)
+        pathfmt._path_unlisted(path_old)
+        pathfmt._path_listed(path_new)
 
     def _apply_pathfmt(self, pathfmt):
         return pathfmt.build_filename(pathfmt.kwdict)
@@ -11,9 +11,12 @@
 from .common import PostProcessor
 from .. import util
 import subprocess
+import threading
+import types
 import tempfile
 import zipfile
 import shutil
+import copy
 import os
 
 try:
@@ -53,6 +56,9 @@ class UgoiraPP(PostProcessor):
                 mode = "mkvmerge"
             else:
                 mode = "concat"
+        elif mode == "image2pipe" and self.twopass:
+            # 2-pass encoding needs a separate log file for each run
+            mode = "concat"
 
         if mode == "mkvmerge":
             self._process = self._process_mkvmerge
@@ -60,6 +66,10 @@ class UgoiraPP(PostProcessor):
         elif mode == "image2":
             self._process = self._process_image2
             self._finalize = None
+        elif mode == "image2pipe":
+            self._process = self._process_image2pipe
+            self._finalize = None
+            self._tempdir = util.NullContext
         elif mode == "archive":
             if ext is None:
                 ext = "zip"
@@ -98,6 +108,18 @@ class UgoiraPP(PostProcessor):
         if self.prevent_odd:
             args += ("-vf", "crop=iw-mod(iw\\,2):ih-mod(ih\\,2)")
 
+        if options.get("async") and mode != "archive":
+            workers = options.get("async-workers") or os.cpu_count() or 1
+            from concurrent.futures import ThreadPoolExecutor
+            self.pool = ThreadPoolExecutor(workers)
+            # limit the number of queued conversions and their temp dirs
+            self.pool_slots = threading.Semaphore(workers * 2)
+            self.log.debug("converting in background using %d threads",
+                           workers)
+            job.hooks["finalize"].append(self.finalize)
+        else:
+            self.pool = None
+
         job.register_hooks({
             "prepare": self.prepare,
             "file"   : self.convert_from_zip,
@@ -139,6 +161,9 @@ class UgoiraPP(PostProcessor):
             return
         self._zip_source = True
 
+        if self.pool:
+            return self._convert_from_zip_async(pathfmt)
+
         with self._tempdir() as tempdir:
             if tempdir:
                 try:
@@ -156,18 +181,86 @@ class UgoiraPP(PostProcessor):
                     return self.log.debug("", exc_info=exc)
 
             if self.convert(pathfmt, tempdir):
-                if self.delete:
-                    pathfmt.delete = True
-                elif pathfmt.extension != "zip":
-                    self.log.info(pathfmt.filename)
-                    pathfmt.set_extension("zip")
-                    pathfmt.build_path()
+                self._converted_zip(pathfmt)
+
+    def _convert_from_zip_async(self, pathfmt):
+        pathfmt.set_extension(self.extension)
+        pathfmt.build_path()
+        if self.skip and pathfmt.exists():
+            return self._converted_zip(pathfmt)
+
+        tempdir = tempfile.TemporaryDirectory()
+        try:
+            with zipfile.ZipFile(pathfmt.temppath) as zfile:
+                zfile.extractall(tempdir.name)
+        except Exception as exc:
+            tempdir.cleanup()
+            pathfmt.realpath = pathfmt.temppath
+            if isinstance(exc, FileNotFoundError):
+                return
+            self.log.error(
+                "%s: Unable to extract frames from %s (%s: %s)",
+                pathfmt.kwdict.get("id"), pathfmt.filename,
+                exc.__class__.__name__, exc)
+            return self.log.debug("", exc_info=exc)
+
+        target = copy.copy(pathfmt)
+        target.kwdict = pathfmt.kwdict.copy()
+
+        if self.delete:
+            # keep the original file until its conversion succeeded
+            source = pathfmt.temppath
+            if source == target.realpath:
+                source += ".zip"
+                os.replace(pathfmt.temppath, source)
+                pathfmt.temppath = source
+            pathfmt.realpath = source
+            remove = (source,)
+        else:
+            pathfmt.set_extension("zip")
+            pathfmt.build_path()
+            remove = ()
+
+        self._submit(target, tempdir, remove, pathfmt.kwdict)
+
+    def _converted_zip(self, pathfmt):
+        if self.delete:
+            pathfmt.delete = True
+        elif pathfmt.extension != "zip":
+            self.log.info(pathfmt.filename)
+            pathfmt.set_extension("zip")
+            pathfmt.build_path()
 
     def convert_from_files(self, pathfmt):
         if not self._convert_files:
             return
         self._zip_source = False
 
+        if self.pool:
+            pathfmt.set_extension(self.extension)
+            pathfmt.build_path()
+            if self.skip and pathfmt.exists():
+                return
+            tempdir = tempfile.TemporaryDirectory()
+            try:
+                for frame in self._files:
+                    frame["file"] = name = "{}.{}".format(
+                        frame["file"].partition(".")[0], frame["ext"])
+                    self._copy_file(frame["path"], tempdir.name + "/" + name)
+            except OSError as exc:
+                tempdir.cleanup()
+                self.log.debug("Unable to copy frame %s (%s: %s)",
+                               name, exc.__class__.__name__, exc)
+                return
+
+            target = copy.copy(pathfmt)
+            target.kwdict = kwdict = pathfmt.kwdict.copy()
+            kwdict["num"] = 0
+            self._frames = self._files
+            remove = [frame["path"] for frame in self._files] \
+                if self.delete else ()
+            return self._submit(target, tempdir, remove, pathfmt.kwdict)
+
         with tempfile.TemporaryDirectory() as tempdir:
             for frame in self._files:
 
@@ -193,6 +286,49 @@ class UgoiraPP(PostProcessor):
                     for frame in self._files:
                         util.remove_file(frame["path"])
 
+    def finalize(self, pathfmt):
+        """Wait for all queued conversions to finish"""
+        self.pool.shutdown(wait=True)
+
+    def _submit(self, pathfmt, tempdir, remove, kwdict):
+        """Queue the conversion of the frames in 'tempdir'
+
+        'kwdict' is the metadata of the downloaded file,
+        which might get its '_mtime' value set by later hooks.
+        """
+        pp = copy.copy(self)
+        pp._frames = [frame.copy() for frame in self._frames]
+        # rebind methods selected in __init__ to the copy,
+        # so their per-file state does not end up in 'self'
+        for name, value in self.__dict__.items():
+            if getattr(value, "__self__", None) is self:
+                setattr(pp, name, types.MethodType(value.__func__, pp))
+        self.pool_slots.acquire()
+        self.pool.submit(
+            pp._convert_async, pathfmt, tempdir, remove, kwdict)
+
+    def _convert_async(self, pathfmt, tempdir, remove, kwdict):
+        try:
+            if self._convert_impl(pathfmt, tempdir.name):
+                self.log.info(pathfmt.filename)
+                # what finalize() does for synchronous conversions
+                mtime = kwdict.get("_mtime")
+                if mtime and os.path.exists(pathfmt.realpath):
+                    util.set_mtime(pathfmt.realpath, mtime)
+                for path in remove:
+                    util.remove_file(path)
+            else:
+                self.log.warning("%s: Failed to convert %s",
+                                 pathfmt.kwdict.get("id"), pathfmt.filename)
+        except Exception as exc:
+            self.log.error("%s: Failed to convert %s (%s: %s)",
+                           pathfmt.kwdict.get("id"), pathfmt.filename,
+                           exc.__class__.__name__, exc)
+            self.log.debug("", exc_info=exc)
+        finally:
+            tempdir.cleanup()
+            self.pool_slots.release()
+
     def convert(self, pathfmt, tempdir):
         pathfmt.set_extension(self.extension)
         pathfmt.build_path()
@@ -204,6 +340,11 @@ class UgoiraPP(PostProcessor):
     def convert_to_animation(self, pathfmt, tempdir):
         # process frames and collect command-line arguments
         args = self._process(pathfmt, tempdir)
+        if isinstance(args, tuple):
+            # frames to write to FFmpeg's stdin
+            args, stdin = args
+        else:
+            stdin = None
         if self.args_pp:
             args += self.args_pp
         if self.args:
@@ -222,7 +363,10 @@ class UgoiraPP(PostProcessor):
                 self._exec(args + ["2", pathfmt.realpath])
             else:
                 args.append(pathfmt.realpath)
-                self._exec(args)
+                if stdin:
+                    self._exec_image2pipe(args, *stdin)
+                else:
+                    self._exec(args)
             if self._finalize:
                 self._finalize(pathfmt, tempdir)
         except OSError as exc:
@@ -302,6 +446,44 @@ class UgoiraPP(PostProcessor):
             raise ValueError()
         return retcode
 
+    def _exec_image2pipe(self, args, source, frames):
+        self.log.debug(args)
+        out = None if self.output else subprocess.DEVNULL
+        process = util.Popen(
+            args, stdin=subprocess.PIPE, stdout=out, stderr=out)
+        try:
+            self._write_frames(process.stdin, source, frames)
+        except BrokenPipeError:
+            pass  # FFmpeg exited early; check its exit status
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        retcode = process.wait()
+        if retcode:
+            print()
+            self.log.error("Non-zero exit status when running %s (%s)",
+                           args, retcode)
+            raise ValueError()
+        return retcode
+
+    @staticmethod
+    def _write_frames(fp, source, frames):
+        """Write all frames, each repeated 'count' times, to 'fp'"""
+        if os.path.isdir(source):
+            for name, count in frames:
+                with open(os.path.join(source, name), "rb") as frame:
+                    data = frame.read()
+                for _ in range(count):
+                    fp.write(data)
+        else:
+            with zipfile.ZipFile(source) as zfile:
+                for name, count in frames:
+                    data = zfile.read(name)
+                    for _ in range(count):
+                        fp.write(data)
+
     def _copy_file(self, src, dst):
         shutil.copyfile(src, dst)
 
@@ -351,6 +533,32 @@ class UgoiraPP(PostProcessor):
             ),
         ]
 
+    def _process_image2pipe(self, pathfmt, tempdir):
+        frames = self._frames
+
+        # show each frame for a multiple of a common frame duration
+        if self._delay_is_uniform(frames):
+            duration = frames[0]["delay"]
+        else:
+            duration = self._delay_gcd(frames)
+            if duration < 10:
+                self.log.debug("Rounding frame delays to multiples of 10 ms "
+                               "(common divisor: %s ms)", duration)
+                duration = 10
+        pipe_frames = [
+            (frame["file"], max(round(frame["delay"] / duration), 1))
+            for frame in frames
+        ]
+
+        args = [self.ffmpeg, "-f", "image2pipe",
+                "-framerate", "1000/{}".format(duration), "-i", "-"]
+        rate_in, rate_out = self.calculate_framerate(frames)
+        if rate_out:
+            args += ("-r", str(rate_out))
+
+        # read frames directly from the downloaded ZIP archive
+        return args, (tempdir or pathfmt.temppath, pipe_frames)
+
     def _process_mkvmerge(self, pathfmt, tempdir):
         self._realpath = pathfmt.realpath
         pathfmt.realpath = tempdir + "/temp." + self.extension
@@ -10,7 +10,11 @@
 
 from .common import PostProcessor
 from .. import util
+import threading
 import zipfile
+import struct
+import time
+import io
 import os
 
 
@@ -40,19 +44,93 @@ class ZipPP(PostProcessor):
         self.args = (self.path + ext, "a",
                      self.COMPRESSION_ALGORITHMS[algorithm], True)
 
-        job.register_hooks({
-            "file": (self.write_safe if options.get("mode") == "safe" else
-                     self.write_fast),
-        }, options)
+        mode = options.get("mode")
+        if mode == "stream" and not _stream_supported():
+            self.log.warning("'stream' mode is not supported by this "
+                             "Python version's 'zipfile' module")
+            mode = None
+        if mode == "stream":
+            self.lock = threading.Lock()
+            self.hooks = job.hooks
+            job.pathfmt.stream = self.open_stream
+            write = self.write_stream
+        elif mode == "safe":
+            write = self.write_safe
+        else:
+            write = self.write_fast
+
+        job.register_hooks({"file": write}, options)
         job.hooks["finalize"].append(self.finalize)
 
     def open(self):
+        path = self.args[0]
+        if not zipfile.is_zipfile(path):
+            try:
+                with open(path, "rb") as fp:
+                    signature = fp.read(4)
+            except OSError:
+                pass
+            else:
+                if signature == b"PK\x03\x04":
+                    return self.recover(path)
+
         try:
             return zipfile.ZipFile(*self.args)
         except FileNotFoundError:
             os.makedirs(os.path.dirname(self.path))
             return zipfile.ZipFile(*self.args)
 
+    def recover(self, path):
+        """Rebuild the central directory of an incomplete ZIP archive"""
+        infos, end = _scan_local_headers(path)
+        self.log.warning("Recovering %d file(s) from incomplete ZIP archive "
+                         "'%s'", len(infos), path)
+
+        with open(path, "r+b") as fp:
+            fp.truncate(end)
+        zfile = zipfile.ZipFile(*self.args)
+        for zinfo in infos:
+            zfile.filelist.append(zinfo)
+            zfile.NameToInfo[zinfo.filename] = zinfo
+        zfile.start_dir = end
+        zfile._didModify = True
+        return zfile
+
+    def open_stream(self, pathfmt, size):
+        """Return a file object writing directly into the ZIP archive
+
+        Return None if another file is currently being written,
+        this file is already part of the archive,
+        or other post processors need access to it.
+        """
+        hooks = self.hooks
+        if len(hooks["file"]) > 1 or hooks.get("after") or \
+                hooks.get("post-after") or hooks.get("prepare-after"):
+            return None
+        if not self.lock.acquire(False):
+            return None
+        try:
+            if self.zfile is None:
+                self.zfile = self.open()
+            zfile = self.zfile
+            if self.files:
+                self.write_extra(pathfmt, zfile, self.files)
+                self.files = None
+            if pathfmt.filename in zfile.NameToInfo:
+                self.lock.release()
+                return None
+
+            zinfo = zipfile.ZipInfo(pathfmt.filename, time.localtime()[:6])
+            zinfo.compress_type = zfile.compression
+            zinfo.external_attr = 0o644 << 16
+            if size:
+                zinfo.file_size = size
+            fp = zfile.open(zinfo, "w", force_zip64=not size)
+        except BaseException:
+            self.lock.release()
+            raise
+        return ZipStream(pathfmt, fp, self.lock)
+
     def write(self, pathfmt, zfile):
         # 'NameToInfo' is not officially documented, but it's available
         # for all supported Python versions and using it directly is a lot
@@ -73,6 +151,11 @@ class ZipPP(PostProcessor):
         with self.open() as zfile:
             self.write(pathfmt, zfile)
 
+    def write_stream(self, pathfmt):
+        if not pathfmt.streamed:
+            with self.lock:
+                self.write_fast(pathfmt)
+
     def write_extra(self, pathfmt, zfile, files):
         for path in map(util.expand_path, files):
             if not os.path.isabs(path):
@@ -100,4 +183,147 @@ class ZipPP(PostProcessor):
                 util.remove_file(self.zfile.filename)
 
 
+class ZipStream():
+    """File object for the content of a single file in a ZIP archive"""
+
+    def __init__(self, pathfmt, fp, lock):
+        self.pathfmt = pathfmt
+        self.fp = fp
+        self.lock = lock
+        self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+    def write(self, data):
+        self.size += len(data)
+        return self.fp.write(data)
+
+    def tell(self):
+        return self.size
+
+    def close(self):
+        """Finish the current archive member"""
+        fp = self.fp
+        if fp is None:
+            return
+        self.fp = None
+        try:
+            fp.close()
+            self.pathfmt.streamed = True
+        finally:
+            self.lock.release()
+
+    def abort(self):
+        """Discard all data written so far"""
+        fp = self.fp
+        if fp is None:
+            return
+        self.fp = None
+        try:
+            # mark the member as closed without adding it to the archive
+            # and remove its data from the end of the archive file
+            io.BufferedIOBase.close(fp)
+            zfile = fp._zipfile
+            zfile._writing = False
+            zfile.fp.seek(fp._zinfo.header_offset)
+            zfile.fp.truncate()
+            zfile.start_dir = fp._zinfo.header_offset
+        finally:
+            self.lock.release()
+
+
+def _stream_supported():
+    """Check whether ZipStream.abort() can use zipfile's internals"""
+    try:
+        with zipfile.ZipFile(io.BytesIO(), "w") as zfile:
+            with zfile.open("test", "w") as fp:
+                return (hasattr(fp, "_zipfile") and
+                        hasattr(fp, "_zinfo") and
+                        hasattr(zfile, "_writing"))
+    except Exception:
+        return False
+
+
+def _scan_local_headers(path):
+    """Return info objects for all complete members of a ZIP archive
+    and the offset of the first byte after them"""
+    infos = []
+    offset = 0
+
+    with open(path, "rb") as fp:
+        fp.seek(0, os.SEEK_END)
+        size = fp.tell()
+
+        while True:
+            fp.seek(offset)
+            header = fp.read(zipfile.sizeFileHeader)
+            if len(header) < zipfile.sizeFileHeader or \
+                    header[:4] != zipfile.stringFileHeader:
+                break
+
+            (_, version, _, flags, compress_type, dostime, dosdate, crc,
+             compress_size, file_size, name_len, extra_len) = \
+                struct.unpack(zipfile.structFileHeader, header)
+            if flags & 0x08:
+                # sizes are stored after the data
+                break
+
+            name = fp.read(name_len)
+            extra = fp.read(extra_len)
+            if compress_size == 0xFFFFFFFF or file_size == 0xFFFFFFFF:
+                values = _zip64_extra(extra)
+                if file_size == 0xFFFFFFFF and values:
+                    file_size = values.pop(0)
+                if compress_size == 0xFFFFFFFF and values:
+                    compress_size = values.pop(0)
+
+            if compress_size == 0 and file_size:
+                # member got interrupted while writing
+                break
+            end = offset + zipfile.sizeFileHeader + \
+                name_len + extra_len + compress_size
+            if end > size:
+                break
+            fp.seek(end)
+            if fp.read(4) not in (
+                    b"", zipfile.stringFileHeader, zipfile.stringCentralDir):
+                break
+
+            zinfo = zipfile.ZipInfo(
+                name.decode("utf-8" if flags & 0x800 else "cp437"), (
+                    (dosdate >> 9) + 1980, (dosdate >> 5) & 0xF,
+                    dosdate & 0x1F, dostime >> 11,
+                    (dostime >> 5) & 0x3F, (dostime & 0x1F) * 2,
+                ))
+            zinfo.flag_bits = flags
+            zinfo.compress_type = compress_type
+            zinfo.extract_version = version
+            zinfo.CRC = crc
+            zinfo.compress_size = compress_size
+            zinfo.file_size = file_size
+            zinfo.header_offset = offset
+            zinfo.external_attr = 0o644 << 16
+            infos.append(zinfo)
+            offset = end
+
+    return infos, offset
+
+
+def _zip64_extra(extra):
+    while len(extra) >= 4:
+        tp, length = struct.unpack("<HH", extra[:4])
+        if tp == 1:
+            data = extra[4:4+length]
+            return list(struct.unpack("<{}Q".format(len(data) // 8), data))
+        extra = extra[4+length:]
+    return None
+
+
 __postprocessor__ = ZipPP
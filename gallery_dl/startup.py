@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2024 Mike Fährmann
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+
+"""Measure the time spent importing modules"""
+
+import sys
+import time
+import atexit
+import _thread
+import builtins
+
+_import = builtins.__import__
+_entries = []
+_stack = []
+_start = 0.0
+_thread_id = None
+
+
+def install():
+    """Start recording module imports and print a report at exit"""
+    global _start, _thread_id
+    _start = time.perf_counter()
+    _thread_id = _thread.get_ident()
+    builtins.__import__ = _import_timed
+    atexit.register(report)
+
+
+def report(file=None):
+    """Write a breakdown of all recorded imports to 'file'"""
+    builtins.__import__ = _import
+    if file is None:
+        file = sys.stderr
+    write = file.write
+
+    total = time.perf_counter() - _start
+    imports = sum(entry[2] for entry in _entries if not entry[0])
+
+    write("Startup profile: {:.1f} ms total, {:.1f} ms importing modules\n"
+          "     self |  cumulative | module\n".format(
+              total * 1000.0, imports * 1000.0))
+    for depth, name, cumulative, own in _entries:
+        if cumulative >= 0.0005:
+            write("{:6.1f} ms | {:6.1f} ms   | {}{}\n".format(
+                own * 1000.0, cumulative * 1000.0, "  " * depth, name))
+
+
+def _import_timed(name, globals=None, locals=None, fromlist=(), level=0):
+    if _thread.get_ident() != _thread_id:
+        return _import(name, globals, locals, fromlist, level)
+
+    num_modules = len(sys.modules)
+    children = [0.0]
+    _stack.append(children)
+    index = len(_entries)
+    _entries.append(None)
+
+    start = time.perf_counter()
+    try:
+        return _import(name, globals, locals, fromlist, level)
+    finally:
+        cumulative = time.perf_counter() - start
+        _stack.pop()
+
+        if len(sys.modules) == num_modules:
+            # nothing new got imported
+            del _entries[index:]
+        else:
+            if _stack:
+                _stack[-1][0] += cumulative
+            if not name:
+                name = ", ".join(fromlist)
+            _entries[index] = (
+                len(_stack), "." * level + name,
+                cumulative, cumulative - children[0])
@@ -15,15 +15,13 @@ import json
 import time
 import random
 import getpass
-import hashlib
 import binascii
 import datetime
 import functools
 import itertools
+import threading
 import subprocess
 import urllib.parse
-from http.cookiejar import Cookie
-from email.utils import mktime_tz, parsedate_tz
 from . import text, version, exception
 
 
@@ -126,6 +124,7 @@ def md5(s):
         s = b""
     elif isinstance(s, str):
         s = s.encode()
+    import hashlib
     return hashlib.md5(s).hexdigest()
 
 
@@ -135,6 +134,7 @@ def sha1(s):
         s = b""
     elif isinstance(s, str):
         s = s.encode()
+    import hashlib
     return hashlib.sha1(s).hexdigest()
 
 
@@ -350,6 +350,7 @@ def extract_headers(response):
 
     hlm = headers.get("last-modified")
     if hlm:
+        from email.utils import parsedate_tz
         data["date"] = datetime.datetime(*parsedate_tz(hlm)[:6])
 
     return data
@@ -397,6 +398,7 @@ def remove_directory(path):
 def set_mtime(path, mtime):
     try:
         if isinstance(mtime, str):
+            from email.utils import mktime_tz, parsedate_tz
             mtime = mktime_tz(parsedate_tz(mtime))
         os.utime(path, (time.time(), mtime))
     except Exception:
@@ -405,6 +407,7 @@ def set_mtime(path, mtime):
 
 def cookiestxt_load(fp):
     """Parse a Netscape cookies.txt file and add return its Cookies"""
+    from http.cookiejar import Cookie
     cookies = []
 
     for line in fp:
@@ -567,6 +570,52 @@ class NullContext():
         pass
 
 
+class RateLimiter():
+    """Enforce minimum time intervals between requests sharing a key"""
+    __slots__ = ("timestamp", "lock")
+
+    def __init__(self):
+        self.timestamp = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self, interval=0.0):
+        """Return number of seconds to wait before the next request
+
+        A non-zero 'interval' reserves the resulting time slot,
+        so that concurrent callers get consecutive slots.
+        """
+        with self.lock:
+            now = time.time()
+            seconds = self.timestamp + interval - now
+            if seconds < 0.0:
+                seconds = 0.0
+            if interval:
+                self.timestamp = now + seconds
+            return seconds
+
+    def update(self):
+        """Mark the end of a request"""
+        with self.lock:
+            now = time.time()
+            if now > self.timestamp:
+                self.timestamp = now
+
+    def block(self, seconds):
+        """Delay all further requests by 'seconds'"""
+        with self.lock:
+            until = time.time() + seconds
+            if until > self.timestamp:
+                self.timestamp = until
+
+
+def ratelimiter(key):
+    """Return the shared RateLimiter instance for 'key'"""
+    try:
+        return RATELIMITERS[key]
+    except KeyError:
+        return RATELIMITERS.setdefault(key, RateLimiter())
+
+
 class CustomNone():
     """None-style type that supports more operations than regular None"""
     __slots__ = ()
@@ -654,6 +703,7 @@ SENTINEL = object()
 USERAGENT = "gallery-dl/" + version.__version__
 EXECUTABLE = getattr(sys, "frozen", False)
 SPECIAL_EXTRACTORS = {"oauth", "recursive", "generic"}
+RATELIMITERS = {}
 GLOBALS = {
     "contains" : contains,
     "parse_int": text.parse_int,
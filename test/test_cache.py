@@ -13,6 +13,7 @@ import unittest
 from unittest.mock import patch
 
 import tempfile
+import threading
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from gallery_dl import config, util  # noqa E402
@@ -221,6 +222,95 @@ class TestCache(unittest.TestCase):
         self.assertEqual(db.cache[1][0], 3)
         self.assertEqual(db.cache[2][0], 6)
 
+    def test_database_expired(self):
+        @cache.cache(keyarg=0, maxage=10)
+        def ex(a):
+            return a
+
+        with patch("time.time") as tmock:
+            tmock.return_value = 1000.0
+            self.assertEqual(ex(1), 1)
+
+        db = cache.DatabaseCacheDecorator.database()
+        key = "{}.ex-1".format(__name__)
+        query = "SELECT COUNT(*) FROM data WHERE key=?"
+        self.assertEqual(db.execute(query, (key,)).fetchone()[0], 1)
+
+        # expired entries get removed when opening the database
+        cache.DatabaseCacheDecorator._init = True
+        cache.DatabaseCacheDecorator._local = threading.local()
+        db = cache.DatabaseCacheDecorator.database()
+        self.assertEqual(db.execute(query, (key,)).fetchone()[0], 0)
+        self.assertEqual(
+            db.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_database_threads(self):
+        @cache.cache(keyarg=0, maxage=10)
+        def th(a):
+            return threading.current_thread().name
+
+        connections = []
+
+        def run():
+            connections.append(cache.DatabaseCacheDecorator.database())
+            th(2)
+
+        self.assertEqual(th(1), "MainThread")
+        thread = threading.Thread(target=run, name="Thread2")
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(
+            connections[0], cache.DatabaseCacheDecorator.database())
+        th.cache.clear()
+        self.assertEqual(th(2), "Thread2")
+
+    def test_directory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set(("cache",), "file", os.path.join(tmpdir, "c.db"))
+            self.addCleanup(config.set, ("cache",), "file", dbpath)
+
+            path = cache.directory("test")
+            self.assertEqual(path, os.path.join(tmpdir, "c.d", "test"))
+            self.assertFalse(os.path.exists(path))
+
+            os.makedirs(path)
+            old = os.path.join(path, "old")
+            new = os.path.join(path, "new")
+            for file in (old, new):
+                with open(file, "w"):
+                    pass
+            os.utime(old, (0, 0))
+
+            cache._expired.discard("test")
+            self.assertEqual(cache.directory("test", 3600), path)
+            self.assertEqual(os.listdir(path), ["new"])
+
+            config.set(("cache",), "file", ":memory:")
+            self.assertIsNone(cache.directory("test"))
+
+    def test_directory_clear(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set(("cache",), "file", os.path.join(tmpdir, "c.db"))
+            self.addCleanup(config.set, ("cache",), "file", dbpath)
+
+            for name in ("foo", "bar"):
+                path = cache.directory(name)
+                os.makedirs(path)
+                for num in range(3):
+                    with open(os.path.join(path, str(num)), "w"):
+                        pass
+
+            with patch.object(cache.DatabaseCacheDecorator, "database",
+                              return_value=None):
+                self.assertEqual(cache.clear("FOO"), 3)
+                self.assertFalse(os.path.exists(cache.directory("foo")))
+                self.assertTrue(os.path.exists(cache.directory("bar")))
+
+                self.assertEqual(cache.clear("ALL"), 3)
+                self.assertEqual(os.listdir(os.path.join(tmpdir, "c.d")), [])
+                self.assertIsNone(cache.clear("ALL"))
+
 
 if __name__ == "__main__":
     unittest.main()
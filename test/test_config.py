@@ -162,6 +162,38 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(config.get(("b",)    , "c"), "text")
         self.assertEqual(config.get(("e", "f"), "g"), None)
 
+    def test_snapshot(self):
+        snap = config.Snapshot(("b", "b"))
+        self.assertEqual(snap.get("a")   , 1)
+        self.assertEqual(snap.get("c")   , [8, 9])
+        self.assertEqual(snap.get("g")   , None)
+        self.assertEqual(snap.get("g", 4), 4)
+
+        config.set(("b", "b"), "g", 5)
+        self.assertEqual(snap.get("g", 4), 5)
+        config.set(("b", "b"), "g", None)
+        self.assertEqual(snap.get("g", 4), None)
+        config.unset(("b", "b"), "g")
+        self.assertEqual(snap.get("g", 4), 4)
+
+        with config.apply(((("b", "b"), "c", 7),)):
+            self.assertEqual(snap.get("c"), 7)
+        self.assertEqual(snap.get("c"), [8, 9])
+
+        config.clear()
+        self.assertEqual(snap.get("a"), None)
+
+    def test_snapshot_common(self):
+        snap = config.Snapshot((("A1", "A2"), ("B1",)), ("Z1",))
+        self.assertEqual(snap.get("KEY", "DEFAULT"), "DEFAULT")
+
+        config.set(("Z1",), "KEY", 1)
+        self.assertEqual(snap.get("KEY", "DEFAULT"), 1)
+        config.set(("Z1", "B1"), "KEY", 2)
+        self.assertEqual(snap.get("KEY", "DEFAULT"), 2)
+        config.set(("Z1", "A1", "A2"), "KEY", 3)
+        self.assertEqual(snap.get("KEY", "DEFAULT"), 3)
+
     def test_load(self):
         with tempfile.TemporaryDirectory() as base:
             path1 = os.path.join(base, "cfg1")
@@ -13,16 +13,22 @@ import unittest
 from unittest.mock import Mock, MagicMock, patch
 
 import re
+import io
+import copy
 import logging
 import os.path
 import binascii
+import hashlib
 import tempfile
 import threading
+import time
+import email.utils
 import http.server
 
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from gallery_dl import downloader, extractor, output, config, path  # noqa E402
+from gallery_dl import exception, util  # noqa E402
 from gallery_dl.downloader.http import MIME_TYPES, SIGNATURE_CHECKS # noqa E402
 
 
@@ -199,6 +205,10 @@ class TestHTTPDownloader(TestDownloaderBase):
 
     def tearDown(self):
         self.downloader.minsize = self.downloader.maxsize = None
+        self.downloader.consume_max = None
+        self.downloader.precheck = self.downloader.conditional = False
+        self.downloader.segments = 1
+        self.downloader.stop_event = None
 
     def test_http_download(self):
         self._run_test("jpg", None, DATA["jpg"], "jpg", "jpg")
@@ -238,6 +248,228 @@ class TestHTTPDownloader(TestDownloaderBase):
         self.assertTrue(success)
         self.assertEqual(pathfmt.temppath, "")
 
+    def test_http_precheck(self):
+        self.downloader.precheck = "head"
+        pathfmt = self._prepare_destination(DATA["jpg"], extension="jpg")
+        pathfmt.set_extension("")
+
+        session = self.downloader.session
+        with patch.object(session, "request", wraps=session.request) as req:
+            success = self.downloader.download(
+                self.address + "/jpg", pathfmt)
+        self.assertTrue(success)
+        self.assertEqual(pathfmt.temppath, "")
+        self.assertEqual(pathfmt.extension, "jpg")
+        self.assertEqual(len(req.call_args_list), 1)
+        self.assertEqual(req.call_args[0][0], "HEAD")
+
+        self.downloader.precheck = "range"
+        self._run_test("png", None, DATA["png"], None, "png")
+
+    @patch("gallery_dl.cache.DatabaseCacheDecorator.database")
+    def test_http_conditional(self, database):
+        database.return_value = None
+        self.downloader.conditional = True
+        pathfmt = self._prepare_destination(DATA["gif"], extension="gif")
+
+        with self.assertLogs(self.downloader.log, "DEBUG") as log_info:
+            success = self.downloader.download(
+                self.address + "/gif", pathfmt)
+        self.assertTrue(success)
+        self.assertEqual(pathfmt.temppath, "")
+        self.assertIn("not modified", log_info.output[0])
+
+    @patch("gallery_dl.cache.DatabaseCacheDecorator.database")
+    def test_http_conditional_etag(self, database):
+        database.return_value = None
+        self.downloader.conditional = True
+        pathfmt = self._prepare_destination(extension="png")
+        url = self.address + "/png"
+
+        session = self.downloader.session
+        with patch.object(session, "request", wraps=session.request) as req:
+            self.assertTrue(self.downloader.download(url, pathfmt))
+            pathfmt.finalize()
+            headers = req.call_args[1]["headers"]
+            self.assertNotIn("If-None-Match", headers)
+
+            pathfmt.set_filename(pathfmt.kwdict)
+            pathfmt.build_path()
+            self.assertTrue(self.downloader.download(url, pathfmt))
+            headers = req.call_args[1]["headers"]
+            self.assertEqual(headers["If-None-Match"], '"png"')
+            self.assertEqual(pathfmt.temppath, "")
+
+            # stored ETag gets ignored for modified files
+            with open(pathfmt.realpath, "ab") as fp:
+                fp.write(b"\0")
+            pathfmt.set_filename(pathfmt.kwdict)
+            pathfmt.build_path()
+            self.assertTrue(self.downloader.download(url, pathfmt))
+            headers = req.call_args[1]["headers"]
+            self.assertNotIn("If-None-Match", headers)
+
+    def test_http_segments(self):
+        self.downloader.segments = 4
+        self.downloader.segment_min = 1000
+
+        session = self.downloader.session
+        with patch.object(session, "request", wraps=session.request) as req:
+            self._run_test("bin", None, DATA["bin"], "bin", "bin")
+        self.assertEqual(len(req.call_args_list), 4)
+        self.assertEqual(
+            req.call_args_list[-1][1]["headers"]["Range"], "bytes=7680-10239")
+
+    def test_http_segments_resume(self):
+        data = DATA["bin"]
+        pathfmt = self._prepare_destination(None, extension="bin")
+        os.makedirs(pathfmt.realdirectory, exist_ok=True)
+        path = pathfmt.temppath + ".part"
+        with open(path, "wb") as fp:
+            fp.truncate(len(data))
+            fp.write(data[:1000])
+            fp.seek(5000)
+            fp.write(data[5000:8000])
+        with open(path + ".segments", "w") as fp:
+            fp.write('{"size": 10240, "segments": '
+                     '[[0, 5000, 1000], [5000, 10240, 8000]]}')
+
+        session = self.downloader.session
+        with patch.object(session, "request", wraps=session.request) as req:
+            success = self.downloader.download(self.address + "/bin", pathfmt)
+        self.assertTrue(success)
+        self.assertEqual(pathfmt.temppath, path)
+        self.assertEqual(
+            {call[1]["headers"].get("Range") for call in req.call_args_list},
+            {None, "bytes=1000-4999", "bytes=8000-10239"})
+        with pathfmt.open("rb") as fp:
+            self.assertEqual(fp.read(), data)
+        self.assertFalse(os.path.exists(pathfmt.temppath + ".segments"))
+
+    def test_http_segments_invalid(self):
+        data = DATA["bin"]
+        pathfmt = self._prepare_destination(None, extension="bin")
+        os.makedirs(pathfmt.realdirectory, exist_ok=True)
+        path = pathfmt.temppath + ".part"
+        with open(path, "wb") as fp:
+            fp.truncate(len(data))
+            fp.write(data[:1000])
+        with open(path + ".segments", "w") as fp:
+            fp.write('{"size": 10240, "segm')
+
+        with self.assertLogs("downloader.http", "DEBUG") as log:
+            success = self.downloader.download(self.address + "/bin", pathfmt)
+        self.assertTrue(success)
+        self.assertIn("Discarding segmented download", log.output[0])
+        self.assertEqual(pathfmt.temppath, path)
+        with pathfmt.open("rb") as fp:
+            self.assertEqual(fp.read(), data)
+        self.assertFalse(os.path.exists(pathfmt.temppath + ".segments"))
+
+    def test_http_hashes(self):
+        data = DATA["jpg"]
+        pathfmt = self._prepare_destination(data[:100], extension="jpg")
+        pathfmt.digests.update(("md5", "sha1"))
+        try:
+            success = self.downloader.download(self.address + "/jpg", pathfmt)
+        finally:
+            pathfmt.digests.clear()
+
+        self.assertTrue(success)
+        self.assertEqual(pathfmt.hashes_stat[:2],
+                         (pathfmt.temppath, len(data)))
+        self.assertIs(pathfmt.hashes_get(), pathfmt.hashes)
+        self.assertEqual(pathfmt.hashes["md5"].hexdigest(),
+                         hashlib.md5(data).hexdigest())
+        self.assertEqual(pathfmt.hashes["sha1"].hexdigest(),
+                         hashlib.sha1(data).hexdigest())
+
+    def test_http_stream(self):
+        data = DATA["jpg"]
+        pathfmt = self._prepare_destination(None, extension="png")
+        buffer = io.BytesIO()
+        stream = MagicMock()
+        stream.__enter__.return_value = buffer
+        open_stream = pathfmt.stream = Mock(return_value=stream)
+        pathfmt.digests.add("md5")
+        try:
+            success = self.downloader.download(self.address + "/jpg", pathfmt)
+        finally:
+            pathfmt.stream = None
+            pathfmt.digests.clear()
+
+        self.assertTrue(success)
+        open_stream.assert_called_once_with(pathfmt, len(data))
+        stream.abort.assert_not_called()
+        self.assertEqual(buffer.getvalue(), data)
+        self.assertEqual(pathfmt.extension, "jpg")
+        self.assertFalse(os.path.exists(pathfmt.temppath))
+        self.assertEqual(pathfmt.hashes["md5"].hexdigest(),
+                         hashlib.md5(data).hexdigest())
+
+    def test_http_stop(self):
+        self.downloader.stop_event = stop = threading.Event()
+        pathfmt = self._prepare_destination(None, extension="jpg")
+        self.assertTrue(self.downloader.download(
+            self.address + "/jpg", pathfmt))
+
+        stop.set()
+        pathfmt = self._prepare_destination(None, extension="jpg")
+        with self.assertRaises(exception.TerminateExtraction):
+            self.downloader.download(self.address + "/jpg", pathfmt)
+
+    def test_http_429(self):
+        response = Mock(status_code=429, reason="Too Many Requests",
+                        headers={"Retry-After": "30"})
+        self.downloader.retries = 0
+        self.addCleanup(setattr, self.downloader, "retries",
+                        self.downloader.retries)
+
+        for host, headers, seconds in (
+            ("a.429.example.org", {"Retry-After": "30"}, 30.0),
+            ("b.429.example.org", {}, 1.0),
+        ):
+            response.headers = headers
+            pathfmt = self._prepare_destination(None, extension="jpg")
+            with patch.object(self.downloader.session, "request",
+                              return_value=response), \
+                    self.assertLogs("downloader.http", "WARNING"):
+                self.assertFalse(self.downloader.download(
+                    "https://{}/file.jpg".format(host), pathfmt))
+            self.assertAlmostEqual(
+                util.ratelimiter(host).reserve(), seconds, 0)
+
+    def test_http_retry_after(self):
+        retry_after = downloader.find("http")._retry_after
+        response = Mock(headers={"Retry-After": "12"})
+        self.assertEqual(retry_after(response, 1), 12.0)
+
+        response.headers["Retry-After"] = email.utils.formatdate(
+            time.time() + 100, usegmt=True)
+        self.assertAlmostEqual(retry_after(response, 1), 100.0, -1)
+
+        response.headers["Retry-After"] = "foo"
+        self.assertEqual(retry_after(response, 1), 1)
+
+    def test_http_release_conn(self):
+        release_conn = downloader.find("http").release_conn
+        self.downloader.consume_max = 100
+
+        response = Mock(headers={"Content-Length": "50"})
+        response.iter_content.return_value = (b"x" * 10 for _ in range(5))
+        release_conn(self.downloader, response)
+        response.close.assert_not_called()
+
+        response = Mock(headers={"Content-Length": "500"})
+        release_conn(self.downloader, response)
+        response.close.assert_called_once_with()
+        response.iter_content.assert_not_called()
+
+        response = Mock(headers={})
+        response.iter_content.return_value = (b"x" * 10 for _ in range(50))
+        release_conn(self.downloader, response)
+        response.close.assert_called_once_with()
+
 
 class TestTextDownloader(TestDownloaderBase):
 
@@ -255,10 +487,72 @@ class TestTextDownloader(TestDownloaderBase):
     def test_text_empty(self):
         self._run_test("text:", None, "", "txt", "txt")
 
+    def test_text_path_listing(self):
+        pathfmt = self._prepare_destination(extension="txt")
+        self.assertFalse(pathfmt.exists())
+
+        # files created by other programs are not part of the listing
+        os.makedirs(pathfmt.realdirectory, exist_ok=True)
+        with open(pathfmt.realpath, "w") as fp:
+            fp.write("foobar")
+        self.assertFalse(pathfmt.exists())
+
+        # downloaded files are
+        self.downloader.download("text:foobar", pathfmt)
+        pathfmt.finalize()
+        self.assertTrue(pathfmt.exists())
+
+        pathfmt.set_extension("png")
+        pathfmt.build_path()
+        self.assertFalse(pathfmt.exists())
+
+        # deleted files are removed from it
+        self.downloader.part = False
+        self.addCleanup(setattr, self.downloader, "part", True)
+        pathfmt = self._prepare_destination(extension="txt")
+        self.downloader.download("text:foobar", pathfmt)
+        pathfmt.delete = True
+        pathfmt.finalize()
+        self.assertFalse(pathfmt.exists())
+
+        # as are files moved to another directory
+        pathfmt = self._prepare_destination(extension="txt")
+        self.downloader.download("text:foobar", pathfmt)
+        realpath = pathfmt.realpath
+        pathfmt.realdirectory = os.path.join(
+            os.path.dirname(realpath), "sub", "")
+        pathfmt.realpath = pathfmt.realdirectory + "file.txt"
+        pathfmt.finalize()
+        pathfmt.realpath = realpath
+        self.assertFalse(pathfmt.exists())
+
+    def test_text_path_enumerate(self):
+        pathfmt = self._prepare_destination(extension="txt")
+        self.downloader.download("text:foobar", pathfmt)
+        pathfmt.finalize()
+        realpath = pathfmt.realpath
+
+        pathfmt.enumerate = True
+        self.addCleanup(setattr, pathfmt, "enumerate", False)
+        pathfmt.set_filename(pathfmt.kwdict)
+        pathfmt.build_path()
+
+        # copies enumerate their own path
+        worker = copy.copy(pathfmt)
+        worker.kwdict = pathfmt.kwdict.copy()
+        self.assertFalse(worker.exists())
+        self.assertEqual(worker.prefix, "1.")
+        self.assertNotEqual(worker.realpath, realpath)
+        self.assertEqual(pathfmt.prefix, "")
+        self.assertEqual(pathfmt.realpath, realpath)
+
 
 class HttpRequestHandler(http.server.BaseHTTPRequestHandler):
 
-    def do_GET(self):
+    def do_HEAD(self):
+        self.do_GET(False)
+
+    def do_GET(self, body=True):
         try:
             output = DATA[self.path[1:]]
         except KeyError:
@@ -266,17 +560,27 @@ class HttpRequestHandler(http.server.BaseHTTPRequestHandler):
             self.wfile.write(self.path.encode())
             return
 
-        headers = {"Content-Length": len(output)}
+        etag = '"{}"'.format(self.path[1:])
+        if "If-Modified-Since" in self.headers or \
+                self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        headers = {"Content-Length": len(output), "Accept-Ranges": "bytes",
+                   "ETag": etag}
 
         if "Range" in self.headers:
             status = 206
 
-            match = re.match(r"bytes=(\d+)-", self.headers["Range"])
+            match = re.match(r"bytes=(\d+)-(\d*)", self.headers["Range"])
             start = int(match.group(1))
+            end = int(match.group(2) or len(output)-1)
 
             headers["Content-Range"] = "bytes {}-{}/{}".format(
-                start, len(output)-1, len(output))
-            output = output[start:]
+                start, end, len(output))
+            headers["Content-Length"] = end - start + 1
+            output = output[start:end+1]
         else:
             status = 200
 
@@ -284,7 +588,8 @@ class HttpRequestHandler(http.server.BaseHTTPRequestHandler):
         for key, value in headers.items():
             self.send_header(key, value)
         self.end_headers()
-        self.wfile.write(output)
+        if body:
+            self.wfile.write(output)
 
 
 SAMPLES = {
@@ -339,7 +644,7 @@ SAMPLES = {
 }
 
 
-DATA = {}
+DATA = {"bin": bytes(range(256)) * 40}
 
 for ext, content in SAMPLES:
     if ext not in DATA:
@@ -10,16 +10,19 @@
 import os
 import sys
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, Mock
 
 import time
+import tempfile
+import threading
+import collections
 import string
 from datetime import datetime, timedelta
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from gallery_dl import extractor, util  # noqa E402
-from gallery_dl.extractor import mastodon  # noqa E402
-from gallery_dl.extractor.common import Extractor, Message  # noqa E402
+from gallery_dl import extractor, util, exception, config  # noqa E402
+from gallery_dl.extractor import mastodon, nozomi, common  # noqa E402
+from gallery_dl.extractor.common import Extractor, Message, prefetch  # noqa E402 E501
 from gallery_dl.extractor.directlink import DirectlinkExtractor  # noqa E402
 
 _list_classes = extractor._list_classes
@@ -166,6 +169,102 @@ class TestExtractorModule(unittest.TestCase):
             else:
                 self.assertIs(extr1, matches[0][1], url)
 
+    def test_dispatch_index(self):
+        index = extractor.DispatchIndex.build()
+
+        def find(url, classes):
+            for cls in classes:
+                if cls.pattern.match(url):
+                    return cls
+
+        for cls in extractor.extractors():
+            url = cls.example
+            self.assertIs(
+                find(url, index.candidates(url)),
+                find(url, _list_classes()),
+                url)
+
+        candidates = list(index.candidates("https://example.org/"))
+        self.assertLess(len(candidates), 20)
+        self.assertIn(DirectlinkExtractor, index.candidates(
+            "https://example.org/file.jpg"))
+
+    def test_dispatch_index_instances(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set(("cache",), "file", os.path.join(tmpdir, "cache"))
+            self.addCleanup(config.unset, ("cache",), "file")
+            index = extractor._index
+            self.addCleanup(setattr, extractor, "_index", index)
+
+            build = extractor.DispatchIndex.build
+            with patch.object(extractor.DispatchIndex, "build",
+                              side_effect=build) as b:
+                extractor._index = None
+                self.assertIn("mastodon", extractor._index_load().bases)
+                extractor._index = None
+                extractor._index_load()
+                self.assertEqual(b.call_count, 1)
+
+                # adding an instance invalidates the stored index
+                config.set(("extractor", "mastodon"), "my.instance", {
+                    "root": "https://my.instance.example"})
+                self.addCleanup(config.unset,
+                                ("extractor", "mastodon"), "my.instance")
+                extractor._index = None
+                extractor._index_load()
+                self.assertEqual(b.call_count, 2)
+
+                extractor._index = None
+                extractor._index_load()
+                self.assertEqual(b.call_count, 2)
+
+    def test_dispatch_index_options(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set(("cache",), "file", os.path.join(tmpdir, "cache"))
+            self.addCleanup(config.unset, ("cache",), "file")
+            index = extractor._index
+            self.addCleanup(setattr, extractor, "_index", index)
+
+            build = extractor.DispatchIndex.build
+            with patch.object(extractor.DispatchIndex, "build",
+                              side_effect=build) as b:
+                extractor._index = None
+                extractor._index_load()
+                self.assertEqual(b.call_count, 1)
+
+                # changing an option patterns depend on
+                # invalidates the stored index
+                config.set(("extractor", "ytdl"), "enabled", True)
+                self.addCleanup(config.unset,
+                                ("extractor", "ytdl"), "enabled")
+                extractor._index = None
+                extractor._index_load()
+                self.assertEqual(b.call_count, 2)
+
+                extractor._index = None
+                extractor._index_load()
+                self.assertEqual(b.call_count, 2)
+
+    def test_required_literals(self):
+        try:
+            from re import _parser as sre_parse
+        except ImportError:
+            import sre_parse
+
+        def literals(pattern):
+            return extractor._required_literals(sre_parse.parse(pattern))
+
+        self.assertEqual(
+            literals(r"(?:https?://)?(?:www\.)?Example\.org/(\d+)"),
+            ("example.org/",))
+        self.assertEqual(
+            literals(r"(?:https?://)?(?:foo\.com|bar\.net)/\w+"),
+            ["foo.com", "bar.net"])
+        self.assertEqual(
+            literals(r"(?:https?://)?(?:foo\.com|\w+\.net)/abcdef"),
+            ("/abcdef",))
+        self.assertIsNone(literals(r"\w+"))
+
     def test_init(self):
         """Test for exceptions in Extractor.initialize() and .finalize()"""
         def fail_request(*args, **kwargs):
@@ -286,6 +385,119 @@ class TestExtractorWait(unittest.TestCase):
         return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
 
 
+class TestExtractorPrefetch(unittest.TestCase):
+
+    def test_prefetch(self):
+        self.assertEqual(list(prefetch(range(10), 3)), list(range(10)))
+        self.assertEqual(list(prefetch((), 3)), [])
+
+    def test_prefetch_exception(self):
+        def pages():
+            yield 1
+            yield 2
+            raise exception.StopExtraction()
+
+        results = []
+        with self.assertRaises(exception.StopExtraction):
+            for page in prefetch(pages(), 1):
+                results.append(page)
+        self.assertEqual(results, [1, 2])
+
+    def test_prefetch_stop(self):
+        fetched = []
+
+        def pages():
+            for i in range(100):
+                fetched.append(i)
+                yield i
+
+        results = prefetch(pages(), 2)
+        self.assertEqual(next(results), 0)
+        results.close()
+
+        time.sleep(1.5)
+        self.assertLess(len(fetched), 5)
+
+    def test_prefetch_pages(self):
+        extr = extractor.find("generic:https://example.org/")
+        pages = iter(())
+        self.assertIs(extr._prefetch_pages(pages), pages)
+
+        extr.config = lambda key, default=None: 2
+        self.assertEqual(list(extr._prefetch_pages(iter((1, 2)))), [1, 2])
+
+
+class TestExtractorConnections(unittest.TestCase):
+
+    def setUp(self):
+        self.counter = collections.Counter()
+        previous = common.connection_counter(self.counter)
+        self.addCleanup(common.connection_counter, previous)
+
+    def test_count_connections(self):
+        conn = Mock()
+        pool = Mock(host="example.org")
+        pool._new_conn.return_value = conn
+        manager = Mock()
+        manager._new_pool.return_value = pool
+
+        common._count_connections(manager)
+        pool = manager._new_pool("https", "example.org", 443)
+        self.assertIs(pool._new_conn(), conn)
+        self.assertIs(pool._new_conn(), conn)
+        self.assertEqual(self.counter["example.org"], 2)
+
+    def test_count_connections_unsupported(self):
+        manager = object()
+        common._count_connections(manager)
+
+        pool = object()
+        manager = Mock(spec=("_new_pool",))
+        manager._new_pool.return_value = pool
+        common._count_connections(manager)
+        self.assertIs(manager._new_pool("https", "example.org", 443), pool)
+
+    def test_count_connections_urllib3(self):
+        adapter = common.RequestsAdapter()
+        manager = adapter.poolmanager
+        pool = manager.connection_from_host("example.org", 443, "https")
+        pool._new_conn()
+        self.assertEqual(self.counter["example.org"], 1)
+
+    def test_count_connections_thread(self):
+        adapter = common.RequestsAdapter()
+        manager = adapter.poolmanager
+        pool = manager.connection_from_host("example.org", 443, "https")
+        counter = collections.Counter()
+
+        def other():
+            common.connection_counter(counter)
+            pool._new_conn()
+            pool._new_conn()
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+        pool._new_conn()
+
+        # connections opened by other threads on the same, shared pool
+        # go to their own counters
+        self.assertEqual(self.counter["example.org"], 1)
+        self.assertEqual(counter["example.org"], 2)
+
+    def test_count_connections_prefetch(self):
+        pool = Mock(host="example.org")
+        manager = Mock()
+        manager._new_pool.return_value = pool
+        common._count_connections(manager)
+        pool = manager._new_pool("https", "example.org", 443)
+
+        def pages():
+            pool._new_conn()
+            yield 1
+        self.assertEqual(list(prefetch(pages(), 1)), [1])
+        self.assertEqual(self.counter["example.org"], 1)
+
+
 class TextExtractorOAuth(unittest.TestCase):
 
     def test_oauth1(self):
@@ -333,5 +545,47 @@ class TextExtractorOAuth(unittest.TestCase):
             self.assertEqual(len(m.mock_calls), 1)
 
 
+class TestExtractorNozomi(unittest.TestCase):
+
+    def test_decode(self):
+        data = bytes((0, 0, 0, 1, 1, 2, 3, 4, 255, 255, 255, 255, 9))
+        self.assertEqual(
+            list(nozomi.decode_nozomi(data)), [1, 0x01020304, 0xFFFFFFFF])
+        self.assertEqual(list(nozomi.decode_nozomi(b"")), [])
+
+    def test_intersect(self):
+        self.assertEqual(nozomi.intersect_nozomi(
+            [[5, 1, 3, 9, 7], [3, 4, 5, 9], [9, 8, 5, 3, 2, 1]],
+            [[3]]), [9, 5])
+        self.assertEqual(nozomi.intersect_nozomi([[1, 2], [3]]), [])
+
+    def test_request_cache(self):
+        extr = extractor.find("https://nozomi.la/search.html?q=foo")
+        url = "https://j.nozomi.la/nozomi/foo.nozomi"
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set(("cache",), "file", os.path.join(tmpdir, "cache"))
+            self.addCleanup(config.unset, ("cache",), "file")
+
+            response = Mock(status_code=200, content=b"\0\0\0\7")
+            response.headers = {"Last-Modified": "Sun, 18 Oct 2026 "
+                                                 "12:00:00 GMT"}
+            with patch.object(extr, "request", return_value=response) as r:
+                self.assertEqual(
+                    list(nozomi.request_nozomi(extr, url)), [7])
+            self.assertNotIn("If-Modified-Since", r.call_args[1]["headers"])
+            self.assertEqual(len(os.listdir(os.path.join(
+                tmpdir, "cache.d", "nozomi"))), 1)
+
+            response = Mock(status_code=304)
+            with patch.object(extr, "request", return_value=response) as r:
+                self.assertEqual(
+                    list(nozomi.request_nozomi(extr, url, {"A": "B"})), [7])
+            self.assertEqual(r.call_args[1]["headers"], {
+                "A": "B",
+                "If-Modified-Since": "Sun, 18 Oct 2026 12:00:00 GMT",
+            })
+
+
 if __name__ == "__main__":
     unittest.main()
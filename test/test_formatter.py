@@ -497,5 +497,63 @@ def noarg():
         self.assertEqual(output, result, format_string)
 
 
+class TestCompiledFormatter(TestFormatter):
+
+    def setUp(self):
+        formatter._FORMATTER = formatter.CompiledFormatter
+        formatter._CACHE.clear()
+
+    def tearDown(self):
+        formatter._FORMATTER = formatter.StringFormatter
+        formatter._CACHE.clear()
+
+    def test_compiled(self):
+        fmt = formatter.parse("{a}")
+        self.assertIsInstance(fmt, formatter.CompiledFormatter)
+        self.assertNotIn("try:", fmt.source)
+
+        fmt = formatter.parse("{d[a]:?[/]/}-{z|n|title1}")
+        self.assertEqual(fmt.format_map(self.kwdict), "[foo]-Title")
+        self.assertEqual(fmt.format_map({}), "-None")
+
+    @unittest.skipIf(not os.environ.get("GDL_TEST_BENCHMARK"),
+                     "set GDL_TEST_BENCHMARK to run benchmarks")
+    def test_benchmark(self):
+        import timeit
+
+        kwdict = {
+            "category"   : "example",
+            "subcategory": "gallery",
+            "id"         : 123456,
+            "user"       : {"name": "John Doe", "id": 789},
+            "title"      : "Gallery Title",
+            "tags"       : ["tag1", "tag2", "tag3"],
+            "date"       : datetime.datetime(2010, 1, 1),
+            "num"        : 3,
+            "extension"  : "jpg",
+        }
+        format_strings = (
+            "{category}/{subcategory}/{user[name]}",
+            "{category}/{user[name]!l}/{id} {title}",
+            "{date:%Y-%m-%d} {title:?/ - /R /_/} {tags:J, /L20/…/}",
+            "{category}_{id}_{num:>03}.{extension}",
+            "{user[nick]|user[name]} - {title[:20]} [{id}] {tags:J_/}",
+        )
+
+        print()
+        for format_string in format_strings:
+            fmt1 = formatter.StringFormatter(format_string)
+            fmt2 = formatter.CompiledFormatter(format_string)
+            self.assertEqual(
+                fmt1.format_map(kwdict), fmt2.format_map(kwdict))
+
+            t1 = min(timeit.repeat(
+                lambda: fmt1.format_map(kwdict), number=20000, repeat=5))
+            t2 = min(timeit.repeat(
+                lambda: fmt2.format_map(kwdict), number=20000, repeat=5))
+            print("{:<58} {:6.3f} µs {:6.3f} µs {:5.2f}x".format(
+                format_string, t1 * 50.0, t2 * 50.0, t1 / t2))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -9,13 +9,22 @@
 
 import os
 import sys
+import json
+import hashlib
 import unittest
-from unittest.mock import patch
+import tempfile
+import sqlite3
+import threading
+import zipfile
+import time
+from unittest.mock import Mock, patch
 
 import io
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from gallery_dl import job, config, text  # noqa E402
+import gallery_dl as gdl  # noqa E402
+from gallery_dl import job, config, text, output, archive  # noqa E402
+from gallery_dl import exception  # noqa E402
 from gallery_dl.extractor.common import Extractor, Message  # noqa E402
 
 
@@ -65,6 +74,337 @@ class TestDownloadJob(TestJob):
         self.assertEqual(func(TestExtractorParent), False)
         self.assertEqual(func(TestExtractorAlt)   , False)
 
+    def test_workers(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set((), "base-directory", tmpdir)
+            config.set((), "archive", os.path.join(tmpdir, "archive.db"))
+            config.set(("downloader",), "workers", 4)
+
+            extr = TestExtractorText.from_url("test:text")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            self.assertEqual(tjob.run(), 0)
+            self.assertEqual(tjob.workers, 4)
+
+            directory = os.path.join(tmpdir, "test_category")
+            for i in range(1, 13):
+                path = os.path.join(directory, "test_{}.txt".format(i))
+                with open(path) as fp:
+                    self.assertEqual(fp.read(), "content {}".format(i))
+
+            # second run: every file is in the archive
+            config.set((), "skip", "abort:3")
+            extr = TestExtractorText.from_url("test:text")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            with patch.object(tjob, "_skip_hooks") as hooks:
+                self.assertEqual(tjob.run(), 0)
+            self.assertEqual(len(hooks.call_args_list), 3)
+
+    def test_workers_interrupt(self):
+        extr = TestExtractor.from_url("test:")
+        tjob = self.jobclass(extr)
+        tjob._workers_init(1)
+        started = threading.Event()
+
+        def download():
+            started.set()
+            return tjob._workers_stop.wait(5)
+
+        running = tjob._workers_pool.submit(download)
+        pending = tjob._workers_pool.submit(download)
+        tjob._workers_futures = {running: {}, pending: {}}
+        started.wait(5)
+
+        with patch("concurrent.futures.as_completed",
+                   side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                tjob._workers_finalize()
+        self.assertTrue(running.result(0))
+        self.assertTrue(pending.cancelled())
+
+    def test_postprocessor_executor(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set((), "base-directory", tmpdir)
+            config.set((), "archive", os.path.join(tmpdir, "archive.db"))
+            config.set((), "postprocessors", [
+                {"name": "hash", "hashes": "sha1", "executor": "process",
+                 "executor-workers": 2},
+                {"name": "metadata", "event": "after"},
+            ])
+
+            extr = TestExtractorText.from_url("test:text")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            self.assertEqual(tjob.run(), 0)
+            self.assertEqual(tjob.pp_workers, 2)
+            self.assertTrue(tjob._pp_offload_file)
+            self.assertEqual(len(tjob.hooks["file"]), 1)
+
+            directory = os.path.join(tmpdir, "test_category")
+            for i in range(1, 13):
+                path = os.path.join(directory, "test_{}.txt".format(i))
+                with open(path + ".json") as fp:
+                    data = json.load(fp)
+                self.assertEqual(data["num"], i)
+                self.assertEqual(data["sha1"], hashlib.sha1(
+                    "content {}".format(i).encode()).hexdigest())
+
+            arch = archive.DownloadArchive(
+                os.path.join(tmpdir, "archive.db"), "test_category{num}")
+            self.assertTrue(all(arch.check_many(
+                [{"num": i} for i in range(1, 13)])))
+            arch.close()
+
+    def test_postprocessor_executor_workers(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set((), "base-directory", tmpdir)
+            config.set((), "archive", os.path.join(tmpdir, "archive.db"))
+            config.set(("downloader",), "workers", 2)
+            config.set((), "postprocessors", [
+                {"name": "hash", "hashes": "sha1", "executor": "thread"},
+                {"name": "metadata", "event": "after"},
+            ])
+
+            extr = TestExtractorText.from_url("test:text")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            self.assertEqual(tjob.run(), 0)
+            self.assertEqual(tjob.pp_workers, 1)
+
+            directory = os.path.join(tmpdir, "test_category")
+            for i in range(1, 13):
+                path = os.path.join(directory, "test_{}.txt".format(i))
+                with open(path + ".json") as fp:
+                    self.assertIn("sha1", json.load(fp))
+
+    def test_postprocessor_executor_serial(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set((), "base-directory", tmpdir)
+            config.set((), "postprocessors", [
+                {"name": "hash", "hashes": "sha1", "executor": "thread",
+                 "executor-workers": 4},
+                {"name": "zip", "compression": "store"},
+            ])
+
+            active = []
+            maximum = []
+            write = zipfile.ZipFile.write
+
+            def write_slow(*args, **kwargs):
+                active.append(1)
+                maximum.append(len(active))
+                time.sleep(0.01)
+                active.pop()
+                return write(*args, **kwargs)
+
+            extr = TestExtractorText.from_url("test:text")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            with patch.object(zipfile.ZipFile, "write", write_slow):
+                self.assertEqual(tjob.run(), 0)
+            self.assertEqual(tjob.pp_workers, 4)
+            self.assertEqual(max(maximum), 1)
+
+            with zipfile.ZipFile(os.path.join(
+                    tmpdir, "test_category.zip")) as zfile:
+                self.assertEqual(len(zfile.namelist()), 12)
+
+    def test_postprocessor_executor_stateful(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set((), "base-directory", tmpdir)
+            config.set((), "postprocessors", [
+                {"name": "hash", "executor": "thread"},
+                {"name": "ugoira", "executor": "thread"},
+            ])
+
+            extr = TestExtractorText.from_url("test:text")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            with self.assertLogs("postprocessor", "WARNING") as log:
+                self.assertEqual(tjob.run(), 0)
+            self.assertEqual(tjob.pp_workers, 0)
+            self.assertIn("'ugoira' does not support 'executor'",
+                          log.output[0])
+            self.assertIn("since UgoiraPP would run there", log.output[1])
+
+    def test_archive_batch(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set((), "base-directory", tmpdir)
+            config.set((), "archive", os.path.join(tmpdir, "archive.db"))
+            config.set((), "archive-mode", "batch")
+            config.set((), "archive-batch-size", 5)
+
+            extr = TestExtractorText.from_url("test:text")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            with patch.object(archive.DownloadArchiveBatch, "flush",
+                              autospec=True,
+                              side_effect=archive.DownloadArchiveBatch.flush,
+                              ) as flush:
+                self.assertEqual(tjob.run(), 0)
+            # 2 full batches + finalize() + close()
+            self.assertEqual(len(flush.call_args_list), 4)
+
+            arch = archive.DownloadArchive(
+                os.path.join(tmpdir, "archive.db"), "test_category{num}")
+            kwdicts = [{"num": i} for i in range(10, 15)]
+            self.assertEqual(
+                arch.check_many(kwdicts), [True, True, True, False, False])
+            self.assertEqual(kwdicts[0]["_archive_key"], "test_category10")
+            arch.close()
+
+    def test_archive_batch_post(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "archive.db")
+            config.set((), "base-directory", tmpdir)
+            config.set((), "archive", path)
+            config.set((), "archive-mode", "batch")
+            config.set((), "archive-batch-interval", 3600)
+
+            extr = TestExtractorText.from_url("test:text")
+            tjob = self.jobclass(extr)
+            tjob.initialize({})
+            tjob.archive.add({"num": 1})
+
+            con = sqlite3.connect(path)
+            count = "SELECT COUNT(*) FROM archive"
+            self.assertEqual(con.execute(count).fetchone()[0], 0)
+
+            # start of the next post
+            tjob.handle_directory({})
+            self.assertEqual(con.execute(count).fetchone()[0], 1)
+            con.close()
+            tjob.archive.close()
+
+    def test_archive_early(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config.set((), "base-directory", tmpdir)
+            config.set((), "archive", os.path.join(tmpdir, "archive.db"))
+
+            extr = TestExtractorArchived.from_url("test:archived")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            self.assertEqual(tjob.run(), 0)
+            self.assertEqual(extr.details, list(range(1, 13)))
+
+            config.set((), "skip", "abort:5")
+            extr = TestExtractorArchived.from_url("test:archived")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            self.assertEqual(tjob.run(), 0)
+            self.assertEqual(extr.details, [])
+            self.assertEqual(tjob._skipcnt, 5)
+
+            config.set((), "skip", True)
+            extr = TestExtractorArchived.from_url("test:archived")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            paths = []
+            with patch.object(tjob, "_skip_hooks",
+                              lambda pathfmt: paths.append(pathfmt.path)):
+                self.assertEqual(tjob.run(), 0)
+            self.assertEqual(extr.details, [])
+            directory = os.path.join(tmpdir, "test_category", "")
+            self.assertEqual(paths, [
+                "{}test_{}.txt".format(directory, i) for i in range(1, 13)])
+            self.assertEqual(tjob.pathfmt.kwdict["category"], "test_category")
+            self.assertNotIn("num", tjob.pathfmt.kwdict)
+
+            # no 'skip' hooks for entries without a usable path
+            config.set((), "filename", "{title}.{extension}")
+            extr = TestExtractorArchived.from_url("test:archived")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            with patch.object(tjob, "_skip_hooks") as skip_hooks:
+                self.assertEqual(tjob.run(), 0)
+            self.assertEqual(extr.details, [])
+            self.assertEqual(skip_hooks.call_count, 0)
+            config.unset((), "filename")
+
+            # early check disabled by range and filter predicates
+            config.set((), "image-range", "3-5")
+            extr = TestExtractorArchived.from_url("test:archived")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            self.assertEqual(tjob.run(), 0)
+            self.assertEqual(extr.details, [1, 2, 3, 4, 5, 6])
+            config.unset((), "image-range")
+
+            config.set((), "skip", "abort:5")
+            config.set((), "archive-early", False)
+            extr = TestExtractorArchived.from_url("test:archived")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            self.assertEqual(tjob.run(), 0)
+            self.assertEqual(extr.details, [1, 2, 3, 4, 5])
+
+    def test_archive_filter(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "archive.db")
+            config.set((), "base-directory", tmpdir)
+            config.set((), "archive", path)
+            config.set((), "archive-filter", True)
+
+            extr = TestExtractorText.from_url("test:text")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            self.assertEqual(tjob.run(), 0)
+            self.assertTrue(os.path.exists(path + ".bloom"))
+
+            arch = archive.DownloadArchive(path, "test_category{num}")
+            arch.load_filter(path + ".bloom")
+            self.assertEqual(arch.bloom.generation, 12)
+            self.assertEqual(arch.bloom.count, 12)
+            for num in range(1, 13):
+                self.assertIn("test_category{}".format(num), arch.bloom)
+                self.assertTrue(arch.check({"num": num}))
+            with patch.object(arch, "cursor") as cursor:
+                self.assertFalse(arch.check({"num": 100}))
+            cursor.execute.assert_not_called()
+
+            # modified archive -> stale filter
+            arch.add({"num": 13})
+            arch.bloom = None
+            arch.close()
+            arch = archive.DownloadArchive(path, "test_category{num}")
+            arch.load_filter(path + ".bloom")
+            self.assertEqual(arch.bloom.generation, 13)
+            self.assertEqual(arch.bloom.count, 13)
+            arch.close()
+
+            # entries added by other programs
+            con = sqlite3.connect(path)
+            with con:
+                con.execute("INSERT INTO archive VALUES ('test_category14')")
+            con.close()
+            arch = archive.DownloadArchive(path, "test_category{num}")
+            arch.load_filter(path + ".bloom")
+            self.assertEqual(arch.bloom.generation, 14)
+            self.assertTrue(arch.check({"num": 14}))
+            arch.close()
+
+    def test_archive_no_filter(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "archive.db")
+            config.set((), "base-directory", tmpdir)
+            config.set((), "archive", path)
+
+            extr = TestExtractorText.from_url("test:text")
+            tjob = self.jobclass(extr)
+            tjob.out = output.NullOutput()
+            self.assertEqual(tjob.run(), 0)
+
+            con = sqlite3.connect(path)
+            self.assertEqual(
+                con.execute("PRAGMA user_version").fetchone()[0], 0)
+            self.assertEqual(con.execute(
+                "SELECT COUNT(*) FROM sqlite_master "
+                "WHERE name LIKE 'archive_%'").fetchone()[0], 0)
+            self.assertEqual(con.execute(
+                "SELECT COUNT(*) FROM archive").fetchone()[0], 12)
+            con.close()
+
 
 class TestKeywordJob(TestJob):
     jobclass = job.KeywordJob
@@ -354,6 +694,175 @@ class TestDataJob(TestJob):
         self.assertEqual(tjob.data[-1][2]["num"], "3")
 
 
+class TestParallelJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.runs = []
+        self.found = []
+        self.counts = []
+        self.stopped = []
+        self.started = threading.Event()
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        config.clear()
+
+    def _run(self, urls, workers=2):
+        input_manager = gdl.InputManager()
+        input_manager.err = Mock()
+        input_manager.add_list(urls)
+
+        def find(url):
+            self.found.append(url)
+            extr = Mock()
+            extr.category = url.partition(":")[0]
+            extr.url = url
+            return extr
+
+        test = self
+
+        class FakeJob():
+            def __init__(self, url):
+                self.url = url if isinstance(url, str) else url.url
+
+            def run(self):
+                with test.lock:
+                    test.runs.append((self.url, config.get((), "opt")))
+                    test.counts.append(len(test.found))
+                status = self.url.rpartition(":")[2]
+                if status == "exit":
+                    raise SystemExit(3)
+                if status == "unsupported":
+                    raise exception.NoExtractorError()
+                if status == "error":
+                    raise ValueError(self.url)
+                if status == "wait":
+                    test.started.set()
+                    self.stop_event.wait(5)
+                    test.stopped.append(self.stop_event.is_set())
+                    return 0
+                return int(status)
+
+        pjobs = self.pjobs = gdl.ParallelJobs(
+            input_manager, FakeJob, workers)
+        with patch("gallery_dl.extractor.find", side_effect=find):
+            try:
+                retval = pjobs.run()
+            except (SystemExit, KeyboardInterrupt) as exc:
+                retval = exc
+        return retval, input_manager
+
+    def test_status(self):
+        urls = ["a:1:0", "b:1:4", "a:2:0", "c:1:8", "b:2:unsupported"]
+        retval, input_manager = self._run(urls)
+
+        self.assertEqual(retval, 4 | 8 | 64)
+        self.assertEqual(sorted(url for url, _ in self.runs), sorted(urls))
+        errors = input_manager.err.info.call_args_list
+        self.assertEqual(
+            sorted(args[0] for args, _ in errors),
+            ["b:1:4", "b:2:unsupported", "c:1:8"])
+
+    def test_order(self):
+        urls = ["{}:{}:0".format(category, num)
+                for num in range(5)
+                for category in "abc"]
+        self._run(urls, 3)
+
+        self.assertEqual(len(self.runs), 15)
+        for category in "abc":
+            self.assertEqual(
+                [url for url, _ in self.runs if url[0] == category],
+                [url for url in urls if url[0] == category])
+
+    def test_lazy(self):
+        urls = ["{}:1:0".format(category) for category in "abcde"]
+        self._run(urls, 1)
+
+        self.assertEqual(self.found, urls)
+        self.assertEqual(self.counts, [1, 2, 3, 4, 5])
+
+    def test_exit(self):
+        urls = ["a:1:exit", "a:2:0", "a:3:0"]
+        retval, _ = self._run(urls)
+
+        self.assertIsInstance(retval, SystemExit)
+        self.assertEqual(retval.code, 3)
+        self.assertEqual(self.runs, [("a:1:exit", None)])
+
+    def test_error(self):
+        urls = ["a:1:error", "a:2:4", "b:1:0"]
+        with self.assertLogs("gallery-dl", "ERROR") as log:
+            retval, input_manager = self._run(urls)
+
+        self.assertEqual(retval, 1 | 4)
+        self.assertEqual(sorted(url for url, _ in self.runs), sorted(urls))
+        self.assertEqual(log.output[0],
+                         "ERROR:gallery-dl:ValueError: a:1:error")
+        errors = input_manager.err.info.call_args_list
+        self.assertEqual(
+            sorted(args[0] for args, _ in errors), ["a:1:error", "a:2:4"])
+
+    def test_interrupt(self):
+        urls = ["a:1:wait", "a:2:0", "b:1:0"]
+        join = threading.Thread.join
+        interrupted = []
+
+        def join_interrupt(thread, *args):
+            if not interrupted:
+                interrupted.append(thread)
+                self.started.wait(5)
+                raise KeyboardInterrupt()
+            return join(thread, *args)
+
+        with patch.object(threading.Thread, "join", join_interrupt):
+            retval, _ = self._run(urls, 1)
+
+        self.assertIsInstance(retval, KeyboardInterrupt)
+        self.assertEqual(self.stopped, [True])
+        self.assertEqual(self.runs, [("a:1:wait", None)])
+        self.assertFalse(interrupted[0].daemon)
+        self.assertFalse(interrupted[0].is_alive())
+
+    def test_stop_event(self):
+        extr = TestExtractor.from_url("test:")
+        tjob = job.DownloadJob(extr)
+        tjob.stop_event = threading.Event()
+        tjob.stop_event.set()
+        tjob.handle_url = Mock()
+        with self.assertRaises(exception.TerminateExtraction):
+            tjob.run()
+        tjob.handle_url.assert_not_called()
+
+    def test_extended_url(self):
+        urls = ["a:1:0", "b:1:0",
+                gdl.ExtendedUrl("c:1:0", [], [((), "opt", "foo")]),
+                "a:2:0"]
+        retval, _ = self._run(urls)
+
+        self.assertEqual(retval, 0)
+        self.assertEqual(sorted(self.runs[:2]), [
+            ("a:1:0", None), ("b:1:0", None)])
+        self.assertEqual(self.runs[2:], [("c:1:0", "foo"), ("a:2:0", None)])
+
+
+class TestSigterm(unittest.TestCase):
+
+    def test_writes_on_finalize(self):
+        func = gdl._writes_on_finalize
+        self.assertFalse(func(None))
+        self.assertFalse(func(({"archive": "~/archive.db"}, None)))
+        self.assertFalse(func({"postprocessors": [
+            "zip", {"name": "metadata", "mode": "jsonl"}]}))
+
+        self.assertTrue(func({"archive-mode": "batch"}))
+        self.assertTrue(func({"twitter": {"archive-mode": "batch"}}))
+        self.assertTrue(func(({}, {"meta": {
+            "name": "metadata", "mode": "jsonl", "buffer-size": "64k"}})))
+        self.assertTrue(func({"postprocessors": [
+            {"name": "exec", "command": ["echo"], "batch": 10}]}))
+
+
 class TestExtractor(Extractor):
     category = "test_category"
     subcategory = "test_subcategory"
@@ -387,6 +896,39 @@ class TestExtractor(Extractor):
             })
 
 
+class TestExtractorText(Extractor):
+    category = "test_category"
+    subcategory = "test_subcategory_text"
+    archive_fmt = "{num}"
+    pattern = r"test:text$"
+
+    def items(self):
+        yield Message.Directory, {}
+        for i in range(1, 13):
+            yield Message.Url, "text:content {}".format(i), {
+                "num"      : i,
+                "filename" : "test_{}".format(i),
+                "extension": "txt",
+            }
+
+
+class TestExtractorArchived(TestExtractorText):
+    subcategory = "test_subcategory_archived"
+    pattern = r"test:archived$"
+
+    def items(self):
+        self.details = []
+        yield Message.Directory, {}
+        for i in range(1, 13):
+            kwdict = {"num": i, "filename": "test_{}".format(i),
+                      "extension": "txt"}
+            if self.archived(kwdict):
+                continue
+            self.details.append(i)
+            kwdict["extension"] = "txt"
+            yield Message.Url, "text:content {}".format(i), kwdict
+
+
 class TestExtractorParent(Extractor):
     category = "test_category"
     subcategory = "test_subcategory_parent"
@@ -13,15 +13,19 @@ import unittest
 from unittest.mock import Mock, mock_open, patch
 
 import shutil
+import hashlib
 import logging
+import json
+import io
 import zipfile
+import threading
 import tempfile
 import collections
 from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from gallery_dl import extractor, output, path  # noqa E402
-from gallery_dl import postprocessor, config  # noqa E402
+from gallery_dl import postprocessor, config, util  # noqa E402
 from gallery_dl.postprocessor.common import PostProcessor  # noqa E402
 
 
@@ -166,6 +170,105 @@ class ClassifyTest(BasePostprocessorTest):
             mkdirs.assert_called_once_with(path, exist_ok=True)
 
 
+class DedupTest(BasePostprocessorTest):
+
+    def _download(self, pp, filename, content, part=True, mtime=None):
+        pathfmt = self.pathfmt
+        pathfmt.set_filename({"category": "test", "filename": filename,
+                              "extension": "ext", "_mtime": mtime})
+        pathfmt.build_path()
+        if part:
+            pathfmt.part_enable()
+        with pathfmt.open() as fp:
+            fp.write(content)
+        self._trigger(("file",))
+        pathfmt.finalize()
+        return pathfmt.realpath
+
+    def test_dedup_link(self):
+        pp = self._create({
+            "database": os.path.join(self.dir.name, "dedup1.sqlite3"),
+            "link"    : "hard",
+        })
+        self.assertIn("sha256", self.pathfmt.digests)
+
+        path1 = self._download(pp, "dedup1", b"Foo Bar\n")
+        path2 = self._download(pp, "dedup2", b"Foo Bar\n")
+        path3 = self._download(pp, "dedup3", b"Foo Baz\n")
+
+        self.assertTrue(os.path.samefile(path1, path2))
+        self.assertFalse(os.path.samefile(path1, path3))
+        self.assertFalse(os.path.exists(self.pathfmt.temppath))
+        with open(path2, "rb") as fp:
+            self.assertEqual(fp.read(), b"Foo Bar\n")
+
+    def test_dedup_link_mtime(self):
+        pp = self._create({
+            "database": os.path.join(self.dir.name, "dedup3.sqlite3"),
+            "link"    : "hard",
+        })
+
+        path1 = self._download(pp, "mtime1", b"Foo\n", mtime=1000)
+        path2 = self._download(pp, "mtime2", b"Foo\n", False, 2000)
+
+        self.assertTrue(os.path.samefile(path1, path2))
+        self.assertEqual(os.stat(path1).st_mtime, 1000)
+        self.assertTrue(self.pathfmt.linked)
+
+        path3 = self._download(pp, "mtime3", b"Bar\n", False, 3000)
+        self.assertEqual(os.stat(path3).st_mtime, 3000)
+        self.assertFalse(self.pathfmt.linked)
+
+    def test_dedup_skip(self):
+        pp = self._create({
+            "database"    : os.path.join(self.dir.name, "dedup2.sqlite3"),
+            "on-duplicate": "skip",
+        })
+
+        path1 = self._download(pp, "skip1", b"Foo Bar\n")
+        path2 = self._download(pp, "skip2", b"Foo Bar\n")
+
+        self.assertTrue(os.path.exists(path1))
+        self.assertFalse(os.path.exists(path2))
+
+        # stale entries get replaced
+        os.unlink(path1)
+        path2 = self._download(pp, "skip2", b"Foo Bar\n")
+        self.assertTrue(os.path.exists(path2))
+        self.assertEqual(pp.store.find(
+            hashlib.sha256(b"Foo Bar\n").hexdigest()), path2)
+
+    def test_dedup_listing(self):
+        pp = self._create({
+            "database": os.path.join(self.dir.name, "dedup4.sqlite3"),
+            "link"    : "hard",
+        })
+        pathfmt = self.pathfmt
+        pathfmt._listings = {}
+        os.makedirs(pathfmt.realdirectory, exist_ok=True)
+        self.assertFalse(pathfmt.exists())
+
+        self._download(pp, "listing1", b"Foo\n")
+        self._download(pp, "listing2", b"Foo\n")
+        self.assertTrue(pathfmt.exists())
+
+        self.job.hooks.clear()
+        pp = self._create({
+            "database"    : os.path.join(self.dir.name, "dedup4.sqlite3"),
+            "on-duplicate": "skip",
+        })
+        self._download(pp, "listing3", b"Foo\n", False)
+        self.assertFalse(pathfmt.exists())
+
+    def test_dedup_finalize(self):
+        pp = self._create({
+            "database": os.path.join(self.dir.name, "dedup", "dedup.sqlite3"),
+        })
+        self._trigger(("finalize",))
+        with self.assertRaises(Exception):
+            pp.store.find("")
+
+
 class ExecTest(BasePostprocessorTest):
 
     def test_command_string(self):
@@ -239,6 +342,112 @@ class ExecTest(BasePostprocessorTest):
         self.assertTrue(p.called)
         self.assertFalse(i.wait.called)
 
+    def test_async_max_workers(self):
+        self._create({
+            "async"      : True,
+            "max-workers": 2,
+            "command"    : "echo {}",
+        })
+
+        processes = [Mock() for _ in range(3)]
+        for process in processes:
+            process.poll.return_value = None
+            process.wait.return_value = 0
+        processes[1].wait.return_value = 1
+
+        with patch("gallery_dl.util.Popen") as p:
+            p.side_effect = processes
+            self._trigger(("after", "after"))
+            self.assertFalse(processes[0].wait.called)
+
+            # third process has to wait for the first one
+            self._trigger(("after",))
+            processes[0].wait.assert_called_once_with()
+            self.assertFalse(processes[1].wait.called)
+
+            with self.assertLogs() as log:
+                self._trigger(("finalize",))
+
+        self.assertEqual(p.call_count, 3)
+        processes[1].wait.assert_called_once_with()
+        processes[2].wait.assert_called_once_with()
+        self.assertEqual(len(log.output), 1)
+        self.assertIn("non-zero exit status (1)", log.output[0])
+
+    def test_batch_list(self):
+        self._create({
+            "batch"  : 2,
+            "command": ["tool", "-d", "{_directory}", "{_path}"],
+        })
+        pathfmt = self.pathfmt
+        paths = []
+
+        with patch("gallery_dl.util.Popen") as p:
+            p.return_value.wait.return_value = 0
+            for num in range(3):
+                pathfmt.kwdict = {"num": num}
+                pathfmt.set_filename({"filename": num, "extension": "jpg"})
+                pathfmt.build_path()
+                paths.append(pathfmt.realpath)
+                self._trigger(("after",))
+
+            p.assert_called_once_with(
+                ["tool", "-d", pathfmt.realdirectory, paths[0], paths[1]],
+                shell=False)
+
+            self._trigger(("finalize",))
+            p.assert_called_with(
+                ["tool", "-d", pathfmt.realdirectory, paths[2]],
+                shell=False)
+
+    def test_batch_list_interleaved(self):
+        self._create({
+            "batch"  : True,
+            "command": ["tool", "-o", "{_path}", "-t", "{title}", "-q"],
+        })
+        pathfmt = self.pathfmt
+        paths = []
+
+        with patch("gallery_dl.util.Popen") as p:
+            p.return_value.wait.return_value = 0
+            for num in range(2):
+                pathfmt.set_filename({"filename": num, "extension": "jpg",
+                                      "title": "t{}".format(num)})
+                pathfmt.build_path()
+                paths.append(pathfmt.realpath)
+                self._trigger(("after",))
+
+            self._trigger(("post-after",))
+            p.assert_called_once_with(
+                ["tool", "-o", paths[0], paths[1], "-t", "t0", "t1", "-q"],
+                shell=False)
+
+    def test_batch_string(self):
+        self._create({
+            "batch"  : True,
+            "command": "echo {_directory}: {}",
+        })
+        pathfmt = self.pathfmt
+        paths = []
+
+        with patch("gallery_dl.util.Popen") as p:
+            p.return_value.wait.return_value = 0
+            for num in range(3):
+                pathfmt.set_filename({"filename": num, "extension": "jpg"})
+                pathfmt.build_path()
+                paths.append(pathfmt.realpath)
+                self._trigger(("after",))
+            self.assertFalse(p.called)
+
+            self._trigger(("post-after",))
+            p.assert_called_once_with(
+                "echo {}: {}".format(
+                    pathfmt.realdirectory, " ".join(paths)),
+                shell=True)
+
+            self._trigger(("finalize",))
+            self.assertEqual(p.call_count, 1)
+
 
 class HashTest(BasePostprocessorTest):
 
@@ -290,6 +499,43 @@ class HashTest(BasePostprocessorTest):
             "3e1095b50736c4fd1e2deea152e3c8ecd5993462a747208e4d842659935a1c62",
             kwdict["b"], "sha512")
 
+    def test_downloaded_hashes(self):
+        self._create({"hashes": "sha256"})
+        self.assertIn("sha256", self.pathfmt.digests)
+        self.pathfmt.digests.clear()
+
+        with self.pathfmt.open() as fp:
+            fp.write(b"Foo Bar\n")
+        h = Mock()
+        h.hexdigest.return_value = "abcdef"
+
+        # unchanged file
+        self.pathfmt.hashes_set({"sha256": h}, self.pathfmt.temppath)
+        self._trigger()
+        self.assertEqual(self.pathfmt.kwdict["sha256"], "abcdef")
+
+        # same size, but modified by an earlier hook
+        stat = os.stat(self.pathfmt.temppath)
+        with self.pathfmt.open("r+b") as fp:
+            fp.write(b"Baz")
+        os.utime(self.pathfmt.temppath,
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertEqual(os.stat(self.pathfmt.temppath).st_size, 8)
+        self._trigger()
+        self.assertEqual(
+            "611516fa7c37cbebae2b1ce645e01426abfd84ea498bb4104bcdd990dd95593f",
+            self.pathfmt.kwdict["sha256"])
+
+        # different path, e.g. after a conversion
+        self.pathfmt.hashes_set({"sha256": h}, self.pathfmt.temppath)
+        self.assertIs(self.pathfmt.hashes_get(), self.pathfmt.hashes)
+        temppath, realpath = self.pathfmt.temppath, self.pathfmt.realpath
+        self.pathfmt.temppath = temppath + ".webm"
+        self.pathfmt.realpath = realpath + ".webm"
+        self.assertIsNone(self.pathfmt.hashes_get())
+        self.pathfmt.temppath, self.pathfmt.realpath = temppath, realpath
+        self.pathfmt.hashes = None
+
 
 class MetadataTest(BasePostprocessorTest):
 
@@ -667,6 +913,88 @@ class MetadataTest(BasePostprocessorTest):
 }
 """)
 
+    def test_metadata_jsonl_buffered(self):
+        pp = self._create({
+            "mode"       : "jsonl",
+            "filename"   : "data.jsonl.gz",
+            "compression": "gzip",
+            "buffer-size": 100,
+            "sort"       : True,
+        }, {"public": "hello ワールド"})
+        path = os.path.join(self.pathfmt.realdirectory, "data.jsonl.gz")
+        if os.path.exists(path):
+            os.unlink(path)
+
+        for num in range(5):
+            self.pathfmt.kwdict["num"] = num
+            self._trigger()
+        self.assertEqual(pp.fp_path, path)
+        self.assertTrue(pp.buffer)
+
+        self._trigger(("finalize",))
+        self.assertIsNone(pp.fp)
+
+        import gzip
+        with gzip.open(path, "rt", encoding="utf-8") as fp:
+            lines = fp.read().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[3], (
+            '{"category": "test", "extension": "ext", "filename": "file", '
+            '"num": 3, "public": "hello ワールド"}'))
+
+    def test_metadata_jsonl_buffered_archive(self):
+        archive_path = os.path.join(self.dir.name, "archive.db")
+        pp = self._create({
+            "mode"       : "jsonl",
+            "buffer-size": "1k",
+            "archive"    : archive_path,
+        })
+        self.assertEqual(pp.buffer_size, 1024)
+
+        for num in range(3):
+            self.pathfmt.kwdict = kwdict = self.pathfmt.kwdict.copy()
+            kwdict["num"] = num
+            self._trigger()
+        self.assertTrue(pp.buffer)
+        self.assertEqual(len(pp.buffer_archive), 3)
+        self.assertFalse(pp.archive.check(self.pathfmt.kwdict))
+
+        self._trigger(("finalize",))
+        self.assertFalse(pp.buffer_archive)
+        self.assertTrue(pp.archive.check(self.pathfmt.kwdict))
+        pp.archive.close()
+
+    def test_metadata_jsonl_buffer_size(self):
+        pp = self._create({"mode": "jsonl", "buffer-size": "0"})
+        self.assertEqual(pp.buffer_size, 0)
+        self.assertFalse(hasattr(pp, "buffer"))
+
+        with self.assertLogs("postprocessor.metadata", "WARNING"):
+            pp = self._create({"mode": "jsonl", "buffer-size": "foo",
+                               "compression": "gzip"})
+        self.assertEqual(pp.buffer_size, 65536)
+
+    def test_metadata_jsonl_zstd_missing(self):
+        with patch.dict(sys.modules, {"compression": None,
+                                      "zstandard": None}):
+            with self.assertRaises(ImportError):
+                self._create({"mode": "jsonl", "compression": "zstd"})
+
+    def test_metadata_jsonl_encoder(self):
+        pp = self._create({"mode": "jsonl", "separators": [",", ":"]})
+        encode = json.JSONEncoder(
+            ensure_ascii=False, separators=(",", ":"),
+            default=util.json_default).encode
+
+        data = {
+            "a": 1, 2: "b", "c": [1.5, None, True],
+            "d": datetime(2010, 1, 1), "e": "ワールド",
+            "g": {"h": util.NONE},
+        }
+        self.assertEqual(pp._json_encode(data), encode(data))
+        data["f"] = 2**70
+        self.assertEqual(pp._json_encode(data), encode(data))
+
     @staticmethod
     def _output(mock):
         return "".join(
@@ -779,6 +1107,19 @@ class RenameTest(BasePostprocessorTest):
 
         self.assertEqual(os.listdir(path), ["12345"])
 
+    def test_rename_listing(self):
+        self._create({"to": "{id}.{extension}"}, {"id": 12345})
+        self._prepare("file.ext")
+        pathfmt = self.pathfmt
+        pathfmt._listings = {}
+        self.assertTrue(pathfmt.exists())
+
+        self._trigger(("skip",))
+        self.assertTrue(pathfmt.exists())
+
+        pathfmt.build_path()
+        self.assertFalse(pathfmt.exists())
+
     def test_rename_noopt(self):
         with self.assertRaises(ValueError):
             self._create({})
@@ -797,6 +1138,173 @@ class RenameTest(BasePostprocessorTest):
         self.assertEqual(sorted(os.listdir(path)), ["12345.ext", "file.ext"])
 
 
+class UgoiraTest(BasePostprocessorTest):
+
+    def test_ugoira_async(self):
+        frames = [{"file": "{:>06}.jpg".format(i), "delay": 100}
+                  for i in range(3)]
+        pp = self._create({"mode": "concat", "async": True,
+                           "async-workers": 2},
+                          {"extension": "zip", "_ugoira_frame_data": frames})
+        self.assertIsNotNone(pp.pool)
+
+        def _exec(args):
+            with open(args[-1], "w") as fp:
+                fp.write(" ".join(args))
+            return 0
+
+        pathfmt = self.pathfmt
+        results = []
+        with patch.object(pp, "_exec", side_effect=_exec) as exec:
+            for num in range(3):
+                pathfmt.set_filename({
+                    "category": "test", "filename": "file{}".format(num),
+                    "extension": "zip", "_ugoira_frame_data": frames,
+                })
+                self._trigger(("prepare",))
+                pathfmt.part_enable()
+                os.makedirs(pathfmt.realdirectory, exist_ok=True)
+                with zipfile.ZipFile(pathfmt.temppath, "w") as zfile:
+                    for frame in frames:
+                        zfile.writestr(frame["file"], b"")
+                self._trigger(("file",))
+                pathfmt.finalize()
+                results.append((pathfmt.realpath, pathfmt.realpath[:-5]))
+
+            self._trigger(("finalize",))
+
+        self.assertEqual(exec.call_count, 3)
+        for zip_path, webm_path in results:
+            self.assertEqual(zip_path, webm_path + ".part")
+            self.assertFalse(os.path.exists(zip_path))
+            self.assertTrue(os.path.exists(webm_path))
+
+    def test_ugoira_async_state(self):
+        frames = [{"file": "{:>06}.jpg".format(i), "delay": 100}
+                  for i in range(3)]
+        pp = self._create({"mode": "concat", "async": True,
+                           "async-workers": 1},
+                          {"extension": "zip", "_ugoira_frame_data": frames})
+        event = threading.Event()
+
+        def _exec(args):
+            event.wait(5)
+            with open(args[-1], "w") as fp:
+                fp.write(" ".join(args))
+            return 0
+
+        pathfmt = self.pathfmt
+        results = []
+        with patch.object(pp, "_exec", side_effect=_exec) as exec:
+            for num in range(2):
+                pathfmt.set_filename({
+                    "category": "test", "filename": "file{}".format(num),
+                    "extension": "zip", "_ugoira_frame_data": frames,
+                })
+                self._trigger(("prepare",))
+                pathfmt.part_enable()
+                os.makedirs(pathfmt.realdirectory, exist_ok=True)
+                with zipfile.ZipFile(pathfmt.temppath, "w") as zfile:
+                    for frame in frames:
+                        zfile.writestr(frame["file"], b"")
+                self._trigger(("file",))
+                pathfmt.finalize()
+                results.append(pathfmt.realpath[:-5])
+
+            # regular file while conversions are still queued
+            pathfmt.set_filename({
+                "category": "test", "filename": "file", "extension": "jpg"})
+            self._trigger(("prepare",))
+            self.assertIsNone(pp._frames)
+
+            event.set()
+            self._trigger(("finalize",))
+
+        self.assertEqual(exec.call_count, 2)
+        for webm_path in results:
+            self.assertTrue(os.path.exists(webm_path))
+            os.unlink(webm_path)
+
+    def test_ugoira_async_mtime(self):
+        frames = [{"file": "{:>06}.jpg".format(i), "delay": 100}
+                  for i in range(3)]
+        pp = self._create({"mode": "concat", "async": True, "mtime": False},
+                          {"extension": "zip", "_ugoira_frame_data": frames})
+        event = threading.Event()
+
+        def _exec(args):
+            event.wait(5)
+            with open(args[-1], "w") as fp:
+                fp.write(" ".join(args))
+            return 0
+
+        pathfmt = self.pathfmt
+        with patch.object(pp, "_exec", side_effect=_exec):
+            self._trigger(("prepare",))
+            pathfmt.part_enable()
+            os.makedirs(pathfmt.realdirectory, exist_ok=True)
+            with zipfile.ZipFile(pathfmt.temppath, "w") as zfile:
+                for frame in frames:
+                    zfile.writestr(frame["file"], b"")
+            self._trigger(("file",))
+            pathfmt.finalize()
+
+            # '_mtime' set by a later hook, e.g. 'mtime'
+            pathfmt.kwdict["_mtime"] = 315532800
+            event.set()
+            self._trigger(("finalize",))
+
+        webm_path = os.path.join(self.dir.name, "test", "file.webm")
+        self.assertEqual(os.stat(webm_path).st_mtime, 315532800)
+
+    def test_ugoira_image2pipe(self):
+        frames = [{"file": "{:>06}.jpg".format(i), "delay": delay}
+                  for i, delay in enumerate((100, 200, 100))]
+        pp = self._create({"mode": "image2pipe", "keep-files": True},
+                          {"extension": "zip", "_ugoira_frame_data": frames})
+        self.assertEqual(pp._process, pp._process_image2pipe)
+
+        pathfmt = self.pathfmt
+        self._trigger(("prepare",))
+        os.makedirs(pathfmt.realdirectory, exist_ok=True)
+        with zipfile.ZipFile(pathfmt.temppath, "w") as zfile:
+            for frame in frames:
+                zfile.writestr(frame["file"], frame["file"].encode())
+
+        class Stdin(io.BytesIO):
+            def close(self):
+                self.result = self.getvalue()
+                io.BytesIO.close(self)
+
+        process = Mock(stdin=Stdin())
+        process.wait.return_value = 0
+        with patch("gallery_dl.util.Popen", return_value=process) as popen:
+            self._trigger(("file",))
+
+        args = popen.call_args[0][0]
+        self.assertEqual(args[:7], [
+            "ffmpeg", "-f", "image2pipe", "-framerate", "1000/100",
+            "-i", "-"])
+        self.assertEqual(args[-1], pathfmt.realpath[:-3] + "webm")
+        self.assertEqual(process.stdin.result,
+                         b"000000.jpg000001.jpg000001.jpg000002.jpg")
+        self.assertEqual(pathfmt.extension, "zip")
+        os.unlink(pathfmt.temppath)
+
+    def test_ugoira_image2pipe_delays(self):
+        frames = [{"file": "{:>06}.jpg".format(i), "delay": delay}
+                  for i, delay in enumerate((5, 25, 40))]
+        pp = self._create({"mode": "image2pipe"})
+        pp._frames = frames
+
+        with self.assertLogs("postprocessor.ugoira", "DEBUG") as log:
+            args, stdin = pp._process_image2pipe(self.pathfmt, "/tmp")
+        self.assertIn("1000/10", args)
+        self.assertEqual(stdin, ("/tmp", [
+            ("000000.jpg", 1), ("000001.jpg", 2), ("000002.jpg", 4)]))
+        self.assertIn("common divisor: 5 ms", log.output[-1])
+
+
 class ZipTest(BasePostprocessorTest):
 
     def test_zip_default(self):
@@ -907,6 +1415,142 @@ class ZipTest(BasePostprocessorTest):
             self.assertRegex(args[1], r"file\d\.ext")
         self.assertEqual(pp.zfile.close.call_count, 1)
 
+    def test_zip_stream(self):
+        pp = self._create({"mode": "stream", "keep-files": True})
+        pathfmt = self.pathfmt
+        self.assertEqual(self.job.hooks["file"][0], pp.write_stream)
+        self.assertEqual(pathfmt.stream, pp.open_stream)
+
+        try:
+            # stream 2 files, abort a 3rd one
+            for name, data in (("a.ext", b"foo"), ("b.ext", b"bar"),
+                               ("c.ext", b"baz")):
+                pathfmt.filename = name
+                pathfmt.streamed = False
+                with pathfmt.stream(pathfmt, len(data)) as fp:
+                    fp.write(data)
+                    self.assertEqual(fp.tell(), 3)
+                    self.assertIsNone(pathfmt.stream(pathfmt, 0))
+                    if name == "c.ext":
+                        fp.abort()
+                        self.assertFalse(pathfmt.streamed)
+                        continue
+                self.assertTrue(pathfmt.streamed)
+                self._trigger()
+                pathfmt.finalize()
+
+            # regular file
+            with tempfile.NamedTemporaryFile("w", dir=self.dir.name) as fp:
+                fp.write("foobar")
+                fp.flush()
+                pathfmt.filename = "d.ext"
+                pathfmt.streamed = False
+                pathfmt.temppath = fp.name
+                self._trigger()
+
+            # already stored
+            pathfmt.filename = "a.ext"
+            self.assertIsNone(pathfmt.stream(pathfmt, 3))
+        finally:
+            pathfmt.stream = None
+
+        self._trigger(("finalize",))
+        with zipfile.ZipFile(pp.zfile.filename) as zfile:
+            self.assertIsNone(zfile.testzip())
+            self.assertEqual(zfile.namelist(), ["a.ext", "b.ext", "d.ext"])
+            self.assertEqual(zfile.read("b.ext"), b"bar")
+            self.assertEqual(zfile.read("d.ext"), b"foobar")
+
+        os.unlink(pp.zfile.filename)
+
+    def test_zip_stream_abort(self):
+        pp = self._create({"mode": "stream", "keep-files": True})
+        pathfmt = self.pathfmt
+
+        try:
+            pathfmt.filename = "a.ext"
+            pathfmt.streamed = False
+            with self.assertRaises(OSError):
+                with pathfmt.stream(pathfmt, 6) as fp:
+                    fp.write(b"foo")
+                    raise OSError()
+            self.assertFalse(pathfmt.streamed)
+
+            # lock got released
+            pathfmt.filename = "b.ext"
+            with pathfmt.stream(pathfmt, 3) as fp:
+                fp.write(b"bar")
+            self.assertTrue(pathfmt.streamed)
+        finally:
+            pathfmt.stream = None
+
+        self._trigger(("finalize",))
+        with zipfile.ZipFile(pp.zfile.filename) as zfile:
+            self.assertIsNone(zfile.testzip())
+            self.assertEqual(zfile.namelist(), ["b.ext"])
+
+        os.unlink(pp.zfile.filename)
+
+    def test_zip_stream_file_hooks(self):
+        pp = self._create({"mode": "stream"})
+        pathfmt = self.pathfmt
+        try:
+            self.job.hooks["file"].append(Mock())
+            self.assertIsNone(pathfmt.stream(pathfmt, 3))
+            self.assertFalse(pp.lock.locked())
+        finally:
+            pathfmt.stream = None
+
+    def test_zip_stream_after_hooks(self):
+        for event in ("prepare-after", "after", "post-after"):
+            self.job.hooks.clear()
+            pp = self._create({"mode": "stream"})
+            pathfmt = self.pathfmt
+            try:
+                self.job.hooks[event].append(Mock())
+                self.assertIsNone(pathfmt.stream(pathfmt, 3), event)
+                self.assertFalse(pp.lock.locked())
+            finally:
+                pathfmt.stream = None
+
+    def test_zip_stream_unsupported(self):
+        with patch("gallery_dl.postprocessor.zip._stream_supported") as ss:
+            ss.return_value = False
+            pp = self._create({"mode": "stream"})
+        self.assertIsNone(self.pathfmt.stream)
+        self.assertEqual(self.job.hooks["file"][0], pp.write_fast)
+
+    def test_zip_recover(self):
+        pp = self._create()
+        path = pp.args[0]
+
+        # simulate an interrupted run:
+        # missing central directory and a partially written member
+        with zipfile.ZipFile(path, "w") as zfile:
+            zfile.writestr("a.ext", b"foo")
+            zfile.writestr("b.ext", b"bar" * 100, zipfile.ZIP_DEFLATED)
+            with zfile.open("c.ext", "w", force_zip64=True) as fp:
+                fp.write(b"baz")
+            zfile.writestr("d.ext", b"incomplete")
+            offset = zfile.getinfo("d.ext").header_offset
+        with open(path, "r+b") as fp:
+            fp.truncate(offset + 40)
+        self.assertFalse(zipfile.is_zipfile(path))
+
+        with self.assertLogs() as log_info:
+            pp.zfile = pp.open()
+        self.assertIn("Recovering 3 file(s)", log_info.output[0])
+        self.assertEqual(
+            pp.zfile.namelist(), ["a.ext", "b.ext", "c.ext"])
+        self._trigger(("finalize",))
+
+        with zipfile.ZipFile(path) as zfile:
+            self.assertIsNone(zfile.testzip())
+            self.assertEqual(zfile.read("b.ext"), b"bar" * 100)
+            self.assertEqual(zfile.read("c.ext"), b"baz")
+
+        os.unlink(path)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -858,6 +858,55 @@ def hash(value):
         except ValueError as exc:
             self.assertIs(exc, exc_orig)
 
+    def test_ratelimiter(self):
+        limiter = util.ratelimiter("example.org")
+        self.assertIs(util.ratelimiter("example.org"), limiter)
+        self.assertIsNot(util.ratelimiter("example.com"), limiter)
+
+        limiter = util.RateLimiter()
+        self.assertEqual(limiter.reserve(), 0.0)
+        self.assertEqual(limiter.reserve(10.0), 0.0)
+        # consecutive slots for concurrent callers
+        self.assertAlmostEqual(limiter.reserve(10.0), 10.0, 1)
+        self.assertAlmostEqual(limiter.reserve(10.0), 20.0, 1)
+        # no reservation without interval
+        self.assertAlmostEqual(limiter.reserve(), 20.0, 1)
+        self.assertAlmostEqual(limiter.reserve(), 20.0, 1)
+
+        limiter = util.RateLimiter()
+        limiter.block(5.0)
+        self.assertAlmostEqual(limiter.reserve(), 5.0, 1)
+        limiter.update()
+        self.assertAlmostEqual(limiter.reserve(), 5.0, 1)
+        limiter.block(1.0)
+        self.assertAlmostEqual(limiter.reserve(), 5.0, 1)
+
+
+class TestStartupProfile(unittest.TestCase):
+
+    def test_report(self):
+        from gallery_dl import startup
+        import builtins
+
+        startup._thread_id = startup._thread.get_ident()
+        builtins.__import__ = startup._import_timed
+        try:
+            import colorsys  # noqa F401
+            import os.path  # noqa F401 (already imported)
+        finally:
+            builtins.__import__ = startup._import
+
+        self.assertEqual(len(startup._entries), 1)
+        depth, name, cumulative, own = startup._entries[0]
+        self.assertEqual(depth, 0)
+        self.assertEqual(name, "colorsys")
+        self.assertGreaterEqual(cumulative, own)
+
+        output = io.StringIO()
+        startup.report(output)
+        self.assertIn("ms importing modules", output.getvalue())
+        del startup._entries[:]
+
 
 class TestExtractor():
     category = "test_category"